@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:43
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build indexes without blocking writes on live tables
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0002_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0004_access_pattern_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['branch', 'created_date'], name='users_live_branch_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='users_live_created_idx'),
+        ),
+    ]
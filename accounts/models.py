@@ -47,6 +47,10 @@ class User(AbstractBaseUser, PermissionsMixin, SoftDeleteModel, TimestampedModel
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['branch', 'created_date'], name='users_live_branch_idx', condition=models.Q(deleted_at__isnull=True)),
+            models.Index(fields=['created_date'], name='users_live_created_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
         
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Branch, Warehouse, Vendor, Customer, Seller, WarehouseTransaction
+from .models import Branch, Warehouse, Vendor, Customer, Seller, WarehouseTransaction, IdempotencyKey
 
 @admin.register(Branch)
 class BranchAdmin(admin.ModelAdmin):
@@ -50,3 +50,12 @@ class WarehouseTransactionAdmin(admin.ModelAdmin):
     readonly_fields = ['created_date', 'action_date']
 
 
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'endpoint', 'status_code', 'created_date', 'expires_at']
+    list_filter = ['endpoint', 'created_date']
+    search_fields = ['key', 'user__username']
+    ordering = ['-created_date']
+    readonly_fields = ['created_date']
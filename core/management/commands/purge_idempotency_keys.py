@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from core.models import IdempotencyKey
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key responses in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyKey.objects.purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired idempotency keys'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='warehousetransaction',
+            index=models.Index(fields=['created_date', 'id'], name='warehouse_tx_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:43
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build indexes without blocking writes on live tables
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_created_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='branch',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='branches_live_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='customers_live_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='seller',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['branch', 'created_date'], name='sellers_live_branch_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='vendor',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='vendors_live_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='warehouse',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['branch', 'created_date'], name='warehouse_live_branch_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='warehousetransaction',
+            index=models.Index(fields=['status', 'created_date'], name='warehouse_tx_status_idx'),
+        ),
+    ]
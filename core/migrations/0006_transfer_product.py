@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_customer_stats'),
+        ('inventory', '0003_stock_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warehousetransaction',
+            name='gold_product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfers', to='inventory.goldproduct'),
+        ),
+        migrations.AddField(
+            model_name='warehousetransaction',
+            name='silver_product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfers', to='inventory.silverproduct'),
+        ),
+        migrations.AddConstraint(
+            model_name='warehousetransaction',
+            constraint=models.CheckConstraint(condition=models.Q(('gold_product__isnull', True), ('silver_product__isnull', True), _connector='OR'), name='one_transfer_product'),
+        ),
+    ]
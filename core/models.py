@@ -1,4 +1,6 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from utils.mixins import SoftDeleteModel, TimestampedModel, CreatedByModel
 
 class Branch(SoftDeleteModel, TimestampedModel, CreatedByModel):
@@ -6,6 +8,9 @@ class Branch(SoftDeleteModel, TimestampedModel, CreatedByModel):
     
     class Meta:
         db_table = 'branches'
+        indexes = [
+            models.Index(fields=['created_date'], name='branches_live_created_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
         verbose_name_plural = 'Branches'
     
     def __str__(self):
@@ -18,6 +23,9 @@ class Warehouse(SoftDeleteModel, TimestampedModel, CreatedByModel):
     
     class Meta:
         db_table = 'warehouse'
+        indexes = [
+            models.Index(fields=['branch', 'created_date'], name='warehouse_live_branch_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.branch.name}"
@@ -27,6 +35,9 @@ class Vendor(SoftDeleteModel, TimestampedModel, CreatedByModel):
     
     class Meta:
         db_table = 'vendors'
+        indexes = [
+            models.Index(fields=['created_date'], name='vendors_live_created_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
     
     def __str__(self):
         return self.name
@@ -34,9 +45,18 @@ class Vendor(SoftDeleteModel, TimestampedModel, CreatedByModel):
 class Customer(SoftDeleteModel, TimestampedModel, CreatedByModel):
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=255)
+    # Maintained with every invoice write across both metals; rebuild with `rebuild_customer_stats`
+    invoice_count = models.BigIntegerField(default=0)
+    return_count = models.BigIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    returned_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    last_visit = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'customers'
+        indexes = [
+            models.Index(fields=['created_date'], name='customers_live_created_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.phone}"
@@ -47,6 +67,9 @@ class Seller(SoftDeleteModel, TimestampedModel, CreatedByModel):
     
     class Meta:
         db_table = 'sellers'
+        indexes = [
+            models.Index(fields=['branch', 'created_date'], name='sellers_live_branch_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.branch.name}"
@@ -59,6 +82,9 @@ class WarehouseTransaction(TimestampedModel, CreatedByModel):  # No soft delete
     ]
     
     item_name = models.CharField(max_length=255)
+    # The product moved; approval needs one to move stock, older transfers only carry item_name
+    gold_product = models.ForeignKey('inventory.GoldProduct', on_delete=models.SET_NULL, null=True, blank=True, related_name='transfers')
+    silver_product = models.ForeignKey('inventory.SilverProduct', on_delete=models.SET_NULL, null=True, blank=True, related_name='transfers')
     from_warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='outgoing_transactions')
     to_warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='incoming_transactions')
     quantity = models.BigIntegerField()
@@ -68,12 +94,52 @@ class WarehouseTransaction(TimestampedModel, CreatedByModel):  # No soft delete
     
     class Meta:
             db_table = 'warehouse_transactions'
+            indexes = [
+                models.Index(fields=['created_date', 'id'], name='warehouse_tx_created_id_idx'),
+                models.Index(fields=['status', 'created_date'], name='warehouse_tx_status_idx'),
+            ]
             constraints = [
                 models.CheckConstraint(
                     check=~models.Q(from_warehouse=models.F('to_warehouse')),
                     name='different_warehouses'
-                )
+                ),
+                models.CheckConstraint(
+                    check=models.Q(gold_product__isnull=True) | models.Q(silver_product__isnull=True),
+                    name='one_transfer_product'
+                ),
             ]
     
     def __str__(self):
-        return f"{self.item_name} - {self.from_warehouse.code} to {self.to_warehouse.code}"
\ No newline at end of file
+        return f"{self.item_name} - {self.from_warehouse.code} to {self.to_warehouse.code}"
+
+class IdempotencyKeyManager(models.Manager):
+    def purge_expired(self, batch_size=1000):
+        """Delete expired keys in batches so a large backlog never holds one long lock"""
+        deleted = 0
+        while True:
+            ids = list(
+                self.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += self.filter(id__in=ids).delete()[0]
+
+class IdempotencyKey(models.Model):  # Replayed response for a retried create request
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='idempotency_keys')
+    endpoint = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(encoder=DjangoJSONEncoder)
+    created_date = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    objects = IdempotencyKeyManager()
+    
+    class Meta:
+        db_table = 'idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user')
+        ]
+    
+    def __str__(self):
+        return f"{self.key} - {self.endpoint}"
@@ -32,8 +32,10 @@ class CustomerSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'phone', 'created_date', 'updated_date', 'created_by', 'created_by_username']
-        read_only_fields = ['id', 'created_date', 'updated_date', 'created_by_username']
+        fields = ['id', 'name', 'phone', 'invoice_count', 'return_count', 'lifetime_spend', 'returned_amount',
+                 'last_visit', 'created_date', 'updated_date', 'created_by', 'created_by_username']
+        read_only_fields = ['id', 'invoice_count', 'return_count', 'lifetime_spend', 'returned_amount',
+                           'last_visit', 'created_date', 'updated_date', 'created_by_username']
 
 class SellerSerializer(serializers.ModelSerializer):
     branch_name = serializers.CharField(source='branch.name', read_only=True)
@@ -53,13 +55,48 @@ class WarehouseTransactionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = WarehouseTransaction
-        fields = ['id', 'item_name', 'from_warehouse', 'from_warehouse_code', 
+        fields = ['id', 'item_name', 'gold_product', 'silver_product', 'from_warehouse', 'from_warehouse_code', 
                  'to_warehouse', 'to_warehouse_code', 'quantity', 'status', 
                  'action_by', 'action_by_username', 'action_date', 'created_date', 
                  'created_by', 'created_by_username']
-        read_only_fields = ['id', 'created_date', 'created_by_username', 'action_by_username']
+        # Only approving or rejecting a transfer decides it
+        read_only_fields = ['id', 'status', 'action_by', 'action_date', 'created_date', 'created_by_username',
+                            'action_by_username']
+        extra_kwargs = {'item_name': {'required': False}, 'quantity': {'min_value': 1}}
+
+    # What a transfer moves; fixed once it is decided, so the record keeps matching the stock moved
+    movement_fields = ['gold_product', 'silver_product', 'from_warehouse', 'to_warehouse', 'quantity']
 
     def validate(self, data):
-        if data['from_warehouse'] == data['to_warehouse']:
+        if self.instance is not None and self.instance.status != 'Pending':
+            changed = [field for field in self.movement_fields if field in data and data[field] != getattr(self.instance, field)]
+            if changed:
+                raise serializers.ValidationError(
+                    {field: [f'Cannot change a {self.instance.status.lower()} transfer'] for field in changed}
+                )
+        from_warehouse = data.get('from_warehouse', getattr(self.instance, 'from_warehouse', None))
+        to_warehouse = data.get('to_warehouse', getattr(self.instance, 'to_warehouse', None))
+        if from_warehouse == to_warehouse:
             raise serializers.ValidationError("From and to warehouses must be different")
-        return data
\ No newline at end of file
+        gold_product = data.get('gold_product', getattr(self.instance, 'gold_product', None))
+        silver_product = data.get('silver_product', getattr(self.instance, 'silver_product', None))
+        if gold_product and silver_product:
+            raise serializers.ValidationError("A transfer moves either a gold or a silver product")
+        if not data.get('item_name') and not getattr(self.instance, 'item_name', None):
+            if not (gold_product or silver_product):
+                raise serializers.ValidationError({'item_name': ['Give item_name or a product']})
+            data['item_name'] = (gold_product or silver_product).name
+        return data
+
+class TransferBatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+
+class CustomerInvoiceSerializer(serializers.Serializer):
+    metal = serializers.CharField()
+    id = serializers.IntegerField()
+    created_date = serializers.DateTimeField()
+    branch_id = serializers.IntegerField()
+    warehouse_id = serializers.IntegerField()
+    invoice_type = serializers.CharField()
+    transaction_type = serializers.CharField()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
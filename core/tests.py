@@ -1,3 +1,199 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from accounts.models import User
+from inventory.models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock, GoldStockMovement
+from utils.testing import QueryBudgetMixin
+from .models import Branch, Warehouse, Vendor, Customer, Seller, WarehouseTransaction, IdempotencyKey
 
-# Create your tests here.
+
+class CoreTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user('admin', 'admin@example.com', 'pass', role='Admin')
+        self.branch = Branch.objects.create(name='Main', created_by=self.user)
+        self.user.branch = self.branch
+        self.user.save()
+        self.source = Warehouse.objects.create(code='WH-1', branch=self.branch, created_by=self.user)
+        self.target = Warehouse.objects.create(code='WH-2', branch=self.branch, created_by=self.user)
+        self.client.force_authenticate(self.user)
+
+
+class WarehouseTransactionIdempotencyTests(CoreTestMixin, APITestCase):
+    def test_retried_transfer_is_created_once(self):
+        payload = {
+            'item_name': 'Ring', 'from_warehouse': self.source.id, 'to_warehouse': self.target.id,
+            'quantity': 3, 'action_by': self.user.id, 'created_by': self.user.id, 'action_date': timezone.now().isoformat(),
+        }
+        first = self.client.post('/api/core/warehouse-transactions/', payload, format='json', HTTP_IDEMPOTENCY_KEY='t-1')
+        retry = self.client.post('/api/core/warehouse-transactions/', payload, format='json', HTTP_IDEMPOTENCY_KEY='t-1')
+        self.assertEqual(first.status_code, 201, first.data)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(WarehouseTransaction.objects.count(), 1)
+
+    def test_purge_expired_deletes_in_batches(self):
+        now = timezone.now()
+        IdempotencyKey.objects.bulk_create([
+            IdempotencyKey(key=f'old-{i}', user=self.user, endpoint='/', status_code=201,
+                           response_body={}, expires_at=now - timedelta(minutes=1))
+            for i in range(5)
+        ] + [
+            IdempotencyKey(key='live', user=self.user, endpoint='/', status_code=201,
+                           response_body={}, expires_at=now + timedelta(hours=1))
+        ])
+        self.assertEqual(IdempotencyKey.objects.purge_expired(batch_size=2), 5)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['live'])
+
+
+class QueryBudgetTests(QueryBudgetMixin, CoreTestMixin, APITestCase):
+    """List endpoints must cost the same number of queries however full the page is"""
+    endpoints = ['branches', 'warehouses', 'vendors', 'customers', 'sellers', 'warehouse-transactions']
+
+    def seed(self, index):
+        user = User.objects.create_user(f'user{index}', f'user{index}@example.com', role='Manager')
+        branch = Branch.objects.create(name=f'Branch {index}', created_by=user)
+        source = Warehouse.objects.create(code=f'S-{index}', branch=branch, created_by=user)
+        target = Warehouse.objects.create(code=f'T-{index}', branch=branch, created_by=user)
+        Vendor.objects.create(name=f'Vendor {index}', created_by=user)
+        Customer.objects.create(name=f'Customer {index}', phone=str(index), created_by=user)
+        Seller.objects.create(name=f'Seller {index}', branch=branch, created_by=user)
+        WarehouseTransaction.objects.create(
+            item_name='Ring', from_warehouse=source, to_warehouse=target, quantity=1,
+            action_by=user, action_date=timezone.now(), created_by=user
+        )
+
+    def test_list_query_count_independent_of_page_size(self):
+        self.assertQueryCountIndependentOfRows([f'/api/core/{name}/' for name in self.endpoints])
+
+
+class TransferApprovalTests(CoreTestMixin, APITestCase):
+    url = '/api/core/warehouse-transactions/'
+
+    def setUp(self):
+        super().setUp()
+        vendor = Vendor.objects.create(name='Vendor', created_by=self.user)
+        product = {'vendor': vendor, 'weight': 5, 'carat': 21, 'stamp_enduser': 10, 'cashback': 0,
+                   'cashback_unpacking': 0, 'created_by': self.user}
+        self.ring = GoldProduct.objects.create(name='Ring', **product)
+        self.chain = SilverProduct.objects.create(name='Chain', **product)
+        GoldWarehouseStock.objects.create(warehouse=self.source, product=self.ring, quantity=5, created_by=self.user)
+        SilverWarehouseStock.objects.create(warehouse=self.source, product=self.chain, quantity=2, created_by=self.user)
+
+    def transfer(self, quantity, **product):
+        return WarehouseTransaction.objects.create(
+            item_name='Ring', from_warehouse=self.source, to_warehouse=self.target, quantity=quantity,
+            action_by=self.user, action_date=timezone.now(), created_by=self.user, **product
+        )
+
+    def stock(self, model, warehouse, product):
+        return model.objects.filter(warehouse=warehouse, product=product).values_list('quantity', flat=True).first()
+
+    def test_create_names_the_item_after_the_product(self):
+        response = self.client.post(self.url, {
+            'gold_product': self.ring.id, 'from_warehouse': self.source.id, 'to_warehouse': self.target.id,
+            'quantity': 2, 'action_by': self.user.id, 'created_by': self.user.id, 'action_date': timezone.now().isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['item_name'], 'Ring')
+
+    def test_clients_cannot_decide_transfers(self):
+        response = self.client.post(self.url, {
+            'gold_product': self.ring.id, 'from_warehouse': self.source.id, 'to_warehouse': self.target.id,
+            'quantity': 2, 'status': 'Approved', 'created_by': self.user.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['status'], 'Pending')
+
+        transfer = self.transfer(3, gold_product=self.ring)
+        self.client.post(f'{self.url}{transfer.id}/approve/')
+        response = self.client.patch(f'{self.url}{transfer.id}/', {'status': 'Pending'}, format='json')
+        self.assertEqual(response.data['status'], 'Approved')
+        self.assertEqual(self.client.post(f'{self.url}{transfer.id}/approve/').status_code, 400)
+        self.assertEqual(self.stock(GoldWarehouseStock, self.source, self.ring), 2)
+
+    def test_decided_transfers_keep_what_they_moved(self):
+        transfer = self.transfer(3, gold_product=self.ring)
+        self.assertEqual(self.client.patch(f'{self.url}{transfer.id}/', {'quantity': 4}, format='json').status_code, 200)
+        self.client.post(f'{self.url}{transfer.id}/approve/')
+        for change in [{'quantity': 1}, {'to_warehouse': self.source.id, 'from_warehouse': self.target.id},
+                       {'gold_product': None, 'silver_product': self.chain.id}]:
+            with self.subTest(change=change):
+                response = self.client.patch(f'{self.url}{transfer.id}/', change, format='json')
+                self.assertEqual(response.status_code, 400, response.data)
+        self.assertEqual(self.client.patch(f'{self.url}{transfer.id}/', {'item_name': 'Gold ring'}, format='json').status_code, 200)
+        transfer.refresh_from_db()
+        self.assertEqual((transfer.quantity, transfer.from_warehouse, transfer.gold_product), (4, self.source, self.ring))
+
+    def test_approve_moves_stock(self):
+        transfer = self.transfer(3, gold_product=self.ring)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.url}{transfer.id}/approve/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.stock(GoldWarehouseStock, self.source, self.ring), 2)
+        self.assertEqual(self.stock(GoldWarehouseStock, self.target, self.ring), 3)
+        self.assertEqual(
+            sorted(GoldStockMovement.objects.values_list('warehouse_id', 'delta', 'reason', 'reference_id')),
+            sorted([(self.source.id, -3, 'Transfer', transfer.id), (self.target.id, 3, 'Transfer', transfer.id)])
+        )
+        self.assertEqual(self.client.post(f'{self.url}{transfer.id}/approve/').status_code, 400)
+
+    def test_approve_refuses_what_it_cannot_move(self):
+        short = self.transfer(6, gold_product=self.ring)
+        legacy = self.transfer(1)
+        self.assertEqual(self.client.post(f'{self.url}{short.id}/approve/').data['error'],
+                         'Insufficient stock in the source warehouse')
+        self.assertEqual(self.client.post(f'{self.url}{legacy.id}/approve/').status_code, 400)
+        short.refresh_from_db()
+        self.assertEqual(short.status, 'Pending')
+        self.assertEqual(self.stock(GoldWarehouseStock, self.source, self.ring), 5)
+
+    def test_bulk_approve_in_a_handful_of_statements(self):
+        transfers = [self.transfer(1, gold_product=self.ring) for _ in range(200)]
+        silver = [self.transfer(1, silver_product=self.chain) for _ in range(3)]
+        done = self.transfer(1, gold_product=self.ring)
+        done.status = 'Rejected'
+        done.save()
+        ids = [transfer.id for transfer in transfers + silver] + [done.id, 999999]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'{self.url}bulk_approve/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertLess(len(ctx.captured_queries), 15)
+        statuses = [row['status'] for row in response.data['results']]
+        self.assertEqual(statuses, ['approved'] * 5 + ['insufficient'] * 195 + ['approved'] * 2
+                         + ['insufficient', 'not_pending', 'not_found'])
+        self.assertEqual(self.stock(GoldWarehouseStock, self.source, self.ring), 0)
+        self.assertEqual(self.stock(GoldWarehouseStock, self.target, self.ring), 5)
+        self.assertEqual(self.stock(SilverWarehouseStock, self.target, self.chain), 2)
+        self.assertEqual(WarehouseTransaction.objects.filter(status='Approved').count(), 7)
+
+    def test_bulk_reject(self):
+        pending = self.transfer(1, gold_product=self.ring)
+        approved = self.transfer(1, gold_product=self.ring)
+        approved.status = 'Approved'
+        approved.save()
+        response = self.client.post(f'{self.url}bulk_reject/', {'ids': [pending.id, approved.id]}, format='json')
+        self.assertEqual([row['status'] for row in response.data['results']], ['rejected', 'not_pending'])
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'Rejected')
+
+    def test_only_managers_of_the_source_branch_decide(self):
+        other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        outside = Warehouse.objects.create(code='WH-3', branch=other_branch, created_by=self.user)
+        incoming = WarehouseTransaction.objects.create(
+            item_name='Ring', from_warehouse=outside, to_warehouse=self.source, quantity=1, gold_product=self.ring,
+            action_by=self.user, action_date=timezone.now(), created_by=self.user
+        )
+        outgoing = self.transfer(1, gold_product=self.ring)
+
+        self.user.role = 'Employee'
+        self.user.save()
+        self.assertEqual(self.client.post(f'{self.url}{outgoing.id}/approve/').status_code, 403)
+        self.assertEqual(self.client.post(f'{self.url}bulk_reject/', {'ids': [outgoing.id]}, format='json').status_code, 403)
+
+        self.user.role = 'Manager'
+        self.user.save()
+        self.assertEqual(self.client.get(f'{self.url}{incoming.id}/').status_code, 200)
+        self.assertEqual(self.client.post(f'{self.url}{incoming.id}/approve/').status_code, 404)
+        response = self.client.post(f'{self.url}bulk_approve/', {'ids': [incoming.id, outgoing.id]}, format='json')
+        self.assertEqual([row['status'] for row in response.data['results']], ['not_found', 'approved'])
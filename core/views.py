@@ -1,18 +1,27 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.db import models, transaction
+from django.utils import timezone
 from .models import Branch, Warehouse, Vendor, Customer, Seller, WarehouseTransaction
 from .serializers import (
     BranchSerializer, WarehouseSerializer, VendorSerializer, 
-    CustomerSerializer, SellerSerializer, WarehouseTransactionSerializer
+    CustomerSerializer, SellerSerializer, WarehouseTransactionSerializer, CustomerInvoiceSerializer,
+    TransferBatchSerializer
 )
+from inventory.transfers import approve_transfers, reject_transfers
+from invoicing.customers import customer_invoices, decode_history_cursor, encode_history_cursor
+from utils.idempotency import IdempotentCreateMixin
+from utils.pagination import KeysetPagination
 from utils.permissions import IsAdminOrManager, SameBranchPermission
 
 class BranchViewSet(viewsets.ModelViewSet):
-    queryset = Branch.objects.all()
+    queryset = Branch.objects.select_related('created_by')
     serializer_class = BranchSerializer
     permission_classes = [IsAuthenticated, IsAdminOrManager]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -31,7 +40,7 @@ class BranchViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Branch restored successfully'})
 
 class WarehouseViewSet(viewsets.ModelViewSet):
-    queryset = Warehouse.objects.all()
+    queryset = Warehouse.objects.select_related('branch', 'created_by')
     serializer_class = WarehouseSerializer
     permission_classes = [IsAuthenticated, IsAdminOrManager]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -57,7 +66,7 @@ class WarehouseViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Warehouse restored successfully'})
 
 class VendorViewSet(viewsets.ModelViewSet):
-    queryset = Vendor.objects.all()
+    queryset = Vendor.objects.select_related('created_by')
     serializer_class = VendorSerializer
     permission_classes = [IsAuthenticated, IsAdminOrManager]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -76,7 +85,7 @@ class VendorViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Vendor restored successfully'})
 
 class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.all()
+    queryset = Customer.objects.select_related('created_by')
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -84,6 +93,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'phone']
     ordering_fields = ['name', 'phone', 'created_date']
     ordering = ['-created_date']
+    history_page_size = 20
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -94,8 +104,33 @@ class CustomerViewSet(viewsets.ModelViewSet):
         customer.restore()
         return Response({'message': 'Customer restored successfully'})
 
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Get the customer's lifetime counters and a page of their gold and silver invoices, newest first"""
+        customer = self.get_object()
+        limit = serializers.IntegerField(min_value=1, max_value=100).run_validation(
+            request.query_params.get('limit', self.history_page_size)
+        )
+        after = None
+        if request.query_params.get('cursor'):
+            try:
+                after = decode_history_cursor(request.query_params['cursor'])
+            except ValueError as exc:
+                raise NotFound(str(exc))
+        # Counters cover every branch; the invoice list follows the invoice endpoints' branch scoping
+        branch_ids = None if request.user.role == 'Admin' else [request.user.branch_id]
+        rows, has_more = customer_invoices(customer.id, limit, after, branch_ids)
+        next_url = None
+        if has_more:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_history_cursor(rows[-1]))
+        return Response({
+            'customer': self.get_serializer(customer).data,
+            'next': next_url,
+            'invoices': CustomerInvoiceSerializer(rows, many=True).data
+        })
+
 class SellerViewSet(viewsets.ModelViewSet):
-    queryset = Seller.objects.all()
+    queryset = Seller.objects.select_related('branch', 'created_by')
     serializer_class = SellerSerializer
     permission_classes = [IsAuthenticated, IsAdminOrManager]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -120,25 +155,42 @@ class SellerViewSet(viewsets.ModelViewSet):
         seller.restore()
         return Response({'message': 'Seller restored successfully'})
 
-class WarehouseTransactionViewSet(viewsets.ModelViewSet):
-    queryset = WarehouseTransaction.objects.all()
+TRANSFER_ERRORS = {
+    'not_pending': 'Only pending transactions can be approved',
+    'no_product': 'Set the gold or silver product before approving, so the stock can be moved',
+    'insufficient': 'Insufficient stock in the source warehouse',
+}
+
+class WarehouseTransactionViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
+    queryset = WarehouseTransaction.objects.select_related(
+        'from_warehouse', 'to_warehouse', 'created_by', 'action_by'
+    )
     serializer_class = WarehouseTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['status', 'from_warehouse', 'to_warehouse', 'created_date']
     search_fields = ['item_name', 'from_warehouse__code', 'to_warehouse__code']
     ordering_fields = ['item_name', 'quantity', 'status', 'created_date', 'action_date']
     ordering = ['-created_date']
+    decision_actions = ('approve', 'reject', 'bulk_approve', 'bulk_reject')
 
     def get_queryset(self):
         queryset = super().get_queryset()
         # Filter by user's branch if not admin
         if self.request.user.role != 'Admin':
             user_branch = self.request.user.branch
-            queryset = queryset.filter(
-                models.Q(from_warehouse__branch=user_branch) | 
-                models.Q(to_warehouse__branch=user_branch)
-            )
+            if self.action in self.decision_actions:
+                # Only the branch giving up the stock decides on a transfer
+                queryset = queryset.filter(from_warehouse__branch=user_branch)
+            else:
+                queryset = queryset.filter(
+                    models.Q(from_warehouse__branch=user_branch) | 
+                    models.Q(to_warehouse__branch=user_branch)
+                )
+        if self.action in ('update', 'partial_update'):
+            # Held until update() commits, so an approval cannot land between the status check and the save
+            queryset = queryset.select_for_update(of=('self',))
         return queryset
 
     def perform_create(self, serializer):
@@ -148,34 +200,48 @@ class WarehouseTransactionViewSet(viewsets.ModelViewSet):
             action_date=timezone.now()
         )
 
-    @action(detail=True, methods=['post'])
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOrManager])
     def approve(self, request, pk=None):
-        transaction = self.get_object()
-        if transaction.status != 'Pending':
-            return Response(
-                {'error': 'Only pending transactions can be approved'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        transaction.status = 'Approved'
-        transaction.action_by = request.user
-        transaction.action_date = timezone.now()
-        transaction.save()
-        
+        """Approve a pending transfer, moving its stock from one warehouse to the other"""
+        transfer = self.get_object()
+        with transaction.atomic():
+            outcome = approve_transfers([transfer.id], request.user)[transfer.id]
+        if outcome != 'approved':
+            return Response({'error': TRANSFER_ERRORS[outcome]}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'message': 'Transaction approved successfully'})
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOrManager])
     def reject(self, request, pk=None):
-        transaction = self.get_object()
-        if transaction.status != 'Pending':
+        transfer = self.get_object()
+        if reject_transfers([transfer.id], request.user)[transfer.id] != 'rejected':
             return Response(
                 {'error': 'Only pending transactions can be rejected'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        transaction.status = 'Rejected'
-        transaction.action_by = request.user
-        transaction.action_date = timezone.now()
-        transaction.save()
-        
-        return Response({'message': 'Transaction rejected successfully'})
\ No newline at end of file
+        return Response({'message': 'Transaction rejected successfully'})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOrManager])
+    def bulk_approve(self, request):
+        """Approve many pending transfers in one transaction, reporting the outcome of each id"""
+        return self.bulk(request, approve_transfers)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOrManager])
+    def bulk_reject(self, request):
+        """Reject many pending transfers with one update, reporting the outcome of each id"""
+        return self.bulk(request, reject_transfers)
+
+    def bulk(self, request, apply):
+        serializer = TransferBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        visible = list(self.get_queryset().filter(id__in=ids).values_list('id', flat=True))
+        with transaction.atomic():
+            outcomes = apply(visible, request.user)
+        return Response({
+            'results': [{'id': transfer_id, 'status': outcomes.get(transfer_id, 'not_found')} for transfer_id in ids]
+        })
+
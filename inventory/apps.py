@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from django.db.models.signals import post_save
+        from utils.report_cache import invalidate_reports_on_write
+        from accounts.models import User
+        from core.models import Vendor
+        from .models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock
+        from .summary import invalidate_product_totals
+        invalidate_reports_on_write(GoldWarehouseStock, SilverWarehouseStock, scope_field='warehouse_id')
+        for product_model in (GoldProduct, SilverProduct):
+            post_save.connect(invalidate_product_totals, sender=product_model,
+                              dispatch_uid=f'stock-totals-{product_model._meta.label_lower}')
+        # Product listings show the vendor's name and the creator's username
+        invalidate_reports_on_write(GoldProduct, SilverProduct)
+        invalidate_reports_on_write(Vendor, fields=['name'])
+        invalidate_reports_on_write(User, fields=['username'])
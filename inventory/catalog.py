@@ -0,0 +1,274 @@
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import transaction
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+from core.models import Vendor, Warehouse
+from invoicing.vendors import normalize_vendor_name
+from utils.report_cache import report_cache
+from .ledger import record_movements
+from .stock import METALS
+from .transfers import lock_stock
+
+# Product columns an import sets, with the defaults of the optional ones
+PRODUCT_FIELDS = {
+    'name': None,
+    'weight': None,
+    'carat': None,
+    'stamp_enduser': None,
+    'cashback': Decimal('0'),
+    'cashback_unpacking': Decimal('0'),
+}
+CENT = Decimal('0.01')
+MAX_AMOUNT = Decimal('100000000')  # max_digits=10, decimal_places=2
+
+class CatalogImporter:
+    """Load a vendor catalog, and optionally stock levels, from CSV or NDJSON records.
+
+    Each record names a product by its vendor and sku, with the product
+    columns of PRODUCT_FIELDS and optionally a warehouse code and the
+    quantity held there. Records are consumed in chunks: vendor names and
+    warehouse codes not seen in an earlier chunk are resolved with one query
+    each, the chunk's existing products and stock rows are read with one
+    query each, and the changes are written with one INSERT ... ON CONFLICT
+    DO UPDATE per table plus one ledger INSERT, inside the chunk's
+    transaction. A later record for the same product or stock row in a
+    chunk wins.
+
+    Imported quantities replace the stock held; the difference goes to the
+    ledger as an Import movement. A dry run reads the same way and reports
+    the changes per product without writing anything.
+    """
+    chunk_size = 2000
+
+    def __init__(self, metal, user, branch_id=None, dry_run=False):
+        self.stock_model, self.product_model, _ = METALS[metal]
+        self.user = user
+        self.branch_id = branch_id
+        self.dry_run = dry_run
+        # Normalized vendor name -> id, None when unknown or shared by several vendors
+        self.vendors = {}
+        # Warehouse code -> id, None when unknown or outside the branch
+        self.warehouses = {}
+
+    def run(self, records):
+        report = {
+            'dry_run': self.dry_run,
+            'rows': 0,
+            'products': Counter(created=0, updated=0, unchanged=0),
+            'stock': Counter(created=0, updated=0, unchanged=0),
+            'errors': [],
+        }
+        if self.dry_run:
+            report['changes'] = []
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                report['products'] = dict(report['products'])
+                report['stock'] = dict(report['stock'])
+                return report
+            self.import_chunk(chunk, report['rows'], report)
+            report['rows'] += len(chunk)
+
+    def import_chunk(self, chunk, offset, report):
+        rows = []
+        for position, record in enumerate(chunk):
+            row, errors = self.parse(record)
+            if errors:
+                report['errors'].append({'index': offset + position, 'errors': errors})
+            else:
+                rows.append((offset + position, row))
+        self.resolve(rows)
+
+        products = {}
+        stock = {}
+        for index, row in rows:
+            errors = self.reference_errors(row)
+            if errors:
+                report['errors'].append({'index': index, 'errors': errors})
+                continue
+            key = (self.vendors[row['vendor']], row['sku'])
+            products[key] = (index, row)
+            if row['warehouse'] is not None:
+                stock[(self.warehouses[row['warehouse']], key)] = row['quantity']
+        if not products:
+            return
+
+        with transaction.atomic():
+            existing = {
+                (product.vendor_id, product.sku): product
+                for product in self.product_model.all_objects.filter(
+                    vendor_id__in={vendor_id for vendor_id, _ in products}, sku__in={sku for _, sku in products}
+                )
+            }
+            pairs = {
+                (warehouse_id, existing[key].id) for warehouse_id, key in stock if key in existing
+            }
+            held = lock_stock(self.stock_model, pairs) if not self.dry_run else self.read_stock(pairs)
+
+            written, reweighed = [], []
+            for key, (index, row) in products.items():
+                status, changes = self.product_diff(existing.get(key), row)
+                report['products'][status] += 1
+                if status != 'unchanged':
+                    written.append(self.product_model(
+                        vendor_id=key[0], sku=key[1], deleted_at=None, created_by=self.user,
+                        **{field: row[field] for field in PRODUCT_FIELDS}
+                    ))
+                if status == 'updated' and {'weight', 'carat'} & set(changes):
+                    reweighed.append(existing[key].id)
+                if self.dry_run and status != 'unchanged':
+                    report['changes'].append({
+                        'index': index, 'vendor_id': key[0], 'sku': key[1], 'product': status, 'changes': changes
+                    })
+
+            levels = []
+            for (warehouse_id, key), quantity in stock.items():
+                product = existing.get(key)
+                pair = (warehouse_id, product.id) if product else None
+                if pair not in held:
+                    status, before = 'created', 0
+                else:
+                    status, before = ('unchanged', quantity) if held[pair] == quantity else ('updated', held[pair])
+                report['stock'][status] += 1
+                if status != 'unchanged':
+                    levels.append((warehouse_id, key, before, quantity))
+                if self.dry_run and status != 'unchanged':
+                    report['changes'].append({
+                        'index': products[key][0], 'vendor_id': key[0], 'sku': key[1], 'warehouse_id': warehouse_id,
+                        'stock': status, 'changes': {'quantity': [before, quantity]}
+                    })
+
+            if not self.dry_run:
+                self.write(existing, written, levels, reweighed)
+
+    def write(self, existing, written, levels, reweighed):
+        """Upsert the chunk's changed products and stock rows and record the stock movements"""
+        fields = list(PRODUCT_FIELDS) + ['deleted_at', 'updated_date']
+        for product in self.product_model.objects.bulk_create(
+            written, update_conflicts=True, unique_fields=['vendor', 'sku'], update_fields=fields
+        ):
+            existing[(product.vendor_id, product.sku)] = product
+
+        now = timezone.now()
+        self.stock_model.objects.bulk_create([
+            self.stock_model(warehouse_id=warehouse_id, product_id=existing[key].id, quantity=quantity,
+                             deleted_at=None, created_by=self.user, created_date=now, updated_date=now)
+            for warehouse_id, key, _, quantity in levels
+        ], update_conflicts=True, unique_fields=['warehouse', 'product'], update_fields=['quantity', 'deleted_at', 'updated_date'])
+        record_movements(self.stock_model, [
+            (warehouse_id, existing[key].id, quantity - before) for warehouse_id, key, before, quantity in levels
+        ], 'Import')
+
+        # Upserts send no post_save; stock totals also depend on the weight and carat of the products held
+        if written:
+            report_cache.invalidate(self.product_model)
+        warehouse_ids = {warehouse_id for warehouse_id, _, _, _ in levels}
+        if reweighed:
+            warehouse_ids.update(
+                self.stock_model.objects.filter(product_id__in=reweighed).values_list('warehouse_id', flat=True).distinct()
+            )
+        if warehouse_ids:
+            report_cache.invalidate(self.stock_model, warehouse_ids)
+
+    def read_stock(self, pairs):
+        """Live quantities of `pairs` without locking them, for dry runs"""
+        if not pairs:
+            return {}
+        rows = self.stock_model.all_objects.filter(
+            warehouse_id__in={warehouse_id for warehouse_id, _ in pairs},
+            product_id__in={product_id for _, product_id in pairs}
+        ).values_list('warehouse_id', 'product_id', 'quantity', 'deleted_at')
+        return {
+            (warehouse_id, product_id): 0 if deleted_at else quantity
+            for warehouse_id, product_id, quantity, deleted_at in rows
+            if (warehouse_id, product_id) in pairs
+        }
+
+    def product_diff(self, product, row):
+        """('created' | 'updated' | 'unchanged', {field: [old, new]}) for an imported row"""
+        if product is None:
+            return 'created', {field: [None, str(row[field])] for field in PRODUCT_FIELDS}
+        changes = {
+            field: [str(getattr(product, field)), str(row[field])]
+            for field in PRODUCT_FIELDS if getattr(product, field) != row[field]
+        }
+        if product.deleted_at is not None:
+            changes['deleted_at'] = [product.deleted_at.isoformat(), None]
+        return ('updated' if changes else 'unchanged'), changes
+
+    def parse(self, record):
+        """Clean one record into a row dict, returning (row, errors)"""
+        if not isinstance(record, dict):
+            return None, {'non_field_errors': ['Expected a JSON object or a CSV row']}
+        row, errors = {}, {}
+        for field, max_length in [('sku', 64), ('name', 255), ('vendor', None)]:
+            value = str(record.get(field) or '').strip()
+            if not value:
+                errors[field] = ['This field is required.']
+            elif max_length and len(value) > max_length:
+                errors[field] = [f'Ensure this field has no more than {max_length} characters.']
+            row[field] = value
+        row['vendor'] = normalize_vendor_name(row['vendor'])
+
+        for field, default in PRODUCT_FIELDS.items():
+            if field == 'name':
+                continue
+            value = record.get(field)
+            if value is None or str(value).strip() == '':
+                if default is None:
+                    errors[field] = ['This field is required.']
+                row[field] = default
+                continue
+            try:
+                row[field] = Decimal(str(value).strip()).quantize(CENT)
+            except InvalidOperation:
+                errors[field] = ['A valid number is required.']
+                continue
+            if not row[field].is_finite() or abs(row[field]) >= MAX_AMOUNT:
+                errors[field] = ['Ensure that there are no more than 10 digits in total.']
+
+        row['warehouse'] = str(record.get('warehouse') or '').strip() or None
+        quantity = record.get('quantity')
+        row['quantity'] = None
+        if quantity is not None and str(quantity).strip() != '':
+            try:
+                row['quantity'] = int(str(quantity).strip())
+            except ValueError:
+                errors['quantity'] = ['A valid integer is required.']
+            else:
+                if row['quantity'] < 0:
+                    errors['quantity'] = ['Ensure this value is greater than or equal to 0.']
+        if row['warehouse'] is None and row['quantity'] is not None:
+            errors['warehouse'] = ['A quantity needs the code of the warehouse holding it.']
+        elif row['warehouse'] is not None and row['quantity'] is None and 'quantity' not in errors:
+            errors['quantity'] = ['A warehouse needs the quantity held there.']
+        return row, errors
+
+    def resolve(self, rows):
+        """Look up the vendor names and warehouse codes not seen before, one query each"""
+        names = {row['vendor'] for _, row in rows} - set(self.vendors)
+        if names:
+            found = {}
+            for vendor_id, name in Vendor.objects.annotate(key=Lower(Trim('name'))).filter(key__in=names).values_list('id', 'key'):
+                # None marks a name shared by several vendors, which is left unresolved
+                found[name] = None if name in found else vendor_id
+            self.vendors.update({name: found.get(name) for name in names})
+
+        codes = {row['warehouse'] for _, row in rows if row['warehouse']} - set(self.warehouses)
+        if codes:
+            warehouses = Warehouse.objects.filter(code__in=codes)
+            if self.branch_id is not None:
+                warehouses = warehouses.filter(branch_id=self.branch_id)
+            found = dict(warehouses.values_list('code', 'id'))
+            self.warehouses.update({code: found.get(code) for code in codes})
+
+    def reference_errors(self, row):
+        errors = {}
+        if self.vendors[row['vendor']] is None:
+            errors['vendor'] = [f'No single vendor is named "{row["vendor"]}".']
+        if row['warehouse'] is not None and self.warehouses[row['warehouse']] is None:
+            errors['warehouse'] = [f'Invalid warehouse code "{row["warehouse"]}" - object does not exist.']
+        return errors
@@ -0,0 +1,141 @@
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import (
+    GoldWarehouseStock, SilverWarehouseStock, GoldStockMovement, SilverStockMovement,
+    StockSnapshot, GoldStockSnapshotLine, SilverStockSnapshotLine
+)
+
+# Movement and snapshot line models per stock model
+LEDGERS = {
+    GoldWarehouseStock: (GoldStockMovement, GoldStockSnapshotLine),
+    SilverWarehouseStock: (SilverStockMovement, SilverStockSnapshotLine),
+}
+
+# Advisory lock held shared by movement writers and exclusively while a snapshot is cut
+LEDGER_LOCK = 7206201
+
+class NoStockHistory(Exception):
+    def __init__(self, as_of):
+        self.as_of = as_of
+        super().__init__(f'No stock history as of {as_of}')
+
+def record_movements(stock_model, movements, reason, reference_id=None):
+    """Append (warehouse_id, product_id, delta) quantity changes to the ledger in one INSERT.
+
+    A movement may carry its own reference as a fourth element, overriding `reference_id`.
+    Movements are stamped under LEDGER_LOCK, held until the transaction ends,
+    so a snapshot never cuts in between a movement's stamp and its commit.
+    """
+    movement_model, _ = LEDGERS[stock_model]
+    movements = [movement for movement in movements if movement[2]]
+    if not movements:
+        return
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock_shared(%s)', [LEDGER_LOCK])
+        now = timezone.now()
+        movement_model.objects.bulk_create([
+            movement_model(warehouse_id=movement[0], product_id=movement[1], delta=movement[2], reason=reason,
+                           reference_id=movement[3] if len(movement) > 3 else reference_id, created_date=now)
+            for movement in movements
+        ])
+
+def snapshot_before(as_of):
+    """The latest snapshot taken at or before `as_of`; NoStockHistory if there is none"""
+    snapshot = StockSnapshot.objects.filter(taken_at__lte=as_of).order_by('-taken_at').first()
+    if snapshot is None:
+        raise NoStockHistory(as_of)
+    return snapshot
+
+def ledger_quantities(stock_model, snapshot, as_of, warehouse_ids=None):
+    """SQL and params for the non-zero (warehouse_id, product_id, quantity) of every stock row at `as_of`.
+
+    Reads the lines of `snapshot` plus the movements since it, so the cost is
+    bounded by the snapshot size and the tail of movements after it.
+    """
+    movement_model, line_model = LEDGERS[stock_model]
+    line_where = 'snapshot_id = %s'
+    line_params = [snapshot.id]
+    movement_where = 'created_date > %s AND created_date <= %s'
+    movement_params = [snapshot.taken_at, as_of]
+    if warehouse_ids is not None:
+        line_where += ' AND warehouse_id = ANY(%s)'
+        line_params.append(list(warehouse_ids))
+        movement_where += ' AND warehouse_id = ANY(%s)'
+        movement_params.append(list(warehouse_ids))
+    sql = f"""
+        SELECT warehouse_id, product_id, SUM(quantity) AS quantity
+        FROM (
+            SELECT warehouse_id, product_id, quantity FROM {line_model._meta.db_table} WHERE {line_where}
+            UNION ALL
+            SELECT warehouse_id, product_id, delta FROM {movement_model._meta.db_table} WHERE {movement_where}
+        ) AS ledger
+        GROUP BY warehouse_id, product_id
+        HAVING SUM(quantity) <> 0
+    """
+    return sql, line_params + movement_params
+
+def quantity_as_of(stock_model, snapshot, as_of):
+    """Expression giving a stock row's quantity at `as_of`, for annotating a stock queryset"""
+    movement_model, line_model = LEDGERS[stock_model]
+    pair = {'warehouse_id': OuterRef('warehouse_id'), 'product_id': OuterRef('product_id')}
+    line = line_model.objects.filter(snapshot=snapshot, **pair).values('quantity')
+    tail = movement_model.objects.filter(
+        created_date__gt=snapshot.taken_at, created_date__lte=as_of, **pair
+    ).values('warehouse_id').annotate(total=Sum('delta')).values('total')
+    return Coalesce(Subquery(line), Value(0)) + Coalesce(Subquery(tail), Value(0))
+
+def take_snapshot(taken_at=None):
+    """Write the quantities of both metals at `taken_at` as a new snapshot.
+
+    The snapshot is built from the previous one plus the movements since,
+    the same way point-in-time reads are. The first snapshot starts the
+    ledger from the stock tables as they are now, so it is always taken now.
+
+    LEDGER_LOCK is taken exclusively first: it waits for the transactions
+    that stamped movements to end and holds off new ones until the snapshot
+    commits, so every movement stamped up to `taken_at` (never later than
+    now) is visible to it.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LEDGER_LOCK])
+        previous = StockSnapshot.objects.select_for_update().order_by('-taken_at').first()
+        now = timezone.now()
+        if previous is None or taken_at is None or taken_at > now:
+            taken_at = now
+        if previous is not None and taken_at <= previous.taken_at:
+            return previous
+        snapshot = StockSnapshot.objects.create(taken_at=taken_at)
+        with connection.cursor() as cursor:
+            for stock_model, (_, line_model) in LEDGERS.items():
+                if previous is None:
+                    sql, params = (
+                        f"SELECT warehouse_id, product_id, quantity FROM {stock_model._meta.db_table} "
+                        f"WHERE quantity <> 0", []
+                    )
+                else:
+                    sql, params = ledger_quantities(stock_model, previous, taken_at)
+                cursor.execute(f"""
+                    INSERT INTO {line_model._meta.db_table} (snapshot_id, warehouse_id, product_id, quantity)
+                    SELECT %s, warehouse_id, product_id, quantity FROM ({sql}) AS quantities
+                """, [snapshot.id] + params)
+    return snapshot
+
+def prune_history(before):
+    """Fold the history before `before` into the latest snapshot taken by then.
+
+    Movements up to that snapshot and the snapshots older than it are
+    deleted; reads as of an earlier time then raise NoStockHistory. Returns
+    the number of movements deleted.
+    """
+    horizon = StockSnapshot.objects.filter(taken_at__lte=before).order_by('-taken_at').first()
+    if horizon is None:
+        return 0
+    deleted = 0
+    with transaction.atomic():
+        for movement_model, _ in LEDGERS.values():
+            deleted += movement_model.objects.filter(created_date__lte=horizon.taken_at).delete()[0]
+        StockSnapshot.objects.filter(taken_at__lt=horizon.taken_at).delete()
+    return deleted
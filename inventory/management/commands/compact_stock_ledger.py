@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from inventory.ledger import prune_history, take_snapshot
+
+class Command(BaseCommand):
+    help = 'Snapshot stock quantities from the movement ledger, optionally dropping movements already folded in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lag', type=int, default=0, help='Minutes behind now to take the snapshot at')
+        parser.add_argument('--keep-days', type=int,
+                            help='Delete movements and snapshots no longer needed for reads in the last this many days')
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot(timezone.now() - timedelta(minutes=options['lag']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Stock snapshot at {snapshot.taken_at}: {snapshot.gold_lines.count()} gold and '
+            f'{snapshot.silver_lines.count()} silver lines'
+        ))
+        if options['keep_days'] is not None:
+            deleted = prune_history(timezone.now() - timedelta(days=options['keep_days']))
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} movements folded into older snapshots'))
@@ -0,0 +1,52 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from accounts.models import User
+from inventory.catalog import CatalogImporter
+from inventory.stock import METALS
+from utils.parsers import CSVParser, NDJSONParser
+
+PARSERS = {'csv': CSVParser, 'ndjson': NDJSONParser}
+
+class Command(BaseCommand):
+    help = 'Create or update products by vendor and sku, and optionally set their stock, from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File with a header row (CSV) or one JSON object per line (NDJSON)')
+        parser.add_argument('--metal', choices=list(METALS), default='gold')
+        parser.add_argument('--user', required=True, help='Username recorded as the creator of new rows')
+        parser.add_argument('--format', choices=list(PARSERS), help='Defaults to the file extension')
+        parser.add_argument('--encoding', default='utf-8')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+        parser.add_argument('--json', action='store_true', help='Print the full report, with errors and changes, as JSON')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if file_format not in PARSERS:
+            raise CommandError(f'Cannot tell the format of {options["path"]}; pass --format')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named "{options["user"]}"')
+
+        started = time.perf_counter()
+        importer = CatalogImporter(options['metal'], user, dry_run=options['dry_run'])
+        with open(options['path'], 'rb') as stream:
+            report = importer.run(PARSERS[file_format].iter_records(stream, options['encoding']))
+        elapsed = time.perf_counter() - started
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, cls=DjangoJSONEncoder))
+            return
+        for error in report['errors'][:20]:
+            self.stderr.write(f"Row {error['index']}: {json.dumps(error['errors'])}")
+        if len(report['errors']) > 20:
+            self.stderr.write(f"... and {len(report['errors']) - 20} more rejected rows")
+        products, stock = report['products'], report['stock']
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would import' if options['dry_run'] else 'Imported'} {report['rows']} rows in {elapsed:.2f}s: "
+            f"products {products['created']} created, {products['updated']} updated, {products['unchanged']} unchanged; "
+            f"stock {stock['created']} created, {stock['updated']} updated, {stock['unchanged']} unchanged; "
+            f"{len(report['errors'])} rejected"
+        ))
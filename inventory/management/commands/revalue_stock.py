@@ -0,0 +1,35 @@
+import json
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from inventory.valuation import METALS, StockBook
+
+class Command(BaseCommand):
+    help = 'Value all stock of a metal at one or more prices per gram of fine metal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('prices', nargs='+', type=Decimal, help='Prices per gram of 24K gold or of silver')
+        parser.add_argument('--metal', choices=list(METALS), default='gold')
+        parser.add_argument('--branch', type=int, help='Only value the stock of this branch')
+        parser.add_argument('--json', action='store_true', help='Print the full breakdown per carat and branch as JSON')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        book = StockBook.load(options['metal'], branch_id=options['branch'])
+        loaded = time.perf_counter()
+        result = book.revalue(options['prices'])
+        revalued = time.perf_counter()
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        total = result['total']
+        self.stdout.write(
+            f"{options['metal'].title()}: {result['stock_rows']} stock rows, {total['quantity']} pieces, "
+            f"{total['weight']:.2f}g ({total['fine_weight']:.2f}g fine), making {total['making_value']:.2f}"
+        )
+        for price, metal_value, total_value in zip(result['prices'], total['metal_values'], total['total_values']):
+            self.stdout.write(f'  at {price:>12.2f}: metal {metal_value:>18.2f}  with making {total_value:>18.2f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded in {loaded - started:.2f}s, revalued {len(result["prices"])} prices in {revalued - loaded:.3f}s'
+        ))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:43
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build indexes without blocking writes on live tables
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_access_pattern_indexes'),
+        ('inventory', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='goldproduct',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='gold_products_live_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='goldproduct',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['vendor', 'created_date'], name='gold_products_live_vendor_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='goldwarehousestock',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['warehouse', 'created_date'], name='gold_stock_live_warehouse_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='goldwarehousestock',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='gold_stock_live_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverproduct',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='silver_products_live_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverproduct',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['vendor', 'created_date'], name='silver_products_live_vendor'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverwarehousestock',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['warehouse', 'created_date'], name='silver_stock_live_warehouse'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverwarehousestock',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_date'], name='silver_stock_live_created_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_customer_stats'),
+        ('inventory', '0002_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+            ],
+            options={
+                'db_table': 'stock_snapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='GoldStockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.BigIntegerField()),
+                ('reason', models.CharField(choices=[('Invoice', 'Invoice'), ('Adjustment', 'Adjustment'), ('Transfer', 'Transfer'), ('Import', 'Import'), ('Manual', 'Manual')], max_length=16)),
+                ('reference_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.goldproduct')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.warehouse')),
+            ],
+            options={
+                'db_table': 'gold_stock_movements',
+                'indexes': [models.Index(fields=['warehouse', 'product', 'created_date'], name='gold_movements_stock_idx'), models.Index(fields=['created_date'], name='gold_movements_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SilverStockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.BigIntegerField()),
+                ('reason', models.CharField(choices=[('Invoice', 'Invoice'), ('Adjustment', 'Adjustment'), ('Transfer', 'Transfer'), ('Import', 'Import'), ('Manual', 'Manual')], max_length=16)),
+                ('reference_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.silverproduct')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.warehouse')),
+            ],
+            options={
+                'db_table': 'silver_stock_movements',
+                'indexes': [models.Index(fields=['warehouse', 'product', 'created_date'], name='silver_movements_stock_idx'), models.Index(fields=['created_date'], name='silver_movements_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SilverStockSnapshotLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.BigIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.silverproduct')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.warehouse')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='silver_lines', to='inventory.stocksnapshot')),
+            ],
+            options={
+                'db_table': 'silver_stock_snapshot_lines',
+                'unique_together': {('snapshot', 'warehouse', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GoldStockSnapshotLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.BigIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.goldproduct')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.warehouse')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gold_lines', to='inventory.stocksnapshot')),
+            ],
+            options={
+                'db_table': 'gold_stock_snapshot_lines',
+                'unique_together': {('snapshot', 'warehouse', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_transfer_product'),
+        ('inventory', '0003_stock_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goldproduct',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='silverproduct',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='goldproduct',
+            constraint=models.UniqueConstraint(fields=('vendor', 'sku'), name='gold_products_vendor_sku'),
+        ),
+        migrations.AddConstraint(
+            model_name='silverproduct',
+            constraint=models.UniqueConstraint(fields=('vendor', 'sku'), name='silver_products_vendor_sku'),
+        ),
+    ]
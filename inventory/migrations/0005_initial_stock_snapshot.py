@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def seed_snapshot(apps, schema_editor):
+    """Start the ledger from the stock held now, so point-in-time reads work before the first compaction"""
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    if StockSnapshot.objects.exists():
+        return
+    snapshot = StockSnapshot.objects.create(taken_at=timezone.now())
+    with schema_editor.connection.cursor() as cursor:
+        for stock_table, line_table in [
+            ('gold_warehouse_stock', 'gold_stock_snapshot_lines'),
+            ('silver_warehouse_stock', 'silver_stock_snapshot_lines'),
+        ]:
+            cursor.execute(f"""
+                INSERT INTO {line_table} (snapshot_id, warehouse_id, product_id, quantity)
+                SELECT %s, warehouse_id, product_id, quantity FROM {stock_table} WHERE quantity <> 0
+            """, [snapshot.id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_product_sku'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_snapshot, migrations.RunPython.noop),
+    ]
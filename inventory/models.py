@@ -1,8 +1,10 @@
 from django.db import models
+from django.utils import timezone
 from utils.mixins import SoftDeleteModel, TimestampedModel, CreatedByModel
 
 class GoldProduct(SoftDeleteModel, TimestampedModel, CreatedByModel):
     vendor = models.ForeignKey('core.Vendor', on_delete=models.CASCADE, related_name='gold_products')
+    sku = models.CharField(max_length=64, null=True, blank=True)  # The vendor's code, the key catalog imports upsert on
     name = models.CharField(max_length=255)
     weight = models.DecimalField(max_digits=10, decimal_places=2)
     carat = models.DecimalField(max_digits=10, decimal_places=2)
@@ -12,12 +14,20 @@ class GoldProduct(SoftDeleteModel, TimestampedModel, CreatedByModel):
     
     class Meta:
         db_table = 'gold_products'
+        indexes = [
+            models.Index(fields=['created_date'], name='gold_products_live_created_idx', condition=models.Q(deleted_at__isnull=True)),
+            models.Index(fields=['vendor', 'created_date'], name='gold_products_live_vendor_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'sku'], name='gold_products_vendor_sku'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.weight}g - {self.carat}K"
 
 class SilverProduct(SoftDeleteModel, TimestampedModel, CreatedByModel):
     vendor = models.ForeignKey('core.Vendor', on_delete=models.CASCADE, related_name='silver_products')
+    sku = models.CharField(max_length=64, null=True, blank=True)  # The vendor's code, the key catalog imports upsert on
     name = models.CharField(max_length=255)
     weight = models.DecimalField(max_digits=10, decimal_places=2)
     carat = models.DecimalField(max_digits=10, decimal_places=2)
@@ -27,6 +37,13 @@ class SilverProduct(SoftDeleteModel, TimestampedModel, CreatedByModel):
     
     class Meta:
         db_table = 'silver_products'
+        indexes = [
+            models.Index(fields=['created_date'], name='silver_products_live_created', condition=models.Q(deleted_at__isnull=True)),
+            models.Index(fields=['vendor', 'created_date'], name='silver_products_live_vendor', condition=models.Q(deleted_at__isnull=True)),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'sku'], name='silver_products_vendor_sku'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.weight}g - {self.carat}K"
@@ -39,6 +56,10 @@ class GoldWarehouseStock(SoftDeleteModel, TimestampedModel, CreatedByModel):
     class Meta:
         db_table = 'gold_warehouse_stock'
         unique_together = ['warehouse', 'product']
+        indexes = [
+            models.Index(fields=['warehouse', 'created_date'], name='gold_stock_live_warehouse_idx', condition=models.Q(deleted_at__isnull=True)),
+            models.Index(fields=['created_date'], name='gold_stock_live_created_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.warehouse.code} - Qty: {self.quantity}"
@@ -51,6 +72,77 @@ class SilverWarehouseStock(SoftDeleteModel, TimestampedModel, CreatedByModel):
     class Meta:
         db_table = 'silver_warehouse_stock'
         unique_together = ['warehouse', 'product']
+        indexes = [
+            models.Index(fields=['warehouse', 'created_date'], name='silver_stock_live_warehouse', condition=models.Q(deleted_at__isnull=True)),
+            models.Index(fields=['created_date'], name='silver_stock_live_created_idx', condition=models.Q(deleted_at__isnull=True)),
+        ]
     
     def __str__(self):
-        return f"{self.product.name} - {self.warehouse.code} - Qty: {self.quantity}"
\ No newline at end of file
+        return f"{self.product.name} - {self.warehouse.code} - Qty: {self.quantity}"
+
+class StockMovement(models.Model):  # One row per quantity change, never updated; see inventory.ledger
+    REASON_CHOICES = [
+        ('Invoice', 'Invoice'),
+        ('Adjustment', 'Adjustment'),
+        ('Transfer', 'Transfer'),
+        ('Import', 'Import'),
+        ('Manual', 'Manual'),
+    ]
+
+    warehouse = models.ForeignKey('core.Warehouse', on_delete=models.CASCADE, related_name='+')
+    delta = models.BigIntegerField()
+    reason = models.CharField(max_length=16, choices=REASON_CHOICES)
+    reference_id = models.BigIntegerField(null=True, blank=True)
+    created_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        abstract = True
+
+class GoldStockMovement(StockMovement):
+    product = models.ForeignKey(GoldProduct, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        db_table = 'gold_stock_movements'
+        indexes = [
+            models.Index(fields=['warehouse', 'product', 'created_date'], name='gold_movements_stock_idx'),
+            models.Index(fields=['created_date'], name='gold_movements_created_idx'),
+        ]
+
+class SilverStockMovement(StockMovement):
+    product = models.ForeignKey(SilverProduct, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        db_table = 'silver_stock_movements'
+        indexes = [
+            models.Index(fields=['warehouse', 'product', 'created_date'], name='silver_movements_stock_idx'),
+            models.Index(fields=['created_date'], name='silver_movements_created_idx'),
+        ]
+
+class StockSnapshot(models.Model):  # Quantities of both metals at taken_at, written by `compact_stock_ledger`
+    taken_at = models.DateTimeField(unique=True)
+
+    class Meta:
+        db_table = 'stock_snapshots'
+
+    def __str__(self):
+        return f"Stock snapshot at {self.taken_at}"
+
+class GoldStockSnapshotLine(models.Model):  # Only non-zero quantities are kept
+    snapshot = models.ForeignKey(StockSnapshot, on_delete=models.CASCADE, related_name='gold_lines')
+    warehouse = models.ForeignKey('core.Warehouse', on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey(GoldProduct, on_delete=models.CASCADE, related_name='+')
+    quantity = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'gold_stock_snapshot_lines'
+        unique_together = ['snapshot', 'warehouse', 'product']
+
+class SilverStockSnapshotLine(models.Model):  # Only non-zero quantities are kept
+    snapshot = models.ForeignKey(StockSnapshot, on_delete=models.CASCADE, related_name='silver_lines')
+    warehouse = models.ForeignKey('core.Warehouse', on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey(SilverProduct, on_delete=models.CASCADE, related_name='+')
+    quantity = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'silver_stock_snapshot_lines'
+        unique_together = ['snapshot', 'warehouse', 'product']
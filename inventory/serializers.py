@@ -7,7 +7,7 @@ class GoldProductSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = GoldProduct
-        fields = ['id', 'vendor', 'vendor_name', 'name', 'weight', 'carat', 
+        fields = ['id', 'vendor', 'vendor_name', 'sku', 'name', 'weight', 'carat', 
                  'stamp_enduser', 'cashback', 'cashback_unpacking', 'created_date', 
                  'updated_date', 'created_by', 'created_by_username']
         read_only_fields = ['id', 'created_date', 'updated_date', 'created_by_username']
@@ -18,7 +18,7 @@ class SilverProductSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = SilverProduct
-        fields = ['id', 'vendor', 'vendor_name', 'name', 'weight', 'carat', 
+        fields = ['id', 'vendor', 'vendor_name', 'sku', 'name', 'weight', 'carat', 
                  'stamp_enduser', 'cashback', 'cashback_unpacking', 'created_date', 
                  'updated_date', 'created_by', 'created_by_username']
         read_only_fields = ['id', 'created_date', 'updated_date', 'created_by_username']
@@ -38,6 +38,13 @@ class GoldWarehouseStockSerializer(serializers.ModelSerializer):
                  'quantity', 'created_date', 'updated_date', 'created_by', 'created_by_username']
         read_only_fields = ['id', 'created_date', 'updated_date', 'created_by_username']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Listing `?as_of=` annotates the quantity the stock ledger gives for that time
+        if hasattr(instance, 'as_of_quantity'):
+            data['quantity'] = instance.as_of_quantity
+        return data
+
 class SilverWarehouseStockSerializer(serializers.ModelSerializer):
     warehouse_code = serializers.CharField(source='warehouse.code', read_only=True)
     warehouse_branch = serializers.CharField(source='warehouse.branch.name', read_only=True)
@@ -53,17 +60,67 @@ class SilverWarehouseStockSerializer(serializers.ModelSerializer):
                  'quantity', 'created_date', 'updated_date', 'created_by', 'created_by_username']
         read_only_fields = ['id', 'created_date', 'updated_date', 'created_by_username']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Listing `?as_of=` annotates the quantity the stock ledger gives for that time
+        if hasattr(instance, 'as_of_quantity'):
+            data['quantity'] = instance.as_of_quantity
+        return data
+
 # Stock Summary Serializers
+class StockAsOfSerializer(serializers.Serializer):
+    as_of = serializers.DateTimeField(required=False)
+
+class GoldStockSummaryFilterSerializer(StockAsOfSerializer):
+    gold_price_24 = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+
+class SilverStockSummaryFilterSerializer(StockAsOfSerializer):
+    silver_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+
 class GoldStockSummarySerializer(serializers.Serializer):
     warehouse = serializers.CharField()
     warehouse_code = serializers.CharField()
     total_products = serializers.IntegerField()
     total_quantity = serializers.IntegerField()
     total_weight = serializers.DecimalField(max_digits=15, decimal_places=2)
+    weight_24k = serializers.DecimalField(source='fine_weight', max_digits=15, decimal_places=2)
+    gold_price_24 = serializers.DecimalField(source='price', max_digits=10, decimal_places=2, allow_null=True)
+    valuation = serializers.DecimalField(max_digits=20, decimal_places=2, allow_null=True)
 
 class SilverStockSummarySerializer(serializers.Serializer):
     warehouse = serializers.CharField()
     warehouse_code = serializers.CharField()
     total_products = serializers.IntegerField()
     total_quantity = serializers.IntegerField()
-    total_weight = serializers.DecimalField(max_digits=15, decimal_places=2)
\ No newline at end of file
+    total_weight = serializers.DecimalField(max_digits=15, decimal_places=2)
+    silver_price = serializers.DecimalField(source='price', max_digits=10, decimal_places=2, allow_null=True)
+    valuation = serializers.DecimalField(max_digits=20, decimal_places=2, allow_null=True)
+
+class CatalogImportSerializer(serializers.Serializer):
+    dry_run = serializers.BooleanField(default=False)
+
+class StockValuationFilterSerializer(serializers.Serializer):
+    price = serializers.ListField(
+        child=serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0),
+        required=False, max_length=1000
+    )
+
+class StockAdjustmentLineSerializer(serializers.Serializer):
+    stock = serializers.IntegerField(required=False, min_value=1)
+    warehouse = serializers.IntegerField(required=False, min_value=1)
+    product = serializers.IntegerField(required=False, min_value=1)
+    delta = serializers.IntegerField()
+
+    def validate(self, data):
+        if 'stock' not in data and not ('warehouse' in data and 'product' in data):
+            raise serializers.ValidationError('Give either stock or both warehouse and product')
+        return data
+
+class BulkStockAdjustmentSerializer(serializers.Serializer):
+    adjustments = StockAdjustmentLineSerializer(many=True, allow_empty=False, max_length=5000)
+    all_or_nothing = serializers.BooleanField(default=False)
+
+class StockAdjustmentOutcomeSerializer(serializers.Serializer):
+    status = serializers.CharField()
+    stock = serializers.IntegerField(allow_null=True)
+    quantity = serializers.IntegerField(allow_null=True)
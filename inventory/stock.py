@@ -0,0 +1,141 @@
+from collections import defaultdict
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from core.models import Warehouse
+from utils.report_cache import report_cache
+from .ledger import record_movements
+from .models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock
+
+# Stock and product models per metal, and the carat a full-price gram is quoted at (None: priced on weight)
+METALS = {
+    'gold': (GoldWarehouseStock, GoldProduct, 24),
+    'silver': (SilverWarehouseStock, SilverProduct, None),
+}
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f'Insufficient stock for product {product_id}')
+
+
+def apply_stock_changes(stock_model, warehouse_id, changes, user, reason='Invoice', reference_id=None):
+    """Apply signed per-product quantity deltas to one warehouse's stock.
+
+    Every change is a single conditional UPDATE evaluated by the database, so
+    concurrent postings never overwrite each other. Rows are touched in product
+    id order, which keeps the row-lock order identical across transactions and
+    rules out deadlocks between them. A decrement only matches a row that still
+    holds enough stock; a miss raises InsufficientStock so the caller's
+    transaction rolls back. Increments create the stock row when it is missing.
+    The changes are written to the stock ledger under `reason`.
+    """
+    now = timezone.now()
+    # Queryset updates send no post_save, so cached stock reports are dropped here
+    if changes:
+        report_cache.invalidate(stock_model, [warehouse_id])
+    for product_id in sorted(changes):
+        delta = changes[product_id]
+        if delta < 0:
+            updated = stock_model.objects.filter(
+                warehouse_id=warehouse_id, product_id=product_id, quantity__gte=-delta
+            ).update(quantity=F('quantity') + delta, updated_date=now)
+            if not updated:
+                raise InsufficientStock(product_id)
+        elif delta > 0:
+            rows = stock_model.all_objects.filter(warehouse_id=warehouse_id, product_id=product_id)
+            values = {'quantity': F('quantity') + delta, 'deleted_at': None, 'updated_date': now}
+            if not rows.update(**values):
+                # ON CONFLICT DO NOTHING lets a concurrent insert of the same row win
+                stock_model.all_objects.bulk_create(
+                    [stock_model(warehouse_id=warehouse_id, product_id=product_id, quantity=0, created_by=user)],
+                    ignore_conflicts=True
+                )
+                rows.update(**values)
+    record_movements(stock_model, [(warehouse_id, product_id, delta) for product_id, delta in changes.items()],
+                     reason, reference_id)
+
+
+def adjust_stock(stock_model, lines, branch_id=None, all_or_nothing=False):
+    """Apply signed quantity deltas to stock rows named by id or by (warehouse, product).
+
+    `lines` are dicts with 'delta' and either 'stock' or 'warehouse' and
+    'product'; rows outside `branch_id`, when given, count as missing. One
+    SELECT resolves and locks every row in (warehouse, product) order, the
+    order apply_stock_changes() locks in, then one UPDATE adds the summed
+    delta of each row, skipping rows it would take below zero. With
+    `all_or_nothing`, nothing is updated unless every line can be applied,
+    and the lines that could have been are reported as 'skipped'. Applied
+    deltas are written to the stock ledger.
+
+    Returns one outcome per line: its status ('adjusted', 'not_found',
+    'insufficient' or 'skipped'), the stock id and the row's quantity after
+    the update.
+    Must run inside a transaction for the locks to hold until the update.
+    """
+    stock = stock_model._meta.db_table
+    ids = [line['stock'] for line in lines if line.get('stock') is not None]
+    pairs = [(line['warehouse'], line['product']) for line in lines if line.get('stock') is None]
+    where = []
+    params = []
+    if ids:
+        where.append('stock.id = ANY(%s)')
+        params.append(ids)
+    if pairs:
+        where.append(f"(stock.warehouse_id, stock.product_id) IN ({', '.join(['(%s, %s)'] * len(pairs))})")
+        params.extend(value for pair in pairs for value in pair)
+    branch_filter = ''
+    if branch_id is not None:
+        branch_filter = f'AND stock.warehouse_id IN (SELECT id FROM {Warehouse._meta.db_table} WHERE branch_id = %s)'
+        params.append(branch_id)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT stock.id, stock.warehouse_id, stock.product_id, stock.quantity
+            FROM {stock} AS stock
+            WHERE stock.deleted_at IS NULL AND ({' OR '.join(where)}) {branch_filter}
+            ORDER BY stock.warehouse_id, stock.product_id
+            FOR UPDATE
+        """, params)
+        rows = cursor.fetchall()
+
+        by_id = {row[0]: row for row in rows}
+        by_pair = {(row[1], row[2]): row for row in rows}
+        targets = [by_id.get(line['stock']) if line.get('stock') is not None else by_pair.get((line['warehouse'], line['product']))
+                   for line in lines]
+        deltas = defaultdict(int)
+        for line, row in zip(lines, targets):
+            if row:
+                deltas[row[0]] += line['delta']
+        quantities = {row[0]: row[3] for row in rows}
+        short = {stock_id for stock_id, delta in deltas.items() if quantities[stock_id] + delta < 0}
+
+        if deltas and not (all_or_nothing and (short or None in targets)):
+            values = ', '.join(['(%s::bigint, %s::bigint)'] * len(deltas))
+            cursor.execute(f"""
+                UPDATE {stock} AS stock
+                SET quantity = stock.quantity + changes.delta, updated_date = %s
+                FROM (VALUES {values}) AS changes(id, delta)
+                WHERE stock.id = changes.id AND stock.quantity + changes.delta >= 0
+                RETURNING stock.id, stock.quantity
+            """, [timezone.now()] + [value for stock_id in sorted(deltas) for value in (stock_id, deltas[stock_id])])
+            updated = dict(cursor.fetchall())
+            quantities.update(updated)
+            short = set(deltas) - set(updated)
+            if updated:
+                # Raw updates send no post_save, so cached stock reports are dropped here
+                report_cache.invalidate(stock_model, {by_id[stock_id][1] for stock_id in updated})
+                record_movements(stock_model, [
+                    (by_id[stock_id][1], by_id[stock_id][2], deltas[stock_id]) for stock_id in sorted(updated)
+                ], 'Adjustment')
+        else:
+            updated = {}
+
+    outcomes = []
+    for line, row in zip(lines, targets):
+        if row is None:
+            outcomes.append({'status': 'not_found', 'stock': line.get('stock'), 'quantity': None})
+            continue
+        status = 'adjusted' if row[0] in updated else 'insufficient' if row[0] in short else 'skipped'
+        outcomes.append({'status': status, 'stock': row[0], 'quantity': quantities[row[0]]})
+    return outcomes
@@ -0,0 +1,109 @@
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, Sum
+from core.models import Warehouse
+from invoicing.reports import fetch_dicts
+from utils.report_cache import report_cache
+from .ledger import ledger_quantities, snapshot_before
+from .stock import METALS
+
+SUM_FIELD = DecimalField(max_digits=20, decimal_places=4)
+
+def warehouse_totals(metal, warehouse_ids):
+    """Per-warehouse stock totals for `warehouse_ids`, served from one cache entry per warehouse.
+
+    The warehouses missing from the cache are aggregated together in one
+    query: weight is the product weight times the quantity held, and fine
+    weight scales it to the carat the metal is priced at. A warehouse without
+    stock is cached as zeros so it is not queried again. Entries are dropped
+    by writes to their own warehouse only.
+    """
+    stock_model, _, full_carat = METALS[metal]
+    keys = report_cache.scoped_keys(stock_model._meta.label_lower, stock_model, warehouse_ids)
+    cached = report_cache.get_many(list(keys.values()))
+    totals = {warehouse_id: cached[key] for warehouse_id, key in keys.items() if key in cached}
+    missing = [warehouse_id for warehouse_id in warehouse_ids if warehouse_id not in totals]
+    if missing:
+        weight = F('quantity') * F('product__weight')
+        empty = {'total_products': 0, 'total_quantity': 0, 'total_weight': Decimal('0'), 'fine_weight': Decimal('0')}
+        fresh = {warehouse_id: dict(empty) for warehouse_id in missing}
+        rows = stock_model.objects.filter(warehouse_id__in=missing).values('warehouse_id').annotate(
+            total_products=Count('product', distinct=True),
+            total_quantity=Sum('quantity'),
+            total_weight=Sum(weight, output_field=SUM_FIELD),
+            fine_weight=Sum(weight * F('product__carat') / full_carat if full_carat else weight, output_field=SUM_FIELD)
+        )
+        for row in rows:
+            fresh[row.pop('warehouse_id')] = row
+        report_cache.set_many({keys[warehouse_id]: row for warehouse_id, row in fresh.items()})
+        totals.update(fresh)
+    return totals
+
+def invalidate_product_totals(sender, instance, update_fields=None, **kwargs):
+    """post_save receiver dropping the cached totals of the warehouses holding a saved product.
+
+    Totals weigh every stock row by its product's weight and carat, so an
+    edit to either changes them without any stock row being written.
+    """
+    if update_fields is not None and not {'weight', 'carat'} & set(update_fields):
+        return
+    stock_model = next(stock_model for stock_model, product_model, _ in METALS.values() if product_model is sender)
+    warehouse_ids = stock_model.all_objects.filter(product_id=instance.id).values_list('warehouse_id', flat=True)
+    report_cache.invalidate(stock_model, set(warehouse_ids))
+
+def warehouse_totals_as_of(metal, warehouse_ids, as_of):
+    """Per-warehouse stock totals at `as_of`, from the stock ledger in one query.
+
+    Products count only if the warehouse held some of them at that time.
+    """
+    stock_model, product_model, full_carat = METALS[metal]
+    sql, params = ledger_quantities(stock_model, snapshot_before(as_of), as_of, warehouse_ids)
+    fine = f'products.carat / {full_carat}' if full_carat else '1'
+    rows = fetch_dicts(f"""
+        SELECT
+            ledger.warehouse_id,
+            COUNT(*) AS total_products,
+            SUM(ledger.quantity) AS total_quantity,
+            SUM(ledger.quantity * products.weight) AS total_weight,
+            SUM(ledger.quantity * products.weight * {fine}) AS fine_weight
+        FROM ({sql}) AS ledger
+        JOIN {product_model._meta.db_table} AS products ON products.id = ledger.product_id
+        GROUP BY ledger.warehouse_id
+    """, params)
+    totals = {warehouse_id: {'total_products': 0} for warehouse_id in warehouse_ids}
+    totals.update({row.pop('warehouse_id'): row for row in rows})
+    return totals
+
+def stock_summary(metal, branch_id=None, price=None, as_of=None):
+    """Stock per warehouse holding any, most units first, valued at `price` per gram of fine metal.
+
+    Without a price the valuation is None. The warehouse list is read on
+    every call so renamed codes and branches show up at once; the totals come
+    from warehouse_totals(), or from the ledger for an `as_of` time.
+    """
+    warehouses = Warehouse.objects.order_by('id')
+    if branch_id is not None:
+        warehouses = warehouses.filter(branch_id=branch_id)
+    warehouses = list(warehouses.values_list('id', 'code', 'branch__name'))
+    warehouse_ids = [warehouse_id for warehouse_id, _, _ in warehouses]
+    if as_of is None:
+        totals = warehouse_totals(metal, warehouse_ids)
+    else:
+        totals = warehouse_totals_as_of(metal, warehouse_ids, as_of)
+
+    summary = []
+    for warehouse_id, code, branch_name in warehouses:
+        row = totals[warehouse_id]
+        if not row['total_products']:
+            continue
+        summary.append({
+            'warehouse': branch_name,
+            'warehouse_code': code,
+            'total_products': row['total_products'],
+            'total_quantity': row['total_quantity'],
+            'total_weight': row['total_weight'],
+            'fine_weight': row['fine_weight'],
+            'price': price,
+            'valuation': row['fine_weight'] * price if price is not None else None,
+        })
+    summary.sort(key=lambda row: -row['total_quantity'])
+    return summary
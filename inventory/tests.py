@@ -1,3 +1,653 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+from accounts.models import User
+from core.models import Branch, Customer, Seller, Warehouse, Vendor
+from invoicing.models import GoldInvoice
+from utils.testing import QueryBudgetMixin
+from .catalog import CatalogImporter
+from .ledger import prune_history, record_movements, take_snapshot
+from .models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock, GoldStockMovement, StockSnapshot
+from .stock import apply_stock_changes
+from .valuation import StockBook
 
-# Create your tests here.
+
+class InventoryTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user('admin', 'admin@example.com', role='Admin')
+        self.branch = Branch.objects.create(name='Main', created_by=self.user)
+        self.user.branch = self.branch
+        self.user.save()
+        self.warehouse = Warehouse.objects.create(code='WH-1', branch=self.branch, created_by=self.user)
+        self.vendor = Vendor.objects.create(name='Vendor', created_by=self.user)
+        self.client.force_authenticate(self.user)
+
+    def make_product(self, model, user=None, vendor=None, **overrides):
+        fields = {
+            'vendor': vendor or self.vendor, 'name': 'Ring', 'weight': '5.00', 'carat': '21.00',
+            'stamp_enduser': '10.00', 'cashback': '0.00', 'cashback_unpacking': '0.00',
+            'created_by': user or self.user,
+        }
+        fields.update(overrides)
+        return model.objects.create(**fields)
+
+
+class QueryBudgetTests(QueryBudgetMixin, InventoryTestMixin, APITestCase):
+    """List endpoints must cost the same number of queries however full the page is"""
+    endpoints = ['gold-products', 'silver-products', 'gold-stock', 'silver-stock']
+
+    def seed(self, index):
+        user = User.objects.create_user(f'user{index}', f'user{index}@example.com', role='Manager')
+        branch = Branch.objects.create(name=f'Branch {index}', created_by=user)
+        warehouse = Warehouse.objects.create(code=f'WH-{index + 2}', branch=branch, created_by=user)
+        vendor = Vendor.objects.create(name=f'Vendor {index}', created_by=user)
+        for product_model, stock_model in [(GoldProduct, GoldWarehouseStock), (SilverProduct, SilverWarehouseStock)]:
+            product = self.make_product(product_model, user=user, vendor=vendor)
+            stock_model.objects.create(warehouse=warehouse, product=product, quantity=1, created_by=user)
+
+    def test_list_query_count_independent_of_page_size(self):
+        self.assertQueryCountIndependentOfRows([f'/api/inventory/{name}/' for name in self.endpoints])
+
+
+class CatalogCacheTests(InventoryTestMixin, APITestCase):
+    url = '/api/inventory/gold-products/'
+
+    def setUp(self):
+        super().setUp()
+        caches['reports'].clear()
+        self.product = self.make_product(GoldProduct, sku='R-1')
+
+    def names(self):
+        return [row['vendor_name'] for row in self.client.get(self.url).data['results']]
+
+    def test_unchanged_catalog_is_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        other_page = self.client.get(self.url, {'search': 'Chain'})
+        self.assertNotEqual(other_page['ETag'], etag)
+        self.assertEqual(other_page.data['count'], 0)
+
+    def test_etag_follows_the_content_not_the_cache_version(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.save()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(ctx.captured_queries, [])
+
+    def test_save_delete_and_restore_change_the_etag(self):
+        etags = [self.client.get(self.url)['ETag']]
+        for change in [
+            lambda: self.client.patch(f'{self.url}{self.product.id}/', {'weight': '6.00'}),
+            lambda: self.client.delete(f'{self.url}{self.product.id}/'),
+            lambda: self.client.post(f'{self.url}{self.product.id}/restore/'),
+        ]:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])
+            self.assertEqual(response.status_code, 200)
+            etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+        self.assertEqual(response.data['results'][0]['weight'], '6.00')
+
+    def test_vendor_renames_invalidate_but_logins_do_not(self):
+        self.assertEqual(self.names(), ['Vendor'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.name = 'Renamed'
+            self.vendor.save()
+        self.assertEqual(self.names(), ['Renamed'])
+
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_catalog_imports_invalidate(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            CatalogImporter('gold', self.user).run([
+                {'sku': 'R-2', 'vendor': 'Vendor', 'name': 'Chain', 'weight': '3', 'carat': '18', 'stamp_enduser': '5'}
+            ])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+
+class StockSummaryCacheTests(InventoryTestMixin, APITestCase):
+    url = '/api/inventory/gold-stock/summary/'
+
+    def setUp(self):
+        super().setUp()
+        caches['reports'].clear()
+        self.stock = GoldWarehouseStock.objects.create(
+            warehouse=self.warehouse, product=self.make_product(GoldProduct), quantity=4, created_by=self.user
+        )
+
+    def stock_queries(self, ctx):
+        return [query for query in ctx.captured_queries if GoldWarehouseStock._meta.db_table in query['sql']]
+
+    def test_stock_writes_invalidate_summary(self):
+        self.assertEqual(self.client.get(self.url).data[0]['total_quantity'], 4)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertEqual(self.stock_queries(ctx), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/inventory/gold-stock/{self.stock.id}/adjust_quantity/', {'adjustment': 3})
+        self.assertEqual(self.client.get(self.url).data[0]['total_quantity'], 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_stock_changes(GoldWarehouseStock, self.warehouse.id, {self.stock.product_id: -2}, self.user)
+        self.assertEqual(self.client.get(self.url).data[0]['total_quantity'], 5)
+
+    def test_product_weight_edits_invalidate_summary(self):
+        self.assertEqual(self.client.get(self.url).data[0]['total_weight'], '20.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/inventory/gold-products/{self.stock.product_id}/', {'weight': '6.00'})
+        self.assertEqual(self.client.get(self.url).data[0]['total_weight'], '24.00')
+
+    def test_moving_a_stock_row_invalidates_both_warehouses(self):
+        other = Warehouse.objects.create(code='WH-2', branch=self.branch, created_by=self.user)
+        GoldWarehouseStock.objects.create(
+            warehouse=self.warehouse, product=self.make_product(GoldProduct), quantity=1, created_by=self.user
+        )
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/inventory/gold-stock/{self.stock.id}/', {'warehouse': other.id})
+        self.assertEqual(response.status_code, 200, response.data)
+        data = self.client.get(self.url).data
+        self.assertEqual({row['warehouse_code']: row['total_quantity'] for row in data}, {'WH-1': 1, 'WH-2': 4})
+
+    def test_write_to_one_warehouse_keeps_the_others_cached(self):
+        other = Warehouse.objects.create(code='WH-2', branch=self.branch, created_by=self.user)
+        GoldWarehouseStock.objects.create(warehouse=other, product=self.stock.product, quantity=1, created_by=self.user)
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_stock_changes(GoldWarehouseStock, other.id, {self.stock.product_id: 2}, self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url).data
+        self.assertEqual({row['warehouse_code']: row['total_quantity'] for row in data}, {'WH-1': 4, 'WH-2': 3})
+        queries = self.stock_queries(ctx)
+        self.assertEqual(len(queries), 1)
+        self.assertIn(f'IN ({other.id})', queries[0]['sql'])
+
+
+class StockSummaryTests(InventoryTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        caches['reports'].clear()
+        ring = self.make_product(GoldProduct, weight='5.00', carat='21.00')
+        chain = self.make_product(GoldProduct, name='Chain', weight='2.50', carat='24.00')
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=ring, quantity=4, created_by=self.user)
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=chain, quantity=2, created_by=self.user)
+        bar = self.make_product(SilverProduct, weight='10.00', carat='925.00')
+        SilverWarehouseStock.objects.create(warehouse=self.warehouse, product=bar, quantity=3, created_by=self.user)
+
+    def test_weight_counts_every_unit(self):
+        row = self.client.get('/api/inventory/gold-stock/summary/').data[0]
+        self.assertEqual(row['total_quantity'], 6)
+        self.assertEqual(row['total_weight'], '25.00')
+        # 20g at 21K and 5g at 24K
+        self.assertEqual(row['weight_24k'], '22.50')
+        self.assertEqual(self.client.get('/api/inventory/silver-stock/summary/').data[0]['total_weight'], '30.00')
+
+    def test_valuation_at_supplied_price(self):
+        row = self.client.get('/api/inventory/gold-stock/summary/', {'gold_price_24': '4000'}).data[0]
+        self.assertEqual(row['gold_price_24'], '4000.00')
+        self.assertEqual(row['valuation'], '90000.00')
+        row = self.client.get('/api/inventory/silver-stock/summary/', {'silver_price': '50'}).data[0]
+        self.assertEqual(row['valuation'], '1500.00')
+
+    def test_valuation_at_latest_invoiced_price(self):
+        seller = Seller.objects.create(name='Seller', branch=self.branch, created_by=self.user)
+        customer = Customer.objects.create(name='Customer', phone='0100', created_by=self.user)
+        header = {'warehouse': self.warehouse, 'seller': seller, 'branch': self.branch, 'customer': customer,
+                  'total_price': 100, 'invoice_type': 'Sale', 'created_by': self.user}
+        GoldInvoice.objects.create(gold_price_21=3000, gold_price_24=3400, **header)
+        GoldInvoice.objects.create(gold_price_21=3500, gold_price_24=4000, **header)
+        row = self.client.get('/api/inventory/gold-stock/summary/').data[0]
+        self.assertEqual(row['gold_price_24'], '4000.00')
+        self.assertEqual(row['valuation'], '90000.00')
+
+    def test_valuation_without_any_price(self):
+        row = self.client.get('/api/inventory/gold-stock/summary/').data[0]
+        self.assertIsNone(row['gold_price_24'])
+        self.assertIsNone(row['valuation'])
+
+    def test_rejects_negative_price(self):
+        response = self.client.get('/api/inventory/gold-stock/summary/', {'gold_price_24': '-1'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_one_aggregate_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/inventory/gold-stock/summary/')
+        stock_queries = [query for query in ctx.captured_queries if GoldWarehouseStock._meta.db_table in query['sql']]
+        self.assertEqual(len(stock_queries), 1)
+        self.assertIn('GROUP BY', stock_queries[0]['sql'])
+
+
+class StockValuationTests(InventoryTestMixin, APITestCase):
+    url = '/api/inventory/gold-stock/valuation/'
+
+    def setUp(self):
+        super().setUp()
+        self.other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        other_warehouse = Warehouse.objects.create(code='WH-2', branch=self.other_branch, created_by=self.user)
+        ring = self.make_product(GoldProduct, weight='5.00', carat='21.00', stamp_enduser='10.00')
+        bar = self.make_product(GoldProduct, name='Bar', weight='10.00', carat='24.00', stamp_enduser='2.00')
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=ring, quantity=4, created_by=self.user)
+        GoldWarehouseStock.objects.create(warehouse=other_warehouse, product=ring, quantity=2, created_by=self.user)
+        GoldWarehouseStock.objects.create(warehouse=other_warehouse, product=bar, quantity=1, created_by=self.user)
+
+    def test_revalues_at_every_price(self):
+        response = self.client.get(self.url, {'price': ['4000', '4400']})
+        self.assertEqual(response.status_code, 200, response.data)
+        total = response.data['total']
+        self.assertEqual(response.data['stock_rows'], 3)
+        # 30g at 21K and 10g at 24K, making 10/g on the rings and 2/g on the bar
+        self.assertEqual((total['quantity'], total['weight'], total['fine_weight']), (7, 40.0, 36.25))
+        self.assertEqual(total['making_value'], 320.0)
+        self.assertEqual(total['metal_values'], [145000.0, 159500.0])
+        self.assertEqual(total['total_values'], [145320.0, 159820.0])
+
+        by_carat = {row['carat']: row for row in response.data['by_carat']}
+        self.assertEqual(by_carat[21.0]['metal_values'], [105000.0, 115500.0])
+        self.assertEqual(by_carat[24.0]['total_values'], [40020.0, 44020.0])
+        by_branch = {row['branch_name']: row for row in response.data['by_branch']}
+        self.assertEqual(by_branch['Main']['fine_weight'], 17.5)
+        self.assertEqual(by_branch['Other']['quantity'], 3)
+
+    def test_manager_sees_own_branch_only(self):
+        manager = User.objects.create_user('manager', 'manager@example.com', role='Manager', branch=self.other_branch)
+        self.client.force_authenticate(manager)
+        response = self.client.get(self.url, {'price': '4000'})
+        self.assertEqual([row['branch_name'] for row in response.data['by_branch']], ['Other'])
+        self.assertEqual(response.data['total']['quantity'], 3)
+
+    def test_requires_a_price(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'price': '-1'}).status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('revalue_stock', '4000', '4400', stdout=out)
+        self.assertIn('3 stock rows, 7 pieces', out.getvalue())
+        self.assertIn('145320.00', out.getvalue())
+
+
+@tag('benchmark')
+class StockValuationBenchmarkTests(TestCase):
+    """A million gold stock rows: a thousand products held in each of a thousand warehouses"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('admin', 'admin@example.com', role='Admin')
+        branches = Branch.objects.bulk_create([Branch(name=f'Branch {i}', created_by=user) for i in range(10)])
+        Warehouse.objects.bulk_create([
+            Warehouse(code=f'WH-{i}', branch=branches[i % 10], created_by=user) for i in range(1000)
+        ])
+        vendor = Vendor.objects.create(name='Vendor', created_by=user)
+        GoldProduct.objects.bulk_create([
+            GoldProduct(vendor=vendor, name=f'Ring {i}', weight=1 + i % 10, carat=(18, 21, 24)[i % 3],
+                        stamp_enduser=10, cashback=0, cashback_unpacking=0, created_by=user)
+            for i in range(1000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {GoldWarehouseStock._meta.db_table}
+                    (warehouse_id, product_id, quantity, created_date, updated_date, created_by_id)
+                SELECT warehouses.id, products.id, 1 + (warehouses.id + products.id) %% 5, now(), now(), %s
+                FROM {Warehouse._meta.db_table} AS warehouses CROSS JOIN {GoldProduct._meta.db_table} AS products
+            """, [user.id])
+            cursor.execute('ANALYZE')
+
+    def test_million_rows_revalued_at_a_hundred_prices(self):
+        book = StockBook.load('gold')
+        self.assertEqual(len(book), 1000 * 1000)
+
+        prices = [3000 + 10 * i for i in range(100)]
+        result = book.revalue(prices)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT SUM(stock.quantity), SUM(products.weight * stock.quantity * products.carat / 24)
+                FROM {GoldWarehouseStock._meta.db_table} AS stock
+                JOIN {GoldProduct._meta.db_table} AS products ON products.id = stock.product_id
+            """)
+            quantity, fine_weight = cursor.fetchone()
+        self.assertEqual(result['total']['quantity'], quantity)
+        self.assertAlmostEqual(result['total']['fine_weight'], float(fine_weight), places=1)
+        self.assertEqual(len(result['by_carat']), 3)
+        self.assertEqual(len(result['by_branch']), 10)
+        self.assertEqual(len(result['total']['metal_values']), 100)
+
+
+class BulkStockAdjustmentTests(InventoryTestMixin, APITestCase):
+    url = '/api/inventory/gold-stock/bulk_adjust/'
+
+    def setUp(self):
+        super().setUp()
+        self.ring = self.make_product(GoldProduct)
+        self.chain = self.make_product(GoldProduct, name='Chain')
+        self.ring_stock = GoldWarehouseStock.objects.create(
+            warehouse=self.warehouse, product=self.ring, quantity=5, created_by=self.user
+        )
+        self.chain_stock = GoldWarehouseStock.objects.create(
+            warehouse=self.warehouse, product=self.chain, quantity=1, created_by=self.user
+        )
+
+    def test_ids_must_be_positive(self):
+        response = self.client.post(self.url, {'adjustments': [{'stock': 0, 'delta': 1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('stock', response.data['adjustments'][0])
+
+    def test_reports_each_line(self):
+        adjustments = [
+            {'stock': self.ring_stock.id, 'delta': -2},
+            {'warehouse': self.warehouse.id, 'product': self.ring.id, 'delta': -1},
+            {'warehouse': self.warehouse.id, 'product': self.chain.id, 'delta': -3},
+            {'stock': 999999, 'delta': 1},
+        ]
+        response = self.client.post(self.url, {'adjustments': adjustments}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['adjusted'], response.data['failed']), (2, 2))
+        self.assertEqual(
+            [(row['status'], row['stock'], row['quantity']) for row in response.data['results']],
+            [('adjusted', self.ring_stock.id, 2), ('adjusted', self.ring_stock.id, 2),
+             ('insufficient', self.chain_stock.id, 1), ('not_found', 999999, None)]
+        )
+        self.ring_stock.refresh_from_db()
+        self.chain_stock.refresh_from_db()
+        self.assertEqual((self.ring_stock.quantity, self.chain_stock.quantity), (2, 1))
+
+    def test_all_or_nothing(self):
+        adjustments = [{'stock': self.ring_stock.id, 'delta': -2}, {'stock': self.chain_stock.id, 'delta': -3}]
+        response = self.client.post(self.url, {'adjustments': adjustments, 'all_or_nothing': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['status'] for row in response.data['results']], ['skipped', 'insufficient'])
+        self.ring_stock.refresh_from_db()
+        self.assertEqual(self.ring_stock.quantity, 5)
+
+    def test_other_branch_stock_is_not_found(self):
+        other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        manager = User.objects.create_user('manager', 'manager@example.com', role='Manager', branch=other_branch)
+        self.client.force_authenticate(manager)
+        response = self.client.post(self.url, {'adjustments': [{'stock': self.ring_stock.id, 'delta': 1}]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'not_found')
+
+    def test_rejects_lines_without_a_target(self):
+        response = self.client.post(self.url, {'adjustments': [{'warehouse': self.warehouse.id, 'delta': 1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stocktake_of_a_thousand_lines_in_two_statements(self):
+        products = GoldProduct.objects.bulk_create([
+            GoldProduct(vendor=self.vendor, name=f'Ring {i}', weight=5, carat=21, stamp_enduser=10,
+                        cashback=0, cashback_unpacking=0, created_by=self.user)
+            for i in range(1000)
+        ])
+        GoldWarehouseStock.objects.bulk_create([
+            GoldWarehouseStock(warehouse=self.warehouse, product=product, quantity=10, created_by=self.user)
+            for product in products
+        ])
+        adjustments = [
+            {'warehouse': self.warehouse.id, 'product': product.id, 'delta': -(i % 12)}
+            for i, product in enumerate(products)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'adjustments': adjustments}, format='json')
+        stock_queries = [query for query in ctx.captured_queries if GoldWarehouseStock._meta.db_table in query['sql']]
+        self.assertEqual(len(stock_queries), 2)
+        self.assertEqual(response.data['failed'], sum(1 for i in range(1000) if i % 12 > 10))
+        self.assertEqual(
+            GoldWarehouseStock.objects.filter(product__in=products).aggregate(total=Sum('quantity'))['total'],
+            sum(10 - i % 12 if i % 12 <= 10 else 10 for i in range(1000))
+        )
+
+    def test_adjust_quantity_is_a_database_side_update(self):
+        url = f'/api/inventory/gold-stock/{self.ring_stock.id}/adjust_quantity/'
+        self.assertEqual(self.client.post(url, {'adjustment': -6}).status_code, 400)
+        response = self.client.post(url, {'adjustment': -5})
+        self.assertEqual(response.data['new_quantity'], 0)
+
+
+class StockLedgerTests(InventoryTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_product(GoldProduct)
+        response = self.client.post('/api/inventory/gold-stock/', {
+            'warehouse': self.warehouse.id, 'product': self.product.id, 'quantity': 10, 'created_by': self.user.id
+        })
+        self.stock_id = response.data['id']
+
+    def quantity(self, as_of):
+        response = self.client.get('/api/inventory/gold-stock/', {'as_of': as_of.isoformat()})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['quantity'] for row in response.data['results']]
+
+    def test_point_in_time_reads(self):
+        take_snapshot()
+        opened = timezone.now()
+        apply_stock_changes(GoldWarehouseStock, self.warehouse.id, {self.product.id: -3}, self.user, reference_id=7)
+        sold = timezone.now()
+        self.client.post('/api/inventory/gold-stock/bulk_adjust/', {
+            'adjustments': [{'stock': self.stock_id, 'delta': 5}]
+        }, format='json')
+
+        self.assertEqual(self.quantity(opened), [10])
+        self.assertEqual(self.quantity(sold), [7])
+        self.assertEqual(self.quantity(timezone.now()), [12])
+        self.assertEqual(
+            list(GoldStockMovement.objects.order_by('id').values_list('reason', 'delta', 'reference_id')),
+            [('Manual', 10, None), ('Invoice', -3, 7), ('Adjustment', 5, None)]
+        )
+
+        summary = self.client.get('/api/inventory/gold-stock/summary/', {'as_of': sold.isoformat()}).data
+        self.assertEqual((summary[0]['total_quantity'], summary[0]['total_weight']), (7, '35.00'))
+        before_ledger = StockSnapshot.objects.earliest('taken_at').taken_at - timedelta(seconds=1)
+        response = self.client.get('/api/inventory/gold-stock/', {'as_of': before_ledger.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+        # A later snapshot folds the movements in and reads stay the same
+        snapshot = take_snapshot(sold)
+        self.assertEqual(list(snapshot.gold_lines.values_list('quantity', flat=True)), [7])
+        self.assertEqual(self.quantity(timezone.now()), [12])
+        self.assertEqual(prune_history(sold), 2)
+        self.assertEqual(self.quantity(timezone.now()), [12])
+        self.assertEqual(self.client.get('/api/inventory/gold-stock/', {'as_of': opened.isoformat()}).status_code, 400)
+
+    def test_reads_start_from_the_snapshot_seeded_by_the_migration(self):
+        self.assertEqual(self.quantity(timezone.now()), [10])
+
+    def test_as_of_summary_reads_one_snapshot_and_its_tail(self):
+        take_snapshot()
+        apply_stock_changes(GoldWarehouseStock, self.warehouse.id, {self.product.id: -3}, self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/inventory/gold-stock/summary/', {'as_of': timezone.now().isoformat()})
+        self.assertEqual(response.data[0]['total_quantity'], 7)
+        ledger_queries = [query for query in ctx.captured_queries if 'gold_stock_movements' in query['sql']]
+        self.assertEqual(len(ledger_queries), 1)
+        self.assertNotIn(GoldWarehouseStock._meta.db_table, ledger_queries[0]['sql'])
+
+    def test_edits_are_recorded(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.patch(f'/api/inventory/gold-stock/{self.stock_id}/', {'quantity': 4})
+        self.assertTrue(any('FOR UPDATE OF "gold_warehouse_stock"' in query['sql'] for query in ctx.captured_queries))
+        self.assertEqual(list(GoldStockMovement.objects.order_by('id').values_list('delta', flat=True)), [10, -6])
+        out = StringIO()
+        call_command('compact_stock_ledger', '--lag', '0', stdout=out)
+        self.assertIn('1 gold and 0 silver lines', out.getvalue())
+
+
+class StockSnapshotLockTests(InventoryTestMixin, APITransactionTestCase):
+    def test_snapshot_waits_for_movements_being_written(self):
+        product = self.make_product(GoldProduct)
+        take_snapshot()
+        recorded = threading.Event()
+
+        def sell():
+            try:
+                with transaction.atomic():
+                    record_movements(GoldWarehouseStock, [(self.warehouse.id, product.id, 4)], 'Manual')
+                    recorded.set()
+                    # Still open when the snapshot is cut; without the lock its stamped movement would be missed
+                    time.sleep(0.3)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=sell)
+        thread.start()
+        recorded.wait()
+        snapshot = take_snapshot()
+        thread.join()
+        self.assertEqual(list(snapshot.gold_lines.values_list('quantity', flat=True)), [4])
+
+
+class CatalogImportTests(InventoryTestMixin, APITestCase):
+    header = 'sku,vendor,name,weight,carat,stamp_enduser,warehouse,quantity\n'
+
+    def post_csv(self, body, dry_run=False):
+        url = '/api/inventory/gold-products/import/' + ('?dry_run=true' if dry_run else '')
+        response = self.client.generic('POST', url, (self.header + body).encode(), content_type='text/csv')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_creates_updates_and_reports_unchanged_rows(self):
+        existing = self.make_product(GoldProduct, sku='R-1')
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=existing, quantity=4, created_by=self.user)
+        report = self.post_csv(
+            'R-1, vendor ,Ring,5.5,21,10,WH-1,6\n'
+            'R-2,Vendor,Chain,12,18,8,WH-1,3\n'
+            'R-3,Vendor,Bangle,20,21,9,,\n'
+        )
+        self.assertEqual(report['products'], {'created': 2, 'updated': 1, 'unchanged': 0})
+        self.assertEqual(report['stock'], {'created': 1, 'updated': 1, 'unchanged': 0})
+        self.assertEqual(report['errors'], [])
+
+        existing.refresh_from_db()
+        self.assertEqual(str(existing.weight), '5.50')
+        self.assertEqual(GoldProduct.objects.count(), 3)
+        self.assertEqual(
+            dict(GoldWarehouseStock.objects.values_list('product__sku', 'quantity')), {'R-1': 6, 'R-2': 3}
+        )
+        self.assertEqual(
+            sorted(GoldStockMovement.objects.filter(reason='Import').values_list('delta', flat=True)), [2, 3]
+        )
+
+        again = self.post_csv('R-1,Vendor,Ring,5.50,21,10,WH-1,6\n')
+        self.assertEqual(again['products'], {'created': 0, 'updated': 0, 'unchanged': 1})
+        self.assertEqual(again['stock'], {'created': 0, 'updated': 0, 'unchanged': 1})
+
+    def test_dry_run_reports_the_diff_without_writing(self):
+        self.make_product(GoldProduct, sku='R-1')
+        report = self.post_csv('R-1,Vendor,Ring,6,21,10,WH-1,2\nR-2,Vendor,Chain,12,18,8,,\n', dry_run=True)
+        self.assertTrue(report['dry_run'])
+        self.assertEqual(report['products'], {'created': 1, 'updated': 1, 'unchanged': 0})
+        changes = {change['sku']: change for change in report['changes'] if 'product' in change}
+        self.assertEqual(changes['R-1']['changes'], {'weight': ['5.00', '6.00']})
+        self.assertEqual(changes['R-2']['product'], 'created')
+        stock_change = next(change for change in report['changes'] if 'stock' in change)
+        self.assertEqual(stock_change['changes'], {'quantity': [0, 2]})
+        self.assertEqual(GoldProduct.objects.count(), 1)
+        self.assertFalse(GoldWarehouseStock.objects.exists())
+        self.assertFalse(GoldStockMovement.objects.exists())
+
+    def test_bad_rows_are_reported_and_the_rest_imported(self):
+        Vendor.objects.create(name='Twin', created_by=self.user)
+        Vendor.objects.create(name='twin ', created_by=self.user)
+        report = self.post_csv(
+            'R-1,Vendor,Ring,heavy,21,10,,\n'
+            'R-2,Nobody,Ring,5,21,10,,\n'
+            'R-3,Twin,Ring,5,21,10,,\n'
+            'R-4,Vendor,Ring,5,21,10,WH-9,1\n'
+            ',Vendor,Ring,5,21,10,,\n'
+            'R-6,Vendor,Ring,5,21,10,,\n'
+        )
+        self.assertEqual([error['index'] for error in report['errors']], [0, 4, 1, 2, 3])
+        self.assertIn('weight', report['errors'][0]['errors'])
+        self.assertEqual(report['products']['created'], 1)
+        self.assertEqual(list(GoldProduct.objects.values_list('sku', flat=True)), ['R-6'])
+
+    def test_ndjson_upload_revives_deleted_products(self):
+        product = self.make_product(GoldProduct, sku='R-1')
+        product.delete()
+        response = self.client.generic(
+            'POST', '/api/inventory/gold-products/import/',
+            b'{"sku": "R-1", "vendor": "Vendor", "name": "Ring", "weight": 5, "carat": 21, "stamp_enduser": 10}\nnot json\n',
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.data['products']['updated'], 1)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertTrue(GoldProduct.objects.filter(id=product.id).exists())
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        rows = ''.join(f'R-{i},Vendor,Ring {i},{1 + i % 7},21,10,WH-1,{i % 4}\n' for i in range(1000))
+        with CaptureQueriesContext(connection) as ctx:
+            report = self.post_csv(rows)
+        self.assertEqual(report['products']['created'], 1000)
+        self.assertEqual(report['stock']['created'], 1000)
+        self.assertLessEqual(len(ctx.captured_queries), 12)
+
+    def test_command_imports_a_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(self.header + 'R-1,Vendor,Ring,5,21,10,WH-1,2\n')
+        path = file.name
+        self.addCleanup(os.remove, path)
+        out = StringIO()
+        call_command('import_catalog', path, '--user', 'admin', '--dry-run', stdout=out)
+        self.assertIn('Would import 1 rows', out.getvalue())
+        self.assertFalse(GoldProduct.objects.exists())
+        call_command('import_catalog', path, '--user', 'admin', stdout=out)
+        self.assertEqual(GoldWarehouseStock.objects.get().quantity, 2)
+
+
+@tag('benchmark')
+class CatalogImportBenchmarkTests(TransactionTestCase):
+    """A hundred thousand catalog rows from fifty vendors, stocked across ten warehouses.
+
+    Chunks commit for real, and the tables are truncated afterwards so the
+    bloat does not skew the query plans of later tests.
+    """
+
+    def test_hundred_thousand_rows(self):
+        user = User.objects.create_user('admin', 'admin@example.com', role='Admin')
+        branch = Branch.objects.create(name='Main', created_by=user)
+        Warehouse.objects.bulk_create([Warehouse(code=f'WH-{i}', branch=branch, created_by=user) for i in range(10)])
+        Vendor.objects.bulk_create([Vendor(name=f'Vendor {i}', created_by=user) for i in range(50)])
+        rows = [
+            {'sku': f'R-{i}', 'vendor': f'Vendor {i % 50}', 'name': f'Ring {i}', 'weight': str(1 + i % 9),
+             'carat': '21', 'stamp_enduser': '10', 'warehouse': f'WH-{i % 10}', 'quantity': str(i % 5)}
+            for i in range(100000)
+        ]
+
+        report = CatalogImporter('gold', user).run(rows)
+        self.assertEqual(report['products']['created'], 100000)
+        self.assertEqual(GoldWarehouseStock.objects.count(), 100000)
+
+        for row in rows[::2]:
+            row['quantity'] = str(int(row['quantity']) + 1)
+        report = CatalogImporter('gold', user).run(rows)
+        self.assertEqual(report['products']['unchanged'], 100000)
+        self.assertEqual(report['stock'], {'created': 0, 'updated': 50000, 'unchanged': 50000})
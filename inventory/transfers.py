@@ -0,0 +1,136 @@
+from collections import defaultdict
+from django.db import connection
+from django.utils import timezone
+from core.models import WarehouseTransaction
+from utils.report_cache import report_cache
+from .ledger import record_movements
+from .models import GoldWarehouseStock, SilverWarehouseStock
+
+# Transfer field naming the product, per stock model
+TRANSFER_PRODUCTS = {
+    GoldWarehouseStock: 'gold_product_id',
+    SilverWarehouseStock: 'silver_product_id',
+}
+
+def lock_stock(stock_model, pairs):
+    """Lock the stock rows of `pairs` in (warehouse, product) order; returns their live quantities"""
+    if not pairs:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT warehouse_id, product_id, CASE WHEN deleted_at IS NULL THEN quantity ELSE 0 END
+            FROM {stock_model._meta.db_table}
+            WHERE (warehouse_id, product_id) IN ({', '.join(['(%s, %s)'] * len(pairs))})
+            ORDER BY warehouse_id, product_id
+            FOR UPDATE
+        """, [value for pair in sorted(pairs) for value in pair])
+        return {(warehouse_id, product_id): quantity for warehouse_id, product_id, quantity in cursor.fetchall()}
+
+def upsert_stock(stock_model, deltas, user):
+    """Add the net quantity of each (warehouse, product) in one INSERT ... ON CONFLICT DO UPDATE.
+
+    Missing rows are created, credited rows are revived if soft-deleted, and
+    the WHERE keeps every quantity non-negative. Returns the pairs updated.
+    """
+    now = timezone.now()
+    rows = sorted((pair, delta) for pair, delta in deltas.items() if delta)
+    if not rows:
+        return set()
+    values = ', '.join(['(%s::bigint, %s::bigint, %s::bigint, %s::timestamptz, %s::timestamptz, %s::bigint)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {stock_model._meta.db_table} AS stock
+                (warehouse_id, product_id, quantity, created_date, updated_date, created_by_id)
+            VALUES {values}
+            ON CONFLICT (warehouse_id, product_id) DO UPDATE SET
+                quantity = stock.quantity + EXCLUDED.quantity,
+                deleted_at = CASE WHEN EXCLUDED.quantity > 0 THEN NULL ELSE stock.deleted_at END,
+                updated_date = EXCLUDED.updated_date
+            WHERE stock.quantity + EXCLUDED.quantity >= 0
+            RETURNING warehouse_id, product_id
+        """, [value for (warehouse_id, product_id), delta in rows for value in (warehouse_id, product_id, delta, now, now, user.id)])
+        return set(cursor.fetchall())
+
+def approve_transfers(transfer_ids, user):
+    """Approve pending transfers, moving their stock, in one pass over the whole batch.
+
+    Transfers are locked in id order, then every stock row they touch in
+    (warehouse, product) order, the order every other stock writer uses.
+    Transfers are accepted in id order while the source row, including
+    credits from earlier transfers in the batch, covers them. The accepted
+    ones are applied as one net upsert per metal, written to the ledger and
+    marked approved with one UPDATE. Must run inside a transaction.
+
+    Returns {transfer id: outcome}, the outcome being 'approved', 'not_pending',
+    'no_product' or 'insufficient'; ids that do not exist are left out.
+    """
+    transfers = list(
+        WarehouseTransaction.objects.select_for_update().filter(id__in=transfer_ids).order_by('id').values(
+            'id', 'status', 'from_warehouse_id', 'to_warehouse_id', 'quantity', 'gold_product_id', 'silver_product_id'
+        )
+    )
+    outcomes = {}
+    by_metal = defaultdict(list)
+    for transfer in transfers:
+        if transfer['status'] != 'Pending':
+            outcomes[transfer['id']] = 'not_pending'
+            continue
+        for stock_model, field in TRANSFER_PRODUCTS.items():
+            if transfer[field]:
+                by_metal[stock_model].append(transfer)
+                break
+        else:
+            outcomes[transfer['id']] = 'no_product'
+
+    approved = []
+    for stock_model, field in TRANSFER_PRODUCTS.items():
+        pairs = set()
+        for transfer in by_metal[stock_model]:
+            pairs.add((transfer['from_warehouse_id'], transfer[field]))
+            pairs.add((transfer['to_warehouse_id'], transfer[field]))
+        available = defaultdict(int, lock_stock(stock_model, pairs))
+        deltas = defaultdict(int)
+        movements = []
+        for transfer in by_metal[stock_model]:
+            source = (transfer['from_warehouse_id'], transfer[field])
+            target = (transfer['to_warehouse_id'], transfer[field])
+            if available[source] < transfer['quantity']:
+                outcomes[transfer['id']] = 'insufficient'
+                continue
+            available[source] -= transfer['quantity']
+            available[target] += transfer['quantity']
+            deltas[source] -= transfer['quantity']
+            deltas[target] += transfer['quantity']
+            movements.append((*source, -transfer['quantity'], transfer['id']))
+            movements.append((*target, transfer['quantity'], transfer['id']))
+            outcomes[transfer['id']] = 'approved'
+            approved.append(transfer['id'])
+
+        updated = upsert_stock(stock_model, deltas, user)
+        if updated != {pair for pair, delta in deltas.items() if delta}:
+            # Unreachable while every writer locks before it writes; never leave half a transfer behind
+            raise RuntimeError('Transfer stock changed while locked')
+        if movements:
+            record_movements(stock_model, movements, 'Transfer')
+            # Upserts send no post_save, so cached stock reports are dropped here
+            report_cache.invalidate(stock_model, {warehouse_id for warehouse_id, _ in deltas})
+
+    if approved:
+        now = timezone.now()
+        WarehouseTransaction.objects.filter(id__in=approved).update(
+            status='Approved', action_by=user, action_date=now, updated_date=now
+        )
+    return outcomes
+
+def reject_transfers(transfer_ids, user):
+    """Reject the pending ones of existing transfers in one UPDATE; returns {transfer id: 'rejected' or 'not_pending'}"""
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {WarehouseTransaction._meta.db_table}
+            SET status = 'Rejected', action_by_id = %s, action_date = %s, updated_date = %s
+            WHERE id = ANY(%s) AND status = 'Pending'
+            RETURNING id
+        """, [user.id, now, now, list(transfer_ids)])
+        rejected = {transfer_id for transfer_id, in cursor.fetchall()}
+    return {transfer_id: 'rejected' if transfer_id in rejected else 'not_pending' for transfer_id in transfer_ids}
@@ -0,0 +1,107 @@
+import numpy as np
+from django.db import connection
+from core.models import Branch, Warehouse
+from .stock import METALS
+
+class StockBook:
+    """Columnar copy of one metal's live stock, one array entry per stock row.
+
+    Load it once with load(), then revalue() it at any number of prices. A
+    row's metal value is linear in the price, so revaluing sums the fine
+    grams of every carat and branch first and multiplies those few totals by
+    all the prices at once; the cost per extra price does not depend on the
+    number of stock rows.
+    """
+    columns = ['quantity', 'grams', 'fine_grams', 'making', 'carat', 'branch_id']
+
+    def __init__(self, metal, quantity, grams, fine_grams, making, carat, branch_id, branch_names=None):
+        self.metal = metal
+        self.quantity = quantity
+        self.grams = grams
+        self.fine_grams = fine_grams
+        self.making = making
+        self.carat = carat
+        self.branch_id = branch_id
+        self.branch_names = branch_names or {}
+        self.carats, self.carat_index = np.unique(carat, return_inverse=True)
+        self.branches, self.branch_index = np.unique(branch_id, return_inverse=True)
+
+    @classmethod
+    def load(cls, metal, branch_id=None, chunk_size=100000):
+        """Read the live stock of `metal`, optionally of one branch, through a server-side cursor.
+
+        Weight is multiplied out by quantity in the query; making is the
+        product's stamp_enduser charged per gram.
+        """
+        stock_model, product_model, full_carat = METALS[metal]
+        fine = f'products.carat / {full_carat}' if full_carat else '1'
+        where = 'stock.deleted_at IS NULL AND stock.quantity > 0'
+        params = []
+        if branch_id is not None:
+            where += ' AND warehouses.branch_id = %s'
+            params.append(branch_id)
+        sql = f"""
+            SELECT
+                stock.quantity::float8,
+                (products.weight * stock.quantity)::float8,
+                (products.weight * stock.quantity * {fine})::float8,
+                (products.weight * stock.quantity * products.stamp_enduser)::float8,
+                products.carat::float8,
+                warehouses.branch_id
+            FROM {stock_model._meta.db_table} AS stock
+            JOIN {product_model._meta.db_table} AS products ON products.id = stock.product_id
+            JOIN {Warehouse._meta.db_table} AS warehouses ON warehouses.id = stock.warehouse_id
+            WHERE {where}
+        """
+        chunks = []
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            while rows := cursor.fetchmany(chunk_size):
+                chunks.append(np.array(rows, dtype=np.float64))
+        table = np.concatenate(chunks) if chunks else np.empty((0, len(cls.columns)))
+        branch_ids = table[:, 5].astype(np.int64)
+        branch_names = dict(Branch.all_objects.filter(id__in=np.unique(branch_ids).tolist()).values_list('id', 'name'))
+        return cls(metal, *table[:, :5].T, branch_ids, branch_names)
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def revalue(self, prices):
+        """Value the book at every price in `prices` (per gram of fine metal), in total and per carat and branch"""
+        prices = np.asarray(prices, dtype=np.float64)
+        values = np.stack([self.quantity, self.grams, self.fine_grams, self.making])
+        by_carat = np.stack([np.bincount(self.carat_index, weights=row, minlength=len(self.carats)) for row in values])
+        by_branch = np.stack([np.bincount(self.branch_index, weights=row, minlength=len(self.branches)) for row in values])
+        totals = values.sum(axis=1)
+        return {
+            'metal': self.metal,
+            'stock_rows': len(self),
+            'prices': prices.round(2).tolist(),
+            'total': self.group(totals[:, np.newaxis], prices)[0],
+            'by_carat': [
+                {'carat': round(float(carat), 2), **group}
+                for carat, group in zip(self.carats, self.group(by_carat, prices))
+            ],
+            'by_branch': [
+                {'branch_id': int(branch_id), 'branch_name': self.branch_names.get(int(branch_id)), **group}
+                for branch_id, group in zip(self.branches, self.group(by_branch, prices))
+            ],
+        }
+
+    @staticmethod
+    def group(sums, prices):
+        """Rows of quantity, weights and values at each price from a (4, groups) array of sums"""
+        quantity, grams, fine_grams, making = sums
+        metal_values = np.outer(fine_grams, prices)
+        total_values = metal_values + making[:, np.newaxis]
+        return [
+            {
+                'quantity': int(round(quantity[i])),
+                'weight': round(float(grams[i]), 2),
+                'fine_weight': round(float(fine_grams[i]), 2),
+                'making_value': round(float(making[i]), 2),
+                'metal_values': metal_values[i].round(2).tolist(),
+                'total_values': total_values[i].round(2).tolist(),
+            }
+            for i in range(len(quantity))
+        ]
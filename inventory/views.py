@@ -1,20 +1,48 @@
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Sum, Count
+from django.db import transaction
+from accounts.models import User
+from core.models import Vendor
+from invoicing.models import GoldInvoice, SilverInvoice
 from .models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock
 from .serializers import (
     GoldProductSerializer, SilverProductSerializer, 
     GoldWarehouseStockSerializer, SilverWarehouseStockSerializer,
-    GoldStockSummarySerializer, SilverStockSummarySerializer
+    GoldStockSummarySerializer, SilverStockSummarySerializer,
+    GoldStockSummaryFilterSerializer, SilverStockSummaryFilterSerializer,
+    StockValuationFilterSerializer, BulkStockAdjustmentSerializer, StockAdjustmentOutcomeSerializer,
+    StockAsOfSerializer, CatalogImportSerializer
 )
+from .catalog import CatalogImporter
+from .ledger import NoStockHistory, quantity_as_of, record_movements, snapshot_before
+from .stock import adjust_stock
+from .summary import stock_summary
+from .valuation import StockBook
+from utils.parsers import CSVParser, NDJSONParser
 from utils.permissions import IsAdminOrManager
+from utils.report_cache import cached_report, report_cache
+
+def import_catalog_response(request, metal):
+    if not hasattr(request.data, '__next__'):
+        return Response(
+            {'error': 'Expected a CSV or an NDJSON stream of products'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    options = CatalogImportSerializer(data=request.query_params)
+    options.is_valid(raise_exception=True)
+    importer = CatalogImporter(
+        metal, request.user,
+        branch_id=None if request.user.role == 'Admin' else request.user.branch_id,
+        dry_run=options.validated_data['dry_run']
+    )
+    return Response(importer.run(request.data))
 
 class GoldProductViewSet(viewsets.ModelViewSet):
-    queryset = GoldProduct.objects.all()
+    queryset = GoldProduct.objects.select_related('vendor', 'created_by')
     serializer_class = GoldProductSerializer
     permission_classes = [IsAuthenticated, IsAdminOrManager]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -26,14 +54,30 @@ class GoldProductViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def get_queryset(self):
+        if self.action == 'restore':
+            # Soft-deleted products are only reachable to restore them
+            return GoldProduct.all_objects.select_related('vendor', 'created_by')
+        return super().get_queryset()
+
+    @cached_report(GoldProduct, Vendor, User, per_branch=False)
+    def list(self, request, *args, **kwargs):
+        """Catalog pages are served from the report cache until a product, vendor name or username changes"""
+        return super().list(request, *args, **kwargs)
+
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         product = self.get_object()
         product.restore()
         return Response({'message': 'Gold product restored successfully'})
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[CSVParser, NDJSONParser])
+    def import_catalog(self, request):
+        """Create or update gold products by vendor and sku, and optionally set their stock, from CSV or NDJSON"""
+        return import_catalog_response(request, 'gold')
+
 class SilverProductViewSet(viewsets.ModelViewSet):
-    queryset = SilverProduct.objects.all()
+    queryset = SilverProduct.objects.select_related('vendor', 'created_by')
     serializer_class = SilverProductSerializer
     permission_classes = [IsAuthenticated, IsAdminOrManager]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -45,12 +89,28 @@ class SilverProductViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def get_queryset(self):
+        if self.action == 'restore':
+            # Soft-deleted products are only reachable to restore them
+            return SilverProduct.all_objects.select_related('vendor', 'created_by')
+        return super().get_queryset()
+
+    @cached_report(SilverProduct, Vendor, User, per_branch=False)
+    def list(self, request, *args, **kwargs):
+        """Catalog pages are served from the report cache until a product, vendor name or username changes"""
+        return super().list(request, *args, **kwargs)
+
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         product = self.get_object()
         product.restore()
         return Response({'message': 'Silver product restored successfully'})
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[CSVParser, NDJSONParser])
+    def import_catalog(self, request):
+        """Create or update silver products by vendor and sku, and optionally set their stock, from CSV or NDJSON"""
+        return import_catalog_response(request, 'silver')
+
 class GoldWarehouseStockViewSet(viewsets.ModelViewSet):
     queryset = GoldWarehouseStock.objects.all()
     serializer_class = GoldWarehouseStockSerializer
@@ -66,40 +126,87 @@ class GoldWarehouseStockViewSet(viewsets.ModelViewSet):
         # Filter by user's branch if not admin
         if self.request.user.role != 'Admin':
             queryset = queryset.filter(warehouse__branch=self.request.user.branch)
-        return queryset
+        if self.action == 'list':
+            queryset = self.as_of(queryset)
+        elif self.action in ('update', 'partial_update'):
+            # Held until update() commits, so the Manual movement is the change actually made
+            queryset = queryset.select_for_update(of=('self',))
+        return queryset.select_related('warehouse__branch', 'product', 'created_by')
+
+    def as_of(self, queryset):
+        """With `?as_of=`, only rows that existed then, annotated with their quantity at that time"""
+        filters = StockAsOfSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        as_of = filters.validated_data.get('as_of')
+        if as_of is None:
+            return queryset
+        try:
+            snapshot = snapshot_before(as_of)
+        except NoStockHistory as exc:
+            raise serializers.ValidationError({'as_of': [str(exc)]})
+        return queryset.filter(created_date__lte=as_of).annotate(
+            as_of_quantity=quantity_as_of(self.queryset.model, snapshot, as_of)
+        )
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        stock = serializer.save(created_by=self.request.user)
+        record_movements(self.queryset.model, [(stock.warehouse_id, stock.product_id, stock.quantity)], 'Manual')
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        warehouse_id, product_id, quantity = (
+            serializer.instance.warehouse_id, serializer.instance.product_id, serializer.instance.quantity
+        )
+        stock = serializer.save()
+        if (stock.warehouse_id, stock.product_id) == (warehouse_id, product_id):
+            movements = [(warehouse_id, product_id, stock.quantity - quantity)]
+        else:
+            movements = [(warehouse_id, product_id, -quantity), (stock.warehouse_id, stock.product_id, stock.quantity)]
+        if stock.warehouse_id != warehouse_id:
+            # post_save only drops the cached totals of the warehouse the row moved to
+            report_cache.invalidate(self.queryset.model, [warehouse_id])
+        record_movements(self.queryset.model, movements, 'Manual')
 
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Get gold stock summary by warehouse"""
-        queryset = self.get_queryset()
-        
-        summary = queryset.values(
-            'warehouse__id',
-            'warehouse__code',
-            'warehouse__branch__name'
-        ).annotate(
-            total_products=Count('product', distinct=True),
-            total_quantity=Sum('quantity'),
-            total_weight=Sum('product__weight')
-        ).order_by('-total_quantity')
-        
-        # Format the response
-        formatted_summary = []
-        for item in summary:
-            formatted_summary.append({
-                'warehouse': item['warehouse__branch__name'],
-                'warehouse_code': item['warehouse__code'],
-                'total_products': item['total_products'],
-                'total_quantity': item['total_quantity'],
-                'total_weight': item['total_weight'] or 0
-            })
-        
-        serializer = GoldStockSummarySerializer(formatted_summary, many=True)
+        """Get gold stock summary by warehouse, valued at `?gold_price_24=` or the latest invoiced price"""
+        filters = GoldStockSummaryFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        price = filters.validated_data.get('gold_price_24')
+        if price is None:
+            price = GoldInvoice.objects.order_by('-created_date', '-id').values_list('gold_price_24', flat=True).first()
+
+        try:
+            summary = stock_summary(
+                'gold',
+                branch_id=None if request.user.role == 'Admin' else request.user.branch_id,
+                price=price,
+                as_of=filters.validated_data.get('as_of')
+            )
+        except NoStockHistory as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = GoldStockSummarySerializer(summary, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdminOrManager])
+    def valuation(self, request):
+        """Value all gold stock at each `?price=` per gram of 24K gold, or the latest invoiced price"""
+        filters = StockValuationFilterSerializer(data={'price': request.query_params.getlist('price')})
+        filters.is_valid(raise_exception=True)
+        prices = filters.validated_data['price']
+        if not prices:
+            latest = GoldInvoice.objects.order_by('-created_date', '-id').values_list('gold_price_24', flat=True).first()
+            if latest is None:
+                return Response({'error': 'No price given and no invoice to take one from'}, status=status.HTTP_400_BAD_REQUEST)
+            prices = [latest]
+
+        book = StockBook.load('gold', branch_id=None if request.user.role == 'Admin' else request.user.branch_id)
+        return Response(book.revalue(prices))
+
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         stock = self.get_object()
@@ -120,21 +227,38 @@ class GoldWarehouseStockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        new_quantity = stock.quantity + adjustment
-        if new_quantity < 0:
+        with transaction.atomic():
+            [outcome] = adjust_stock(self.queryset.model, [{'stock': stock.id, 'delta': adjustment}])
+        if outcome['status'] != 'adjusted':
             return Response(
                 {'error': 'Insufficient stock'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        stock.quantity = new_quantity
-        stock.save()
-        
         return Response({
             'message': 'Stock quantity adjusted successfully',
-            'new_quantity': new_quantity
+            'new_quantity': outcome['quantity']
         })
 
+    @action(detail=False, methods=['post'])
+    def bulk_adjust(self, request):
+        """Apply many quantity adjustments in one transaction, reporting the outcome of each"""
+        serializer = BulkStockAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            outcomes = adjust_stock(
+                self.queryset.model,
+                serializer.validated_data['adjustments'],
+                branch_id=None if request.user.role == 'Admin' else request.user.branch_id,
+                all_or_nothing=serializer.validated_data['all_or_nothing']
+            )
+        failed = sum(outcome['status'] in ('not_found', 'insufficient') for outcome in outcomes)
+        return Response({
+            'adjusted': sum(outcome['status'] == 'adjusted' for outcome in outcomes),
+            'failed': failed,
+            'results': StockAdjustmentOutcomeSerializer(outcomes, many=True).data
+        }, status=status.HTTP_400_BAD_REQUEST if failed and serializer.validated_data['all_or_nothing'] else status.HTTP_200_OK)
+
 class SilverWarehouseStockViewSet(viewsets.ModelViewSet):
     queryset = SilverWarehouseStock.objects.all()
     serializer_class = SilverWarehouseStockSerializer
@@ -150,40 +274,87 @@ class SilverWarehouseStockViewSet(viewsets.ModelViewSet):
         # Filter by user's branch if not admin
         if self.request.user.role != 'Admin':
             queryset = queryset.filter(warehouse__branch=self.request.user.branch)
-        return queryset
+        if self.action == 'list':
+            queryset = self.as_of(queryset)
+        elif self.action in ('update', 'partial_update'):
+            # Held until update() commits, so the Manual movement is the change actually made
+            queryset = queryset.select_for_update(of=('self',))
+        return queryset.select_related('warehouse__branch', 'product', 'created_by')
+
+    def as_of(self, queryset):
+        """With `?as_of=`, only rows that existed then, annotated with their quantity at that time"""
+        filters = StockAsOfSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        as_of = filters.validated_data.get('as_of')
+        if as_of is None:
+            return queryset
+        try:
+            snapshot = snapshot_before(as_of)
+        except NoStockHistory as exc:
+            raise serializers.ValidationError({'as_of': [str(exc)]})
+        return queryset.filter(created_date__lte=as_of).annotate(
+            as_of_quantity=quantity_as_of(self.queryset.model, snapshot, as_of)
+        )
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        stock = serializer.save(created_by=self.request.user)
+        record_movements(self.queryset.model, [(stock.warehouse_id, stock.product_id, stock.quantity)], 'Manual')
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        warehouse_id, product_id, quantity = (
+            serializer.instance.warehouse_id, serializer.instance.product_id, serializer.instance.quantity
+        )
+        stock = serializer.save()
+        if (stock.warehouse_id, stock.product_id) == (warehouse_id, product_id):
+            movements = [(warehouse_id, product_id, stock.quantity - quantity)]
+        else:
+            movements = [(warehouse_id, product_id, -quantity), (stock.warehouse_id, stock.product_id, stock.quantity)]
+        if stock.warehouse_id != warehouse_id:
+            # post_save only drops the cached totals of the warehouse the row moved to
+            report_cache.invalidate(self.queryset.model, [warehouse_id])
+        record_movements(self.queryset.model, movements, 'Manual')
 
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Get silver stock summary by warehouse"""
-        queryset = self.get_queryset()
-        
-        summary = queryset.values(
-            'warehouse__id',
-            'warehouse__code',
-            'warehouse__branch__name'
-        ).annotate(
-            total_products=Count('product', distinct=True),
-            total_quantity=Sum('quantity'),
-            total_weight=Sum('product__weight')
-        ).order_by('-total_quantity')
-        
-        # Format the response
-        formatted_summary = []
-        for item in summary:
-            formatted_summary.append({
-                'warehouse': item['warehouse__branch__name'],
-                'warehouse_code': item['warehouse__code'],
-                'total_products': item['total_products'],
-                'total_quantity': item['total_quantity'],
-                'total_weight': item['total_weight'] or 0
-            })
-        
-        serializer = SilverStockSummarySerializer(formatted_summary, many=True)
+        """Get silver stock summary by warehouse, valued at `?silver_price=` or the latest invoiced price"""
+        filters = SilverStockSummaryFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        price = filters.validated_data.get('silver_price')
+        if price is None:
+            price = SilverInvoice.objects.order_by('-created_date', '-id').values_list('silver_price', flat=True).first()
+
+        try:
+            summary = stock_summary(
+                'silver',
+                branch_id=None if request.user.role == 'Admin' else request.user.branch_id,
+                price=price,
+                as_of=filters.validated_data.get('as_of')
+            )
+        except NoStockHistory as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = SilverStockSummarySerializer(summary, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdminOrManager])
+    def valuation(self, request):
+        """Value all silver stock at each `?price=` per gram of silver, or the latest invoiced price"""
+        filters = StockValuationFilterSerializer(data={'price': request.query_params.getlist('price')})
+        filters.is_valid(raise_exception=True)
+        prices = filters.validated_data['price']
+        if not prices:
+            latest = SilverInvoice.objects.order_by('-created_date', '-id').values_list('silver_price', flat=True).first()
+            if latest is None:
+                return Response({'error': 'No price given and no invoice to take one from'}, status=status.HTTP_400_BAD_REQUEST)
+            prices = [latest]
+
+        book = StockBook.load('silver', branch_id=None if request.user.role == 'Admin' else request.user.branch_id)
+        return Response(book.revalue(prices))
+
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         stock = self.get_object()
@@ -204,17 +375,34 @@ class SilverWarehouseStockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        new_quantity = stock.quantity + adjustment
-        if new_quantity < 0:
+        with transaction.atomic():
+            [outcome] = adjust_stock(self.queryset.model, [{'stock': stock.id, 'delta': adjustment}])
+        if outcome['status'] != 'adjusted':
             return Response(
                 {'error': 'Insufficient stock'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        stock.quantity = new_quantity
-        stock.save()
-        
         return Response({
             'message': 'Stock quantity adjusted successfully',
-            'new_quantity': new_quantity
-        })
\ No newline at end of file
+            'new_quantity': outcome['quantity']
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk_adjust(self, request):
+        """Apply many quantity adjustments in one transaction, reporting the outcome of each"""
+        serializer = BulkStockAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            outcomes = adjust_stock(
+                self.queryset.model,
+                serializer.validated_data['adjustments'],
+                branch_id=None if request.user.role == 'Admin' else request.user.branch_id,
+                all_or_nothing=serializer.validated_data['all_or_nothing']
+            )
+        failed = sum(outcome['status'] in ('not_found', 'insufficient') for outcome in outcomes)
+        return Response({
+            'adjusted': sum(outcome['status'] == 'adjusted' for outcome in outcomes),
+            'failed': failed,
+            'results': StockAdjustmentOutcomeSerializer(outcomes, many=True).data
+        }, status=status.HTTP_400_BAD_REQUEST if failed and serializer.validated_data['all_or_nothing'] else status.HTTP_200_OK)
\ No newline at end of file
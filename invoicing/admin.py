@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem
+from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem, DailySalesRollup, ReportJob
 
 class GoldInvoiceItemInline(admin.TabularInline):
     model = GoldInvoiceItem
@@ -41,4 +41,17 @@ class SilverInvoiceItemAdmin(admin.ModelAdmin):
     list_display = ['invoice', 'item_name', 'vendor_name', 'item_quantity', 'item_weight', 'item_carat', 'item_total_price']
     list_filter = ['vendor_name', 'item_carat']
     search_fields = ['item_name', 'vendor_name', 'invoice__customer__name']
-    readonly_fields = ['item_total_price']
\ No newline at end of file
+    readonly_fields = ['item_total_price']
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'branch', 'warehouse', 'metal', 'invoice_type', 'transaction_type', 'invoice_count', 'total_amount']
+    list_filter = ['metal', 'invoice_type', 'transaction_type', 'branch', 'date']
+    ordering = ['-date']
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'created_by', 'created_date', 'finished_date']
+    list_filter = ['kind', 'status', 'created_date']
+    ordering = ['-created_date']
+    readonly_fields = ['created_date', 'started_date', 'finished_date']
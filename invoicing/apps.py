@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class InvoicingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoicing'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from utils.report_cache import invalidate_reports_on_write
+        from .jobs import start_pool
+        from .models import GoldInvoice, SilverInvoice
+        invalidate_reports_on_write(GoldInvoice, SilverInvoice)
+        # Jobs queued or running when a web process stopped are picked up by the next one
+        request_started.connect(start_pool, dispatch_uid='report-job-pool')
@@ -0,0 +1,191 @@
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+from django.db import transaction
+from rest_framework import serializers
+from core.models import Branch, Customer, Seller, Warehouse
+from inventory.ledger import record_movements
+from inventory.stock import InsufficientStock
+from inventory.transfers import lock_stock, upsert_stock
+from utils.report_cache import report_cache
+from .rollup import record_invoices
+from .serializers import invoice_stock_changes
+from .vendors import assign_item_vendors
+
+class InvoiceBatchImporter:
+    """Ingest a backlog of invoices queued offline by a POS terminal.
+
+    Records are consumed in chunks. Each chunk is validated with one serializer
+    instance, its foreign keys are checked with one query per related model,
+    and its headers and items are written with one bulk INSERT each inside the
+    chunk's transaction. Every record gets its own result, so one bad invoice
+    does not reject the rest of the backlog.
+    """
+    related_models = {
+        'warehouse': Warehouse,
+        'seller': Seller,
+        'branch': Branch,
+        'customer': Customer,
+    }
+    chunk_size = 500
+
+    def __init__(self, metal, serializer_class, invoice_model, item_model, product_model, stock_model, user):
+        self.metal = metal
+        self.validator = serializer_class()
+        self.invoice_model = invoice_model
+        self.item_model = item_model
+        self.product_model = product_model
+        self.stock_model = stock_model
+        self.user = user
+
+    def run(self, records):
+        results = []
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return results
+            results.extend(self.import_chunk(chunk, offset=len(results)))
+
+    def import_chunk(self, chunk, offset):
+        results = [None] * len(chunk)
+        validated = []
+        for position, record in enumerate(chunk):
+            if not isinstance(record, dict):
+                results[position] = self.error(offset + position, {'non_field_errors': ['Expected a JSON object']})
+                continue
+            try:
+                validated.append((position, self.validator.run_validation(record)))
+            except serializers.ValidationError as exc:
+                results[position] = self.error(offset + position, exc.detail)
+
+        existing = self.existing_references([data for _, data in validated])
+        candidates = []
+        for position, data in validated:
+            errors = self.reference_errors(data, existing)
+            if errors:
+                results[position] = self.error(offset + position, errors)
+            else:
+                candidates.append((position,) + self.build(data))
+
+        with transaction.atomic():
+            posted, rejected = self.check_stock(candidates)
+            for (position, _, _), exc in rejected:
+                results[position] = self.error(offset + position, {'items': [str(exc)]})
+
+            invoices = self.invoice_model.objects.bulk_create([invoice for (_, invoice, _), _ in posted])
+            self.post_stock(posted)
+            items = []
+            for (position, invoice, invoice_items), _ in posted:
+                for item in invoice_items:
+                    item.invoice = invoice
+                items.extend(invoice_items)
+                results[position] = {'index': offset + position, 'status': 'created', 'id': invoice.id}
+            assign_item_vendors(self.product_model, items)
+            self.item_model.objects.bulk_create(items, batch_size=1000)
+            record_invoices(self.metal, invoices)
+            # bulk_create sends no post_save
+            if invoices:
+                report_cache.invalidate(self.invoice_model)
+        return results
+
+    def existing_references(self, validated):
+        """Return the set of live ids per foreign key, one query per related model"""
+        wanted = defaultdict(set)
+        for data in validated:
+            for field in self.related_models:
+                wanted[field].add(data[field])
+            wanted['product'].update(item['product'] for item in data['items'] if item.get('product'))
+
+        existing = {}
+        models = dict(self.related_models, product=self.product_model)
+        for field, model in models.items():
+            ids = wanted[field]
+            existing[field] = set(model.objects.filter(id__in=ids).values_list('id', flat=True)) if ids else set()
+        return existing
+
+    def reference_errors(self, data, existing):
+        errors = {}
+        for field in self.related_models:
+            if data[field] not in existing[field]:
+                errors[field] = [f'Invalid pk "{data[field]}" - object does not exist.']
+        missing_products = sorted({
+            item['product'] for item in data['items']
+            if item.get('product') and item['product'] not in existing['product']
+        })
+        if missing_products:
+            errors['items'] = [f'Invalid product pk "{pk}" - object does not exist.' for pk in missing_products]
+        return errors
+
+    def build(self, data):
+        items_data = data.pop('items')
+        invoice = self.invoice_model(
+            warehouse_id=data.pop('warehouse'),
+            seller_id=data.pop('seller'),
+            branch_id=data.pop('branch'),
+            customer_id=data.pop('customer'),
+            total_price=sum((item['item_total_price'] for item in items_data), Decimal('0')),
+            created_by=self.user,
+            **data
+        )
+        items = []
+        for item_data in items_data:
+            item_data['product_id'] = item_data.pop('product', None)
+            items.append(self.item_model(**item_data))
+        return invoice, items
+
+    def check_stock(self, candidates):
+        """Split the chunk's candidates into (posted, rejected) by the stock they move.
+
+        Every stock row the chunk touches is locked first, and stays locked
+        until the chunk commits. Invoices are then checked in order against a
+        running balance per warehouse and product, so a sale is rejected when
+        the stock it takes is not there at that point, even if a later return
+        in the chunk would make up for it. Posted entries are (candidate,
+        stock changes) pairs.
+        """
+        changes = [invoice_stock_changes(invoice, items) for _, invoice, items in candidates]
+        pairs = {
+            (invoice.warehouse_id, product_id)
+            for (_, invoice, _), invoice_changes in zip(candidates, changes) for product_id in invoice_changes
+        }
+        available = defaultdict(int, lock_stock(self.stock_model, pairs))
+
+        posted, rejected = [], []
+        for candidate, invoice_changes in zip(candidates, changes):
+            warehouse_id = candidate[1].warehouse_id
+            short = next((
+                product_id for product_id in sorted(invoice_changes)
+                if available[(warehouse_id, product_id)] + invoice_changes[product_id] < 0
+            ), None)
+            if short is not None:
+                rejected.append((candidate, InsufficientStock(short)))
+                continue
+            for product_id, delta in invoice_changes.items():
+                available[(warehouse_id, product_id)] += delta
+            posted.append((candidate, invoice_changes))
+        return posted, rejected
+
+    def post_stock(self, posted):
+        """Apply the stock changes of the posted, already created invoices.
+
+        The changes are netted per warehouse and product into one upsert, and
+        written to the ledger invoice by invoice under each invoice's id.
+        """
+        deltas = defaultdict(int)
+        movements = []
+        for (_, invoice, _), invoice_changes in posted:
+            for product_id, delta in invoice_changes.items():
+                deltas[(invoice.warehouse_id, product_id)] += delta
+                movements.append((invoice.warehouse_id, product_id, delta, invoice.id))
+        updated = upsert_stock(self.stock_model, deltas, self.user)
+        if updated != {pair for pair, delta in deltas.items() if delta}:
+            # Unreachable while every writer locks before it writes; check_stock locked these rows
+            raise RuntimeError('Invoice stock changed while locked')
+        record_movements(self.stock_model, movements, 'Invoice')
+        if deltas:
+            # Upserts send no post_save, so cached stock reports are dropped here
+            report_cache.invalidate(self.stock_model, {warehouse_id for warehouse_id, _ in deltas})
+
+    def error(self, index, errors):
+        return {'index': index, 'status': 'error', 'errors': errors}
@@ -0,0 +1,156 @@
+import base64
+import json
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+from core.models import Customer
+from .models import GoldInvoice, SilverInvoice
+from .reports import fetch_dicts
+
+INVOICE_TABLES = [
+    ('Gold', GoldInvoice._meta.db_table),
+    ('Silver', SilverInvoice._meta.db_table),
+]
+
+STATS_SQL = f"""
+    UPDATE {Customer._meta.db_table} AS customers SET
+        invoice_count = customers.invoice_count + deltas.invoice_count,
+        return_count = customers.return_count + deltas.return_count,
+        lifetime_spend = customers.lifetime_spend + deltas.lifetime_spend,
+        returned_amount = customers.returned_amount + deltas.returned_amount,
+        last_visit = GREATEST(customers.last_visit, deltas.last_visit)
+    FROM (VALUES {{values}}) AS deltas(id, invoice_count, return_count, lifetime_spend, returned_amount, last_visit)
+    WHERE customers.id = deltas.id
+"""
+
+def record_customer_invoices(metal, invoices, sign=1):
+    """Add invoices to (or, with sign=-1, remove them from) their customers' counters.
+
+    One UPDATE covers every customer touched, in id order so concurrent
+    writers lock customer rows in the same sequence. Removing the invoice that
+    set a customer's last_visit recomputes it from the per-customer index,
+    leaving the removed invoices out since they may not be deleted yet.
+    """
+    deltas = defaultdict(lambda: [0, 0, Decimal('0'), Decimal('0'), None])
+    for invoice in invoices:
+        delta = deltas[invoice.customer_id]
+        if invoice.invoice_type in invoice.RESTOCK_INVOICE_TYPES:
+            delta[1] += sign
+            delta[3] += sign * invoice.total_price
+        else:
+            delta[0] += sign
+            delta[2] += sign * invoice.total_price
+        delta[4] = max(filter(None, [delta[4], invoice.created_date]))
+    if not deltas:
+        return
+
+    params = []
+    for customer_id in sorted(deltas):
+        params.append(customer_id)
+        params.extend(deltas[customer_id][:4])
+        params.append(deltas[customer_id][4] if sign > 0 else None)
+    placeholders = ', '.join(['(%s::bigint, %s::bigint, %s::bigint, %s::numeric, %s::numeric, %s::timestamptz)'] * len(deltas))
+    with connection.cursor() as cursor:
+        cursor.execute(STATS_SQL.format(values=placeholders), params)
+        if sign < 0:
+            removed_ids = [invoice.id for invoice in invoices]
+            latest = ' UNION ALL '.join(
+                f"SELECT created_date FROM {table} WHERE customer_id = customers.id"
+                + (' AND NOT (id = ANY(%s))' if side == metal else '')
+                for side, table in INVOICE_TABLES
+            )
+            removed = ', '.join(['(%s::bigint, %s::timestamptz)'] * len(deltas))
+            removed_params = [value for customer_id in sorted(deltas) for value in (customer_id, deltas[customer_id][4])]
+            cursor.execute(f"""
+                UPDATE {Customer._meta.db_table} AS customers
+                SET last_visit = (SELECT MAX(created_date) FROM ({latest}) AS visits)
+                FROM (VALUES {removed}) AS removed(id, created_date)
+                WHERE customers.id = removed.id AND customers.last_visit <= removed.created_date
+            """, [removed_ids] + removed_params)
+
+def rebuild_customer_stats():
+    """Recompute every customer's counters from the invoice tables; returns the number of customers updated"""
+    invoices = ' UNION ALL '.join(
+        f"SELECT customer_id, invoice_type, total_price, created_date FROM {table}" for _, table in INVOICE_TABLES
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {Customer._meta.db_table} AS customers SET
+                invoice_count = COALESCE(stats.invoice_count, 0),
+                return_count = COALESCE(stats.return_count, 0),
+                lifetime_spend = COALESCE(stats.lifetime_spend, 0),
+                returned_amount = COALESCE(stats.returned_amount, 0),
+                last_visit = stats.last_visit
+            FROM {Customer._meta.db_table} AS base
+            LEFT JOIN (
+                SELECT
+                    customer_id,
+                    COUNT(*) FILTER (WHERE NOT is_return) AS invoice_count,
+                    COUNT(*) FILTER (WHERE is_return) AS return_count,
+                    SUM(total_price) FILTER (WHERE NOT is_return) AS lifetime_spend,
+                    SUM(total_price) FILTER (WHERE is_return) AS returned_amount,
+                    MAX(created_date) AS last_visit
+                FROM (
+                    SELECT customer_id, invoice_type = ANY(%s) AS is_return, total_price, created_date
+                    FROM ({invoices}) AS invoices
+                ) AS marked
+                GROUP BY customer_id
+            ) AS stats ON stats.customer_id = base.id
+            WHERE customers.id = base.id
+        """, [GoldInvoice.RESTOCK_INVOICE_TYPES])
+        return cursor.rowcount
+
+def encode_history_cursor(row):
+    payload = json.dumps([row['created_date'].isoformat(), row['metal'], row['id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_history_cursor(cursor):
+    """(created_date, metal, id) from a cursor; ValueError if it is malformed"""
+    try:
+        created_date, metal, invoice_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_date = parse_datetime(created_date)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if created_date is None or metal not in dict(INVOICE_TABLES) or not isinstance(invoice_id, int):
+        raise ValueError('Invalid cursor')
+    return created_date, metal, invoice_id
+
+def customer_invoices(customer_id, limit, after=None, branch_ids=None):
+    """A page of the customer's invoices across both metals, newest first, in one statement.
+
+    Rows are ordered by (created_date, metal, id) descending and `after` is the
+    last key of the previous page. Each side reads at most `limit` + 1 rows
+    from its (customer, created_date, id) index before the two are merged.
+    """
+    selects = []
+    params = []
+    for metal, table in INVOICE_TABLES:
+        where = 'customer_id = %s'
+        side_params = [customer_id]
+        if branch_ids is not None:
+            where += ' AND branch_id = ANY(%s)'
+            side_params.append(list(branch_ids))
+        if after is not None:
+            created_date, after_metal, invoice_id = after
+            if metal == after_metal:
+                where += ' AND (created_date, id) < (%s, %s)'
+                side_params.extend([created_date, invoice_id])
+            else:
+                # On equal created_date the metal decides, and 'Gold' sorts before 'Silver'
+                where += ' AND created_date < %s' if metal > after_metal else ' AND created_date <= %s'
+                side_params.append(created_date)
+        selects.append(f"""(
+            SELECT '{metal}' AS metal, id, created_date, branch_id, warehouse_id, invoice_type,
+                   transaction_type, total_price
+            FROM {table}
+            WHERE {where}
+            ORDER BY created_date DESC, id DESC
+            LIMIT %s
+        )""")
+        params.extend(side_params + [limit + 1])
+    rows = fetch_dicts(
+        f"{' UNION ALL '.join(selects)} ORDER BY created_date DESC, metal DESC, id DESC LIMIT %s",
+        params + [limit + 1]
+    )
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,203 @@
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from utils.export import EXPORT_FORMATS, csv_lines, ndjson_lines
+from .models import ReportJob
+from .reports import date_bounds
+
+class ReportJobKind:
+    """Something a report job can produce: validates its params, then writes its result file"""
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    def validate(self, user, params):
+        """JSON-safe filters for `params`, with the branch forced to the user's branch if not admin"""
+        serializer = self.serializer_class(data=params)
+        serializer.is_valid(raise_exception=True)
+        filters = dict(serializer.validated_data)
+        if user.role != 'Admin':
+            filters['branch'] = [user.branch_id]
+        return json.loads(json.dumps(filters, cls=DjangoJSONEncoder))
+
+    def filters(self, params):
+        serializer = self.serializer_class(data=params)
+        serializer.is_valid(raise_exception=True)
+        filters = dict(serializer.validated_data)
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.ListField):
+                filters.setdefault(name, None)
+        return filters
+
+    def write(self, job, filters, output):
+        """Write the result to the binary file `output`; return its (extension, content type)"""
+        raise NotImplementedError
+
+class ReportKind(ReportJobKind):
+    """One of the range reports, saved as the JSON its endpoint would return"""
+
+    def __init__(self, serializer_class, build):
+        super().__init__(serializer_class)
+        self.build = build
+
+    def write(self, job, filters, output):
+        report = self.build(filters)
+        touch(job)
+        output.write(json.dumps(report, cls=DjangoJSONEncoder).encode())
+        return 'json', 'application/json'
+
+class ExportKind(ReportJobKind):
+    """An export of invoice or item rows over the job's date range, as CSV or NDJSON"""
+    chunk_size = 2000
+
+    def __init__(self, serializer_class, queryset, fields, date_field='created_date', branch_field='branch'):
+        super().__init__(serializer_class)
+        self.queryset = queryset
+        self.fields = fields
+        self.date_field = date_field
+        self.branch_field = branch_field
+
+    def write(self, job, filters, output):
+        start, end = date_bounds(filters['start_date'], filters['end_date'])
+        queryset = self.queryset.filter(**{f'{self.date_field}__gte': start, f'{self.date_field}__lt': end})
+        if filters['branch'] is not None:
+            queryset = queryset.filter(**{f'{self.branch_field}__in': filters['branch']})
+
+        total = queryset.count()
+        rows = queryset.values_list(*self.fields).iterator(chunk_size=self.chunk_size)
+        lines = csv_lines if filters['file_format'] == 'csv' else ndjson_lines
+        written = 0
+        for line in lines(self.fields, rows):
+            output.write(line.encode())
+            written += 1
+            if written % self.chunk_size == 0:
+                set_progress(job, min(99, written * 100 // max(total, 1)))
+        return filters['file_format'], EXPORT_FORMATS[filters['file_format']]
+
+# Seconds between the updated_date stamps of a running job; see requeue_stale_jobs()
+HEARTBEAT_INTERVAL = 60
+
+def set_progress(job, progress):
+    ReportJob.objects.filter(id=job.id).update(progress=progress, updated_date=timezone.now())
+
+def touch(job):
+    ReportJob.objects.filter(id=job.id).update(updated_date=timezone.now())
+
+@contextmanager
+def heartbeat(job, interval=HEARTBEAT_INTERVAL):
+    """Stamp the job's updated_date every `interval` seconds from a side thread while the block runs.
+
+    A single report query can run for longer than any stale timeout, so
+    progress updates alone do not prove the worker is alive.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                touch(job)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'report-job-{job.id}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def claim(job_id):
+    """Mark a pending job as running; False if another worker got to it first"""
+    now = timezone.now()
+    return bool(ReportJob.objects.filter(id=job_id, status='Pending').update(
+        status='Running', started_date=now, updated_date=now
+    ))
+
+def run_job(job_id):
+    """Run a pending job to completion or failure; returns False if it was not pending"""
+    # Job kinds are declared next to the endpoints that share their filters
+    from .views import REPORT_JOB_KINDS
+
+    if not claim(job_id):
+        return False
+    job = ReportJob.objects.get(id=job_id)
+    try:
+        kind = REPORT_JOB_KINDS[job.kind]
+        with tempfile.TemporaryFile() as output, heartbeat(job):
+            extension, content_type = kind.write(job, kind.filters(job.params), output)
+            output.seek(0)
+            job.result_file.save(f'{job.kind}-{job.id}.{extension}', File(output), save=False)
+        job.content_type = content_type
+        job.status = 'Completed'
+        job.progress = 100
+    except Exception as exc:
+        job.status = 'Failed'
+        job.error = str(exc) or exc.__class__.__name__
+    job.finished_date = timezone.now()
+    job.save(update_fields=['result_file', 'content_type', 'status', 'progress', 'error', 'finished_date', 'updated_date'])
+    return True
+
+def run_pending_jobs(limit=None):
+    """Run pending jobs oldest first; returns how many this worker ran"""
+    ran = 0
+    pending = ReportJob.objects.filter(status='Pending').order_by('created_date', 'id').values_list('id', flat=True)
+    for job_id in pending[:limit] if limit else pending:
+        ran += run_job(job_id)
+    return ran
+
+def requeue_stale_jobs(older_than):
+    """Put back running jobs whose worker has not stamped updated_date for `older_than`.
+
+    Live workers stamp it every HEARTBEAT_INTERVAL seconds however long the
+    job runs, so only jobs of dead workers go back to pending.
+    """
+    return ReportJob.objects.filter(status='Running', updated_date__lt=timezone.now() - older_than).update(
+        status='Pending', progress=0, started_date=None, updated_date=timezone.now()
+    )
+
+_executor = None
+
+def executor():
+    """The process's job pool, started on first use with a pass over jobs left by earlier processes"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.REPORT_JOB_WORKERS, thread_name_prefix='report-job')
+        _executor.submit(recover_jobs)
+    return _executor
+
+def recover_jobs():
+    """Requeue stale jobs, then run every pending one, such as those queued before a restart"""
+    try:
+        requeue_stale_jobs(settings.REPORT_JOB_STALE_AFTER)
+        run_pending_jobs()
+    finally:
+        connection.close()
+
+def run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Pool threads outlive requests, so nothing else would close their connection
+        connection.close()
+
+def start_pool(**kwargs):
+    """request_started receiver starting the pool with the process's first request"""
+    if settings.REPORT_JOB_WORKERS:
+        executor()
+
+def enqueue(job):
+    """Hand a saved job to the in-process pool once its row is committed.
+
+    With REPORT_JOB_WORKERS = 0 the job stays pending for `run_report_jobs`.
+    """
+    if settings.REPORT_JOB_WORKERS:
+        transaction.on_commit(lambda: executor().submit(run_in_thread, job.id))
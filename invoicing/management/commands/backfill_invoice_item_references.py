@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from inventory.models import GoldProduct, SilverProduct
+from invoicing.models import GoldInvoiceItem, SilverInvoiceItem
+from invoicing.vendors import backfill_item_references
+
+class Command(BaseCommand):
+    help = 'Link existing invoice items to their catalog product and vendor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Item ids per UPDATE batch')
+
+    def handle(self, *args, **options):
+        for metal, item_model, product_model in [
+            ('Gold', GoldInvoiceItem, GoldProduct),
+            ('Silver', SilverInvoiceItem, SilverProduct),
+        ]:
+            resolved = backfill_item_references(item_model, product_model, options['batch_size'])
+            unresolved = item_model.objects.filter(vendor__isnull=True).count()
+            self.stdout.write(self.style.SUCCESS(
+                f"{metal}: linked {resolved['products']} items to products and {resolved['vendors']} to vendors, "
+                f"{unresolved} items still without a vendor"
+            ))
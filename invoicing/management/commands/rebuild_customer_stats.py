@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from invoicing.customers import rebuild_customer_stats
+
+class Command(BaseCommand):
+    help = "Recompute customers' invoice counters from the invoice tables"
+
+    def handle(self, *args, **options):
+        updated = rebuild_customer_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt invoice counters for {updated} customers'))
@@ -0,0 +1,14 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from invoicing.rollup import rebuild_rollup
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollup from the invoice tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=date.fromisoformat, help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end-date', type=date.fromisoformat, help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        created = rebuild_rollup(options['start_date'], options['end_date'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt daily sales rollup: {created} rows'))
@@ -0,0 +1,32 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from invoicing.jobs import requeue_stale_jobs, run_pending_jobs
+
+class Command(BaseCommand):
+    help = 'Run pending report jobs, polling for new ones until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no job is pending')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds to wait when idle')
+        parser.add_argument('--stale-after', type=int,
+                            help='Requeue running jobs not stamped by their worker for this many minutes '
+                                 '(default REPORT_JOB_STALE_AFTER)')
+
+    def handle(self, *args, **options):
+        if options['stale_after'] is None:
+            stale_after = settings.REPORT_JOB_STALE_AFTER
+        else:
+            stale_after = timedelta(minutes=options['stale_after'])
+        while True:
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale report jobs')
+            ran = run_pending_jobs()
+            if ran:
+                self.stdout.write(self.style.SUCCESS(f'Ran {ran} report jobs'))
+            if options['once']:
+                return
+            if not ran:
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('invoicing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goldinvoiceitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_items', to='inventory.goldproduct'),
+        ),
+        migrations.AddField(
+            model_name='silverinvoiceitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_items', to='inventory.silverproduct'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_created_id_index'),
+        ('invoicing', '0002_invoice_item_product'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='goldinvoice',
+            index=models.Index(fields=['created_date', 'id'], name='gold_invoice_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='silverinvoice',
+            index=models.Index(fields=['created_date', 'id'], name='silver_invoice_created_id_idx'),
+        ),
+    ]
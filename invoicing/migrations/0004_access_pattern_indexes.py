@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:43
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build indexes without blocking writes on live tables
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_access_pattern_indexes'),
+        ('invoicing', '0003_created_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='goldinvoice',
+            index=models.Index(fields=['branch', 'created_date', 'id'], name='gold_invoice_branch_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='goldinvoice',
+            index=models.Index(fields=['branch', 'invoice_type', 'created_date'], name='gold_invoice_branch_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='goldinvoice',
+            index=models.Index(fields=['warehouse', 'created_date'], name='gold_invoice_warehouse_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverinvoice',
+            index=models.Index(fields=['branch', 'created_date', 'id'], name='silver_invoice_branch_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverinvoice',
+            index=models.Index(fields=['branch', 'invoice_type', 'created_date'], name='silver_invoice_branch_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverinvoice',
+            index=models.Index(fields=['warehouse', 'created_date'], name='silver_invoice_warehouse_idx'),
+        ),
+    ]
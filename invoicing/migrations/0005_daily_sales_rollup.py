@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_access_pattern_indexes'),
+        ('invoicing', '0004_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('metal', models.CharField(choices=[('Gold', 'Gold'), ('Silver', 'Silver')], max_length=10)),
+                ('invoice_type', models.CharField(choices=[('Sale', 'Sale'), ('Return Packing', 'Return Packing'), ('Return Unpacking', 'Return Unpacking')], max_length=255)),
+                ('transaction_type', models.CharField(choices=[('Cash', 'Cash'), ('Visa', 'Visa')], max_length=255)),
+                ('invoice_count', models.BigIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.branch')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.warehouse')),
+            ],
+            options={
+                'db_table': 'daily_sales_rollup',
+                'indexes': [models.Index(fields=['date', 'branch'], name='daily_sales_rollup_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('branch', 'warehouse', 'date', 'metal', 'invoice_type', 'transaction_type'), name='unique_daily_sales_rollup_key')],
+            },
+        ),
+    ]
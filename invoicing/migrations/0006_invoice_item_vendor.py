@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_access_pattern_indexes'),
+        ('invoicing', '0005_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goldinvoiceitem',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='gold_invoice_items', to='core.vendor'),
+        ),
+        migrations.AddField(
+            model_name='silverinvoiceitem',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='silver_invoice_items', to='core.vendor'),
+        ),
+    ]
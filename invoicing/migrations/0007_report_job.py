@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:00
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0006_invoice_item_vendor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(max_length=64)),
+                ('params', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Pending', max_length=16)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('result_file', models.FileField(blank=True, upload_to='report_jobs/')),
+                ('content_type', models.CharField(blank=True, max_length=64)),
+                ('error', models.TextField(blank=True)),
+                ('started_date', models.DateTimeField(blank=True, null=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_created', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'report_jobs',
+                'indexes': [models.Index(fields=['status', 'created_date'], name='report_jobs_status_idx'), models.Index(fields=['created_by', 'created_date', 'id'], name='report_jobs_user_idx')],
+            },
+        ),
+    ]
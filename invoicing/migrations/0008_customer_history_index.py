@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build indexes without blocking writes on live tables
+    atomic = False
+
+    dependencies = [
+        ('invoicing', '0007_report_job'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='goldinvoice',
+            index=models.Index(fields=['customer', 'created_date', 'id'], name='gold_invoice_customer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='silverinvoice',
+            index=models.Index(fields=['customer', 'created_date', 'id'], name='silver_invoice_customer_idx'),
+        ),
+    ]
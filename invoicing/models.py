@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from utils.mixins import TimestampedModel, CreatedByModel
 
@@ -13,6 +14,8 @@ class GoldInvoice(TimestampedModel, CreatedByModel):  # No soft delete
         ('Return Unpacking', 'Return Unpacking'),
     ]
     
+    RESTOCK_INVOICE_TYPES = ['Return Packing', 'Return Unpacking']
+    
     warehouse = models.ForeignKey('core.Warehouse', on_delete=models.CASCADE, related_name='gold_invoices')
     seller = models.ForeignKey('core.Seller', on_delete=models.CASCADE, related_name='gold_invoices')
     branch = models.ForeignKey('core.Branch', on_delete=models.CASCADE, related_name='gold_invoices')
@@ -25,12 +28,22 @@ class GoldInvoice(TimestampedModel, CreatedByModel):  # No soft delete
     
     class Meta:
         db_table = 'gold_invoice'
+        indexes = [
+            models.Index(fields=['created_date', 'id'], name='gold_invoice_created_id_idx'),
+            models.Index(fields=['branch', 'created_date', 'id'], name='gold_invoice_branch_idx'),
+            models.Index(fields=['branch', 'invoice_type', 'created_date'], name='gold_invoice_branch_type_idx'),
+            models.Index(fields=['warehouse', 'created_date'], name='gold_invoice_warehouse_idx'),
+            models.Index(fields=['customer', 'created_date', 'id'], name='gold_invoice_customer_idx'),
+        ]
     
     def __str__(self):
         return f"Gold Invoice #{self.id} - {self.customer.name} - {self.total_price}"
 
 class GoldInvoiceItem(models.Model):  # No soft delete and no timestamps (matches original schema)
     invoice = models.ForeignKey(GoldInvoice, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey('inventory.GoldProduct', on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice_items')
+    # Resolved vendor; vendor_name stays as the printed snapshot
+    vendor = models.ForeignKey('core.Vendor', on_delete=models.SET_NULL, null=True, blank=True, related_name='gold_invoice_items')
     item_name = models.CharField(max_length=255)
     item_weight = models.DecimalField(max_digits=10, decimal_places=2)
     item_carat = models.DecimalField(max_digits=10, decimal_places=2)
@@ -58,6 +71,8 @@ class SilverInvoice(TimestampedModel, CreatedByModel):  # No soft delete
         ('Return Unpacking', 'Return Unpacking'),
     ]
     
+    RESTOCK_INVOICE_TYPES = ['Return Packing', 'Return Unpacking']
+    
     warehouse = models.ForeignKey('core.Warehouse', on_delete=models.CASCADE, related_name='silver_invoices')
     seller = models.ForeignKey('core.Seller', on_delete=models.CASCADE, related_name='silver_invoices')
     branch = models.ForeignKey('core.Branch', on_delete=models.CASCADE, related_name='silver_invoices')
@@ -69,12 +84,22 @@ class SilverInvoice(TimestampedModel, CreatedByModel):  # No soft delete
     
     class Meta:
         db_table = 'silver_invoice'
+        indexes = [
+            models.Index(fields=['created_date', 'id'], name='silver_invoice_created_id_idx'),
+            models.Index(fields=['branch', 'created_date', 'id'], name='silver_invoice_branch_idx'),
+            models.Index(fields=['branch', 'invoice_type', 'created_date'], name='silver_invoice_branch_type_idx'),
+            models.Index(fields=['warehouse', 'created_date'], name='silver_invoice_warehouse_idx'),
+            models.Index(fields=['customer', 'created_date', 'id'], name='silver_invoice_customer_idx'),
+        ]
     
     def __str__(self):
         return f"Silver Invoice #{self.id} - {self.customer.name} - {self.total_price}"
 
 class SilverInvoiceItem(models.Model):  # No soft delete and no timestamps
     invoice = models.ForeignKey(SilverInvoice, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey('inventory.SilverProduct', on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice_items')
+    # Resolved vendor; vendor_name stays as the printed snapshot
+    vendor = models.ForeignKey('core.Vendor', on_delete=models.SET_NULL, null=True, blank=True, related_name='silver_invoice_items')
     item_name = models.CharField(max_length=255)
     item_weight = models.DecimalField(max_digits=10, decimal_places=2)
     item_carat = models.DecimalField(max_digits=10, decimal_places=2)
@@ -88,4 +113,62 @@ class SilverInvoiceItem(models.Model):  # No soft delete and no timestamps
         db_table = 'silver_invoice_items'
     
     def __str__(self):
-        return f"{self.item_name} - Qty: {self.item_quantity}"
\ No newline at end of file
+        return f"{self.item_name} - Qty: {self.item_quantity}"
+
+class DailySalesRollup(models.Model):  # Maintained with every invoice write; backfill with `rebuild_sales_rollup`
+    METAL_CHOICES = [
+        ('Gold', 'Gold'),
+        ('Silver', 'Silver'),
+    ]
+    
+    branch = models.ForeignKey('core.Branch', on_delete=models.CASCADE, related_name='daily_sales')
+    warehouse = models.ForeignKey('core.Warehouse', on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    metal = models.CharField(max_length=10, choices=METAL_CHOICES)
+    invoice_type = models.CharField(max_length=255, choices=GoldInvoice.INVOICE_TYPE_CHOICES)
+    transaction_type = models.CharField(max_length=255, choices=GoldInvoice.TRANSACTION_CHOICES)
+    invoice_count = models.BigIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'daily_sales_rollup'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['branch', 'warehouse', 'date', 'metal', 'invoice_type', 'transaction_type'],
+                name='unique_daily_sales_rollup_key'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['date', 'branch'], name='daily_sales_rollup_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.metal} {self.invoice_type} - {self.total_amount}"
+
+class ReportJob(TimestampedModel, CreatedByModel):  # Run by the in-process pool or `run_report_jobs`
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=64)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='Pending')
+    progress = models.PositiveSmallIntegerField(default=0)
+    result_file = models.FileField(upload_to='report_jobs/', blank=True)
+    content_type = models.CharField(max_length=64, blank=True)
+    error = models.TextField(blank=True)
+    started_date = models.DateTimeField(null=True, blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'report_jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_date'], name='report_jobs_status_idx'),
+            models.Index(fields=['created_by', 'created_date', 'id'], name='report_jobs_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Report job #{self.id} - {self.kind} - {self.status}"
@@ -0,0 +1,350 @@
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from core.models import Branch, Seller, Vendor, Warehouse
+from inventory.models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock
+from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem, DailySalesRollup
+
+def date_bounds(start_date, end_date):
+    """Aware datetimes covering whole local days from start_date to end_date inclusive"""
+    return (
+        timezone.make_aware(datetime.combine(start_date, time.min)),
+        timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+    )
+
+def fetch_dicts(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def invoice_union(columns, start, end, branch_ids=None, warehouse_ids=None, seller_ids=None):
+    """Both invoice tables as one relation tagged with `metal`, restricted to [start, end).
+
+    Each side of the UNION keeps its own WHERE so it can use its table's
+    (branch, invoice_type, created_date), (warehouse, created_date) or
+    (created_date, id) index. `columns` may refer to the side's invoice and
+    item tables as `{table}` and `{items}`.
+    """
+    where = 'created_date >= %s AND created_date < %s'
+    params = [start, end]
+    for column, ids in [('branch_id', branch_ids), ('warehouse_id', warehouse_ids), ('seller_id', seller_ids)]:
+        if ids is not None:
+            where += f' AND {column} = ANY(%s)'
+            params.append(list(ids))
+    selects = [
+        f"SELECT '{metal}' AS metal, {columns.format(table=model._meta.db_table, items=item_model._meta.db_table)} "
+        f"FROM {model._meta.db_table} WHERE {where}"
+        for metal, model, item_model in [('Gold', GoldInvoice, GoldInvoiceItem), ('Silver', SilverInvoice, SilverInvoiceItem)]
+    ]
+    return ' UNION ALL '.join(selects), params * 2
+
+def sales_report(start_date, end_date, branch_ids=None):
+    """Per-day and per-type sales for both metals in one statement.
+
+    Rows with a `date` are per day and invoice type; rows without one are the
+    per-type totals over the whole range (GROUPING SETS computes both in the
+    same pass).
+    """
+    union, params = invoice_union(
+        'created_date, invoice_type, total_price', *date_bounds(start_date, end_date), branch_ids
+    )
+    sql = f"""
+        SELECT
+            CASE WHEN GROUPING(day) = 0 THEN day END AS date,
+            invoice_type,
+            COUNT(*) FILTER (WHERE metal = 'Gold') AS gold_count,
+            COALESCE(SUM(total_price) FILTER (WHERE metal = 'Gold'), 0) AS gold_total,
+            COUNT(*) FILTER (WHERE metal = 'Silver') AS silver_count,
+            COALESCE(SUM(total_price) FILTER (WHERE metal = 'Silver'), 0) AS silver_total,
+            COUNT(*) AS total_count,
+            SUM(total_price) AS total_amount
+        FROM (
+            SELECT metal, (created_date AT TIME ZONE %s)::date AS day, invoice_type, total_price
+            FROM ({union}) AS invoices
+        ) AS sales
+        GROUP BY GROUPING SETS ((day, invoice_type), (invoice_type))
+        ORDER BY GROUPING(day), day, invoice_type
+    """
+    rows = fetch_dicts(sql, [settings.TIME_ZONE] + params)
+    return {
+        'daily': [row for row in rows if row['date'] is not None],
+        'by_type': [{key: value for key, value in row.items() if key != 'date'} for row in rows if row['date'] is None],
+    }
+
+BUCKETS = ['hour', 'day', 'week', 'month']
+
+def sales_timeseries(bucket, start_date, end_date, branch_ids=None, warehouse_ids=None, seller_ids=None):
+    """Gold and silver sales per hour, day, week or month, in one statement.
+
+    Invoices are truncated to their bucket in local time by date_trunc and
+    aggregated in the database; generate_series supplies every bucket in the
+    range, so buckets without sales come back as zeros instead of missing.
+    Week buckets start on Monday.
+    """
+    union, params = invoice_union(
+        'created_date, total_price', *date_bounds(start_date, end_date), branch_ids, warehouse_ids, seller_ids
+    )
+    sql = f"""
+        WITH sales AS (
+            SELECT
+                date_trunc(%s, created_date AT TIME ZONE %s) AS bucket,
+                COUNT(*) FILTER (WHERE metal = 'Gold') AS gold_count,
+                SUM(total_price) FILTER (WHERE metal = 'Gold') AS gold_total,
+                COUNT(*) FILTER (WHERE metal = 'Silver') AS silver_count,
+                SUM(total_price) FILTER (WHERE metal = 'Silver') AS silver_total
+            FROM ({union}) AS invoices
+            GROUP BY 1
+        )
+        SELECT
+            buckets.bucket AT TIME ZONE %s AS bucket,
+            COALESCE(gold_count, 0) AS gold_count,
+            COALESCE(gold_total, 0) AS gold_total,
+            COALESCE(silver_count, 0) AS silver_count,
+            COALESCE(silver_total, 0) AS silver_total,
+            COALESCE(gold_count, 0) + COALESCE(silver_count, 0) AS total_count,
+            COALESCE(gold_total, 0) + COALESCE(silver_total, 0) AS total_amount
+        FROM generate_series(
+            date_trunc(%s, %s::timestamp), date_trunc(%s, %s::timestamp), ('1 ' || %s)::interval
+        ) AS buckets(bucket)
+        LEFT JOIN sales ON sales.bucket = buckets.bucket
+        ORDER BY buckets.bucket
+    """
+    last_moment = datetime.combine(end_date, time.max)
+    return fetch_dicts(sql, [
+        bucket, settings.TIME_ZONE, *params, settings.TIME_ZONE,
+        bucket, datetime.combine(start_date, time.min), bucket, last_moment, bucket,
+    ])
+
+LEADERBOARD_ORDER = {
+    'revenue': 'revenue DESC',
+    'invoice_count': 'invoice_count DESC',
+    'grams': 'gold_grams + silver_grams DESC',
+    'return_ratio': 'return_ratio ASC NULLS LAST',
+}
+
+def seller_leaderboard(start_date, end_date, rank_by='revenue', limit=10, branch_ids=None):
+    """The top `limit` sellers by `rank_by`, with their metrics over both metals, in one statement.
+
+    revenue is sales minus returns, invoice_count and grams count sale
+    invoices only, and return_ratio is the returned amount over the sold
+    amount. RANK() runs over every seller with invoices in the range before
+    the LIMIT, so ranks and seller_count do not depend on the page size.
+    """
+    union, params = invoice_union(
+        'seller_id, invoice_type, total_price, '
+        '(SELECT SUM(item_weight * item_quantity) FROM {items} WHERE invoice_id = {table}.id) AS grams',
+        *date_bounds(start_date, end_date), branch_ids
+    )
+    sql = f"""
+        WITH stats AS (
+            SELECT
+                seller_id,
+                COUNT(*) FILTER (WHERE NOT is_return) AS invoice_count,
+                COUNT(*) FILTER (WHERE is_return) AS return_count,
+                COALESCE(SUM(total_price) FILTER (WHERE NOT is_return), 0) AS sales_amount,
+                COALESCE(SUM(total_price) FILTER (WHERE is_return), 0) AS return_amount,
+                COALESCE(SUM(grams) FILTER (WHERE metal = 'Gold' AND NOT is_return), 0) AS gold_grams,
+                COALESCE(SUM(grams) FILTER (WHERE metal = 'Silver' AND NOT is_return), 0) AS silver_grams
+            FROM (
+                SELECT metal, seller_id, invoice_type = ANY(%s) AS is_return, total_price, grams
+                FROM ({union}) AS invoices
+            ) AS sales
+            GROUP BY seller_id
+        ), metrics AS (
+            SELECT
+                stats.*,
+                sales_amount - return_amount AS revenue,
+                ROUND(return_amount / NULLIF(sales_amount, 0), 4) AS return_ratio
+            FROM stats
+        )
+        SELECT
+            RANK() OVER (ORDER BY {LEADERBOARD_ORDER[rank_by]}) AS rank,
+            sellers.id AS seller_id,
+            sellers.name AS seller_name,
+            sellers.branch_id,
+            metrics.revenue,
+            metrics.invoice_count,
+            metrics.return_count,
+            metrics.gold_grams,
+            metrics.silver_grams,
+            metrics.return_ratio,
+            COUNT(*) OVER () AS seller_count
+        FROM metrics
+        JOIN {Seller._meta.db_table} AS sellers ON sellers.id = metrics.seller_id
+        ORDER BY rank, sellers.id
+        LIMIT %s
+    """
+    return fetch_dicts(sql, [GoldInvoice.RESTOCK_INVOICE_TYPES] + params + [limit])
+
+def vendor_sales(start_date, end_date, branch_ids=None):
+    """Quantity, grams and revenue sold per vendor and metal, in one statement.
+
+    Only sale invoices count. Items reach their invoices through the
+    invoice_id index and their vendor through the vendor_id reference, so
+    nothing is grouped by the free-text vendor_name. Items without a resolved
+    vendor are reported together under a null vendor.
+    """
+    union, params = invoice_union('id, invoice_type', *date_bounds(start_date, end_date), branch_ids)
+    items = ' UNION ALL '.join(
+        f"SELECT '{metal}' AS metal, invoice_id, vendor_id, item_quantity, item_weight, item_total_price "
+        f"FROM {model._meta.db_table}"
+        for metal, model in [('Gold', GoldInvoiceItem), ('Silver', SilverInvoiceItem)]
+    )
+    sql = f"""
+        SELECT
+            items.vendor_id,
+            vendors.name AS vendor_name,
+            COALESCE(SUM(item_quantity) FILTER (WHERE items.metal = 'Gold'), 0) AS gold_quantity,
+            COALESCE(SUM(item_weight * item_quantity) FILTER (WHERE items.metal = 'Gold'), 0) AS gold_grams,
+            COALESCE(SUM(item_total_price) FILTER (WHERE items.metal = 'Gold'), 0) AS gold_revenue,
+            COALESCE(SUM(item_quantity) FILTER (WHERE items.metal = 'Silver'), 0) AS silver_quantity,
+            COALESCE(SUM(item_weight * item_quantity) FILTER (WHERE items.metal = 'Silver'), 0) AS silver_grams,
+            COALESCE(SUM(item_total_price) FILTER (WHERE items.metal = 'Silver'), 0) AS silver_revenue,
+            SUM(item_total_price) AS total_revenue
+        FROM ({union}) AS invoices
+        JOIN ({items}) AS items ON items.metal = invoices.metal AND items.invoice_id = invoices.id
+        LEFT JOIN {Vendor._meta.db_table} AS vendors ON vendors.id = items.vendor_id
+        WHERE invoices.invoice_type <> ALL(%s)
+        GROUP BY items.vendor_id, vendors.name
+        ORDER BY total_revenue DESC, items.vendor_id
+    """
+    return fetch_dicts(sql, params + [GoldInvoice.RESTOCK_INVOICE_TYPES])
+
+def gold_grams_by_carat(start_date, end_date, branch_ids=None):
+    """Gold grams sold per branch, day and carat, with 21K and 24K equivalents, in one statement.
+
+    An item's equivalent weight is weight x quantity x carat / 21 (or / 24),
+    summed by the database. Rows with a `branch_id` are per branch and day;
+    rows without one are the per-carat totals over the whole range (GROUPING
+    SETS computes both in the same pass). Only sale invoices count.
+    """
+    start, end = date_bounds(start_date, end_date)
+    where = 'invoices.created_date >= %s AND invoices.created_date < %s AND invoices.invoice_type <> ALL(%s)'
+    params = [start, end, GoldInvoice.RESTOCK_INVOICE_TYPES]
+    if branch_ids is not None:
+        where += ' AND invoices.branch_id = ANY(%s)'
+        params.append(list(branch_ids))
+    sql = f"""
+        SELECT
+            CASE WHEN GROUPING(branch_id) = 0 THEN branch_id END AS branch_id,
+            CASE WHEN GROUPING(day) = 0 THEN day END AS date,
+            carat,
+            SUM(quantity) AS quantity,
+            SUM(grams) AS grams,
+            ROUND(SUM(grams * carat) / 21, 2) AS grams_21k,
+            ROUND(SUM(grams * carat) / 24, 2) AS grams_24k
+        FROM (
+            SELECT
+                invoices.branch_id,
+                (invoices.created_date AT TIME ZONE %s)::date AS day,
+                items.item_carat AS carat,
+                items.item_quantity AS quantity,
+                items.item_weight * items.item_quantity AS grams
+            FROM {GoldInvoice._meta.db_table} AS invoices
+            JOIN {GoldInvoiceItem._meta.db_table} AS items ON items.invoice_id = invoices.id
+            WHERE {where}
+        ) AS sold
+        GROUP BY GROUPING SETS ((branch_id, day, carat), (carat))
+        ORDER BY GROUPING(branch_id), day, branch_id, carat
+    """
+    rows = fetch_dicts(sql, [settings.TIME_ZONE] + params)
+    return {
+        'daily': [row for row in rows if row['branch_id'] is not None],
+        'by_carat': [
+            {key: value for key, value in row.items() if key not in ('branch_id', 'date')}
+            for row in rows if row['branch_id'] is None
+        ],
+    }
+
+def branch_dashboard(start_date, end_date, branch_ids=None):
+    """Invoice summaries, daily sales and stock per warehouse for both metals, in two statements.
+
+    The first statement reads the daily sales rollup once: the (invoice_type,
+    transaction_type) grouping set gives the summaries and the (date) set gives
+    the daily sale totals. The second aggregates both stock tables per
+    warehouse. FILTER splits every aggregate by metal within the same pass.
+    """
+    where = 'date >= %s AND date <= %s'
+    params = [start_date, end_date]
+    if branch_ids is not None:
+        where += ' AND branch_id = ANY(%s)'
+        params.append(list(branch_ids))
+    sales = fetch_dicts(f"""
+        SELECT
+            CASE WHEN GROUPING(date) = 0 THEN date END AS date,
+            invoice_type,
+            transaction_type,
+            COALESCE(SUM(invoice_count) FILTER (WHERE metal = 'Gold'), 0) AS gold_count,
+            COALESCE(SUM(total_amount) FILTER (WHERE metal = 'Gold'), 0) AS gold_total,
+            COALESCE(SUM(invoice_count) FILTER (WHERE metal = 'Silver'), 0) AS silver_count,
+            COALESCE(SUM(total_amount) FILTER (WHERE metal = 'Silver'), 0) AS silver_total,
+            COALESCE(SUM(total_amount) FILTER (WHERE metal = 'Gold' AND invoice_type = 'Sale'), 0) AS gold_sales,
+            COALESCE(SUM(total_amount) FILTER (WHERE metal = 'Silver' AND invoice_type = 'Sale'), 0) AS silver_sales
+        FROM {DailySalesRollup._meta.db_table}
+        WHERE {where}
+        GROUP BY GROUPING SETS ((invoice_type, transaction_type), (date))
+        ORDER BY GROUPING(date), date
+    """, params)
+
+    stock_where = ''
+    stock_params = []
+    if branch_ids is not None:
+        stock_where = 'WHERE warehouses.branch_id = ANY(%s)'
+        stock_params.append(list(branch_ids))
+    stock_tables = ' UNION ALL '.join(
+        f"SELECT '{metal}' AS metal, stock.warehouse_id, stock.product_id, stock.quantity, "
+        f"products.weight * stock.quantity AS weight "
+        f"FROM {stock_model._meta.db_table} AS stock "
+        f"JOIN {product_model._meta.db_table} AS products ON products.id = stock.product_id "
+        f"WHERE stock.deleted_at IS NULL"
+        for metal, stock_model, product_model in [
+            ('Gold', GoldWarehouseStock, GoldProduct), ('Silver', SilverWarehouseStock, SilverProduct)
+        ]
+    )
+    stock = fetch_dicts(f"""
+        SELECT
+            warehouses.id AS warehouse_id,
+            warehouses.code AS warehouse_code,
+            branches.name AS branch_name,
+            COUNT(DISTINCT product_id) FILTER (WHERE metal = 'Gold') AS gold_products,
+            COALESCE(SUM(quantity) FILTER (WHERE metal = 'Gold'), 0) AS gold_quantity,
+            COALESCE(SUM(weight) FILTER (WHERE metal = 'Gold'), 0) AS gold_weight,
+            COUNT(DISTINCT product_id) FILTER (WHERE metal = 'Silver') AS silver_products,
+            COALESCE(SUM(quantity) FILTER (WHERE metal = 'Silver'), 0) AS silver_quantity,
+            COALESCE(SUM(weight) FILTER (WHERE metal = 'Silver'), 0) AS silver_weight
+        FROM ({stock_tables}) AS stock
+        JOIN {Warehouse._meta.db_table} AS warehouses ON warehouses.id = stock.warehouse_id
+        JOIN {Branch._meta.db_table} AS branches ON branches.id = warehouses.branch_id
+        {stock_where}
+        GROUP BY warehouses.id, warehouses.code, branches.name
+        ORDER BY warehouses.code
+    """, stock_params)
+
+    summaries = {}
+    for metal in ('gold', 'silver'):
+        rows = [
+            {
+                'invoice_type': row['invoice_type'],
+                'transaction_type': row['transaction_type'],
+                'count': row[f'{metal}_count'],
+                'total_amount': row[f'{metal}_total'],
+            }
+            for row in sales if row['date'] is None and row[f'{metal}_count']
+        ]
+        summaries[metal] = sorted(rows, key=lambda row: row['total_amount'], reverse=True)
+    return {
+        'gold_summary': summaries['gold'],
+        'silver_summary': summaries['silver'],
+        'daily_sales': [
+            {
+                'date': row['date'],
+                'gold_sales': row['gold_sales'],
+                'silver_sales': row['silver_sales'],
+                'total_sales': row['gold_sales'] + row['silver_sales'],
+            }
+            for row in sales if row['date'] is not None
+        ],
+        'stock': stock,
+    }
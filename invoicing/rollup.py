@@ -0,0 +1,80 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .customers import record_customer_invoices
+from .models import GoldInvoice, SilverInvoice, DailySalesRollup
+
+INVOICE_MODELS = {
+    'Gold': GoldInvoice,
+    'Silver': SilverInvoice,
+}
+
+ROLLUP_KEY = ['branch_id', 'warehouse_id', 'date', 'metal', 'invoice_type', 'transaction_type']
+
+UPSERT_SQL = f"""
+    INSERT INTO {DailySalesRollup._meta.db_table}
+        ({', '.join(ROLLUP_KEY)}, invoice_count, total_amount)
+    VALUES {{values}}
+    ON CONFLICT ({', '.join(ROLLUP_KEY)}) DO UPDATE SET
+        invoice_count = {DailySalesRollup._meta.db_table}.invoice_count + EXCLUDED.invoice_count,
+        total_amount = {DailySalesRollup._meta.db_table}.total_amount + EXCLUDED.total_amount
+"""
+
+def record_invoices(metal, invoices, sign=1):
+    """Add invoices to (or, with sign=-1, remove them from) the daily rollup and their customers' counters.
+
+    The rollup is written with one INSERT ... ON CONFLICT DO UPDATE in the
+    caller's transaction. Keys are written in sorted order so concurrent
+    writers lock rollup rows in the same sequence.
+    """
+    record_customer_invoices(metal, invoices, sign)
+    totals = defaultdict(lambda: [0, 0])
+    for invoice in invoices:
+        key = (
+            invoice.branch_id, invoice.warehouse_id, timezone.localdate(invoice.created_date),
+            metal, invoice.invoice_type, invoice.transaction_type
+        )
+        totals[key][0] += sign
+        totals[key][1] += sign * invoice.total_price
+    if not totals:
+        return
+
+    params = []
+    for key in sorted(totals):
+        params.extend(key)
+        params.extend(totals[key])
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(totals))
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL.format(values=placeholders), params)
+
+def rebuild_rollup(start_date=None, end_date=None):
+    """Recompute the rollup from the invoice tables for an inclusive date range (all dates by default)"""
+    rollup = DailySalesRollup.objects.all()
+    bounds = {}
+    if start_date:
+        rollup = rollup.filter(date__gte=start_date)
+        bounds['created_date__gte'] = timezone.make_aware(datetime.combine(start_date, time.min))
+    if end_date:
+        rollup = rollup.filter(date__lte=end_date)
+        bounds['created_date__lt'] = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+
+    created = 0
+    with transaction.atomic():
+        rollup.delete()
+        for metal, invoice_model in INVOICE_MODELS.items():
+            rows = invoice_model.objects.filter(**bounds).annotate(
+                date=TruncDate('created_date')
+            ).values(
+                'branch_id', 'warehouse_id', 'date', 'invoice_type', 'transaction_type'
+            ).annotate(
+                invoice_count=Count('id'),
+                total_amount=Sum('total_price')
+            ).order_by()
+            created += len(DailySalesRollup.objects.bulk_create(
+                [DailySalesRollup(metal=metal, **row) for row in rows.iterator(chunk_size=2000)],
+                batch_size=1000
+            ))
+    return created
@@ -1,11 +1,62 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem
+from rest_framework.reverse import reverse
+from inventory.models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock
+from inventory.stock import InsufficientStock, apply_stock_changes
+from utils.export import EXPORT_FORMATS
+from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem, ReportJob
+from .reports import BUCKETS, LEADERBOARD_ORDER
+from .rollup import record_invoices
+from .vendors import assign_item_vendors
+
+def invoice_stock_changes(invoice, items):
+    """Signed per-product quantities moved by an invoice: sales take stock out, returns put it back"""
+    sign = 1 if invoice.invoice_type in invoice.RESTOCK_INVOICE_TYPES else -1
+    changes = defaultdict(int)
+    for item in items:
+        if item.product_id:
+            changes[item.product_id] += sign * item.item_quantity
+    return changes
+
+def post_invoice_stock(stock_model, invoice, items):
+    try:
+        apply_stock_changes(
+            stock_model, invoice.warehouse_id, invoice_stock_changes(invoice, items), invoice.created_by,
+            reference_id=invoice.id
+        )
+    except InsufficientStock as exc:
+        raise serializers.ValidationError({'items': [str(exc)]})
+
+def restate_invoice_stock(stock_model, invoice_id, before, after, user):
+    """Replace an invoice's stock posting `before` with `after`, each a (warehouse_id, changes) pair or None.
+
+    Only the difference is applied, warehouse by warehouse in id order, so an
+    edit that moves no stock touches no stock rows and a deleted invoice puts
+    back what it took.
+    """
+    totals = defaultdict(lambda: defaultdict(int))
+    for posting, sign in [(before, -1), (after, 1)]:
+        if posting is not None:
+            warehouse_id, changes = posting
+            for product_id, delta in changes.items():
+                totals[warehouse_id][product_id] += sign * delta
+    try:
+        for warehouse_id in sorted(totals):
+            changes = {product_id: delta for product_id, delta in totals[warehouse_id].items() if delta}
+            apply_stock_changes(stock_model, warehouse_id, changes, user, reference_id=invoice_id)
+    except InsufficientStock as exc:
+        raise serializers.ValidationError({'items': [str(exc)]})
 
 class GoldInvoiceItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = GoldInvoiceItem
-        fields = ['id', 'item_name', 'item_weight', 'item_carat', 'item_stamp_enduser',
+        fields = ['id', 'product', 'vendor', 'item_name', 'item_weight', 'item_carat', 'item_stamp_enduser',
                  'item_quantity', 'item_price', 'item_total_price', 'vendor_name']
+        read_only_fields = ['vendor']
 
 class GoldInvoiceSerializer(serializers.ModelSerializer):
     items = GoldInvoiceItemSerializer(many=True, read_only=True)
@@ -33,24 +84,38 @@ class GoldInvoiceCreateSerializer(serializers.ModelSerializer):
         fields = ['warehouse', 'seller', 'branch', 'customer', 'gold_price_21', 
                  'gold_price_24', 'transaction_type', 'invoice_type', 'items']
     
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
+        # Total is known up front, so the header is written once with its final value
+        validated_data['total_price'] = sum(
+            (item_data['item_total_price'] for item_data in items_data), Decimal('0')
+        )
         invoice = GoldInvoice.objects.create(**validated_data)
-        
-        total_price = 0
-        for item_data in items_data:
-            item = GoldInvoiceItem.objects.create(invoice=invoice, **item_data)
-            total_price += item.item_total_price
-        
-        invoice.total_price = total_price
-        invoice.save()
+        items = GoldInvoiceItem.objects.bulk_create(assign_item_vendors(GoldProduct, [
+            GoldInvoiceItem(invoice=invoice, **item_data) for item_data in items_data
+        ]))
+        post_invoice_stock(GoldWarehouseStock, invoice, items)
+        record_invoices('Gold', [invoice])
         return invoice
 
+class GoldInvoiceBatchItemSerializer(GoldInvoiceItemSerializer):
+    product = serializers.IntegerField(required=False, allow_null=True)
+
+class GoldInvoiceBatchSerializer(GoldInvoiceCreateSerializer):
+    """Offline invoice payload; foreign keys are plain ids resolved in bulk by the importer"""
+    warehouse = serializers.IntegerField()
+    seller = serializers.IntegerField()
+    branch = serializers.IntegerField()
+    customer = serializers.IntegerField()
+    items = GoldInvoiceBatchItemSerializer(many=True)
+
 class SilverInvoiceItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = SilverInvoiceItem
-        fields = ['id', 'item_name', 'item_weight', 'item_carat', 'item_stamp_enduser',
+        fields = ['id', 'product', 'vendor', 'item_name', 'item_weight', 'item_carat', 'item_stamp_enduser',
                  'item_quantity', 'item_price', 'item_total_price', 'vendor_name']
+        read_only_fields = ['vendor']
 
 class SilverInvoiceSerializer(serializers.ModelSerializer):
     items = SilverInvoiceItemSerializer(many=True, read_only=True)
@@ -77,19 +142,32 @@ class SilverInvoiceCreateSerializer(serializers.ModelSerializer):
         fields = ['warehouse', 'seller', 'branch', 'customer', 'silver_price', 
                  'transaction_type', 'invoice_type', 'items']
     
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
+        # Total is known up front, so the header is written once with its final value
+        validated_data['total_price'] = sum(
+            (item_data['item_total_price'] for item_data in items_data), Decimal('0')
+        )
         invoice = SilverInvoice.objects.create(**validated_data)
-        
-        total_price = 0
-        for item_data in items_data:
-            item = SilverInvoiceItem.objects.create(invoice=invoice, **item_data)
-            total_price += item.item_total_price
-        
-        invoice.total_price = total_price
-        invoice.save()
+        items = SilverInvoiceItem.objects.bulk_create(assign_item_vendors(SilverProduct, [
+            SilverInvoiceItem(invoice=invoice, **item_data) for item_data in items_data
+        ]))
+        post_invoice_stock(SilverWarehouseStock, invoice, items)
+        record_invoices('Silver', [invoice])
         return invoice
 
+class SilverInvoiceBatchItemSerializer(SilverInvoiceItemSerializer):
+    product = serializers.IntegerField(required=False, allow_null=True)
+
+class SilverInvoiceBatchSerializer(SilverInvoiceCreateSerializer):
+    """Offline invoice payload; foreign keys are plain ids resolved in bulk by the importer"""
+    warehouse = serializers.IntegerField()
+    seller = serializers.IntegerField()
+    branch = serializers.IntegerField()
+    customer = serializers.IntegerField()
+    items = SilverInvoiceBatchItemSerializer(many=True)
+
 # Report Serializers
 class InvoiceSummarySerializer(serializers.Serializer):
     invoice_type = serializers.CharField()
@@ -101,4 +179,125 @@ class DailySalesSerializer(serializers.Serializer):
     date = serializers.DateField()
     gold_sales = serializers.DecimalField(max_digits=15, decimal_places=2)
     silver_sales = serializers.DecimalField(max_digits=15, decimal_places=2)
-    total_sales = serializers.DecimalField(max_digits=15, decimal_places=2)
\ No newline at end of file
+    total_sales = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+class ReportFilterSerializer(serializers.Serializer):
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    branch = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, data):
+        data.setdefault('end_date', timezone.localdate())
+        data.setdefault('start_date', data['end_date'] - timedelta(days=30))
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date must not be after end_date")
+        return data
+
+class TimeSeriesFilterSerializer(ReportFilterSerializer):
+    # Upper bound on the number of points one request may generate
+    max_buckets = 10000
+    bucket_hours = {'hour': 1, 'day': 24, 'week': 24 * 7, 'month': 24 * 28}
+
+    bucket = serializers.ChoiceField(choices=BUCKETS, default='day')
+    warehouse = serializers.ListField(child=serializers.IntegerField(), required=False)
+    seller = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, data):
+        data = super().validate(data)
+        hours = ((data['end_date'] - data['start_date']).days + 1) * 24
+        if hours // self.bucket_hours[data['bucket']] > self.max_buckets:
+            raise serializers.ValidationError(
+                f"Range too long for {data['bucket']} buckets (at most {self.max_buckets} points)"
+            )
+        return data
+
+class TimeSeriesRowSerializer(serializers.Serializer):
+    bucket = serializers.DateTimeField()
+    gold_count = serializers.IntegerField()
+    gold_total = serializers.DecimalField(max_digits=15, decimal_places=2)
+    silver_count = serializers.IntegerField()
+    silver_total = serializers.DecimalField(max_digits=15, decimal_places=2)
+    total_count = serializers.IntegerField()
+    total_amount = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+class LeaderboardFilterSerializer(ReportFilterSerializer):
+    rank_by = serializers.ChoiceField(choices=list(LEADERBOARD_ORDER), default='revenue')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+class LeaderboardRowSerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    seller_id = serializers.IntegerField()
+    seller_name = serializers.CharField()
+    branch_id = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=15, decimal_places=2)
+    invoice_count = serializers.IntegerField()
+    return_count = serializers.IntegerField()
+    gold_grams = serializers.DecimalField(max_digits=15, decimal_places=2)
+    silver_grams = serializers.DecimalField(max_digits=15, decimal_places=2)
+    return_ratio = serializers.DecimalField(max_digits=10, decimal_places=4, allow_null=True)
+
+class VendorSalesRowSerializer(serializers.Serializer):
+    vendor_id = serializers.IntegerField(allow_null=True)
+    vendor_name = serializers.CharField(allow_null=True)
+    gold_quantity = serializers.IntegerField()
+    gold_grams = serializers.DecimalField(max_digits=15, decimal_places=2)
+    gold_revenue = serializers.DecimalField(max_digits=15, decimal_places=2)
+    silver_quantity = serializers.IntegerField()
+    silver_grams = serializers.DecimalField(max_digits=15, decimal_places=2)
+    silver_revenue = serializers.DecimalField(max_digits=15, decimal_places=2)
+    total_revenue = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+class CaratGramsRowSerializer(serializers.Serializer):
+    branch_id = serializers.IntegerField(required=False)
+    date = serializers.DateField(required=False)
+    carat = serializers.DecimalField(max_digits=10, decimal_places=2)
+    quantity = serializers.IntegerField()
+    grams = serializers.DecimalField(max_digits=15, decimal_places=2)
+    grams_21k = serializers.DecimalField(max_digits=15, decimal_places=2)
+    grams_24k = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+class ExportJobFilterSerializer(ReportFilterSerializer):
+    file_format = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    params = serializers.JSONField(required=False)
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True)
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'kind', 'params', 'status', 'progress', 'error', 'content_type',
+                 'created_date', 'started_date', 'finished_date', 'created_by_username', 'download_url']
+        read_only_fields = ['id', 'status', 'progress', 'error', 'content_type',
+                           'created_date', 'started_date', 'finished_date']
+    
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Expected a JSON object")
+        return value
+    
+    def get_download_url(self, obj):
+        if obj.status != 'Completed':
+            return None
+        return reverse('invoicing:reportjob-download', args=[obj.id], request=self.context.get('request'))
+
+class DashboardStockRowSerializer(serializers.Serializer):
+    warehouse_id = serializers.IntegerField()
+    warehouse_code = serializers.CharField()
+    branch_name = serializers.CharField()
+    gold_products = serializers.IntegerField()
+    gold_quantity = serializers.IntegerField()
+    gold_weight = serializers.DecimalField(max_digits=15, decimal_places=2)
+    silver_products = serializers.IntegerField()
+    silver_quantity = serializers.IntegerField()
+    silver_weight = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+class SalesReportRowSerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+    invoice_type = serializers.CharField()
+    gold_count = serializers.IntegerField()
+    gold_total = serializers.DecimalField(max_digits=15, decimal_places=2)
+    silver_count = serializers.IntegerField()
+    silver_total = serializers.DecimalField(max_digits=15, decimal_places=2)
+    total_count = serializers.IntegerField()
+    total_amount = serializers.DecimalField(max_digits=15, decimal_places=2)
@@ -1,3 +1,1255 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from accounts.models import User
+from core.models import Branch, Warehouse, Customer, Seller, Vendor, WarehouseTransaction
+from inventory.models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock, GoldStockMovement
+from utils.testing import QueryBudgetMixin
+from . import jobs
+from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem, DailySalesRollup, ReportJob
 
-# Create your tests here.
+
+class InvoiceTestMixin:
+    """Shared fixtures: one branch with a warehouse, seller and customer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('admin', 'admin@example.com', 'pass', role='Admin')
+        self.branch = Branch.objects.create(name='Main', created_by=self.user)
+        self.user.branch = self.branch
+        self.user.save()
+        self.warehouse = Warehouse.objects.create(code='WH-1', branch=self.branch, created_by=self.user)
+        self.seller = Seller.objects.create(name='Seller', branch=self.branch, created_by=self.user)
+        self.customer = Customer.objects.create(name='Customer', phone='0100', created_by=self.user)
+        self.client.force_authenticate(self.user)
+
+    def make_gold_product(self, **overrides):
+        if not hasattr(self, 'vendor'):
+            self.vendor = Vendor.objects.create(name='Vendor', created_by=self.user)
+        fields = {
+            'vendor': self.vendor, 'name': 'Ring', 'weight': '5.00', 'carat': '21.00',
+            'stamp_enduser': '10.00', 'cashback': '0.00', 'cashback_unpacking': '0.00',
+            'created_by': self.user,
+        }
+        fields.update(overrides)
+        return GoldProduct.objects.create(**fields)
+
+    def make_silver_product(self, **overrides):
+        if not hasattr(self, 'vendor'):
+            self.vendor = Vendor.objects.create(name='Vendor', created_by=self.user)
+        fields = {
+            'vendor': self.vendor, 'name': 'Chain', 'weight': '20.00', 'carat': '925.00',
+            'stamp_enduser': '5.00', 'cashback': '0.00', 'cashback_unpacking': '0.00',
+            'created_by': self.user,
+        }
+        fields.update(overrides)
+        return SilverProduct.objects.create(**fields)
+
+    def item_payload(self, **overrides):
+        item = {
+            'item_name': 'Ring',
+            'item_weight': '5.00',
+            'item_carat': '21.00',
+            'item_stamp_enduser': '10.00',
+            'item_quantity': 1,
+            'item_price': '100.00',
+            'item_total_price': '100.00',
+            'vendor_name': 'Vendor',
+        }
+        item.update(overrides)
+        return item
+
+    def gold_payload(self, items=1, **overrides):
+        payload = {
+            'warehouse': self.warehouse.id,
+            'seller': self.seller.id,
+            'branch': self.branch.id,
+            'customer': self.customer.id,
+            'gold_price_21': '3000.00',
+            'gold_price_24': '3400.00',
+            'transaction_type': 'Cash',
+            'invoice_type': 'Sale',
+            'items': [self.item_payload() for _ in range(items)],
+        }
+        payload.update(overrides)
+        return payload
+
+    def silver_payload(self, items=1, **overrides):
+        payload = {
+            'warehouse': self.warehouse.id,
+            'seller': self.seller.id,
+            'branch': self.branch.id,
+            'customer': self.customer.id,
+            'silver_price': '40.00',
+            'transaction_type': 'Cash',
+            'invoice_type': 'Sale',
+            'items': [self.item_payload() for _ in range(items)],
+        }
+        payload.update(overrides)
+        return payload
+
+
+class InvoiceCreateTests(InvoiceTestMixin, APITestCase):
+    def count_create_queries(self, url, payload):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return len(ctx.captured_queries)
+
+    def test_gold_invoice_total_computed_in_memory(self):
+        payload = self.gold_payload(items=3)
+        payload['items'][0]['item_total_price'] = '250.50'
+        response = self.client.post('/api/invoicing/gold-invoices/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        invoice = GoldInvoice.objects.get()
+        self.assertEqual(invoice.total_price, Decimal('450.50'))
+        self.assertEqual(GoldInvoiceItem.objects.filter(invoice=invoice).count(), 3)
+
+    def test_silver_invoice_total_computed_in_memory(self):
+        response = self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(items=4), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        invoice = SilverInvoice.objects.get()
+        self.assertEqual(invoice.total_price, Decimal('400.00'))
+        self.assertEqual(SilverInvoiceItem.objects.filter(invoice=invoice).count(), 4)
+
+    def test_create_query_count_independent_of_item_count(self):
+        for url, build in [
+            ('/api/invoicing/gold-invoices/', self.gold_payload),
+            ('/api/invoicing/silver-invoices/', self.silver_payload),
+        ]:
+            with self.subTest(url=url):
+                small = self.count_create_queries(url, build(items=1))
+                large = self.count_create_queries(url, build(items=30))
+                self.assertEqual(small, large)
+
+
+class InvoiceStockPostingTests(InvoiceTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_gold_product()
+        self.stock = GoldWarehouseStock.objects.create(
+            warehouse=self.warehouse, product=self.product, quantity=5, created_by=self.user
+        )
+
+    def test_sale_decrements_stock(self):
+        payload = self.gold_payload(items=0)
+        payload['items'] = [
+            self.item_payload(product=self.product.id, item_quantity=2),
+            self.item_payload(product=self.product.id, item_quantity=1),
+        ]
+        response = self.client.post('/api/invoicing/gold-invoices/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 2)
+
+    def test_sale_beyond_stock_is_rejected_and_rolled_back(self):
+        payload = self.gold_payload(items=0)
+        payload['items'] = [self.item_payload(product=self.product.id, item_quantity=6)]
+        response = self.client.post('/api/invoicing/gold-invoices/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GoldInvoice.objects.exists())
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 5)
+
+    def test_returns_restock_and_create_missing_rows(self):
+        silver_product = self.make_silver_product()
+        for invoice_type in ['Return Packing', 'Return Unpacking']:
+            payload = self.silver_payload(items=0, invoice_type=invoice_type)
+            payload['items'] = [self.item_payload(product=silver_product.id, item_quantity=3)]
+            response = self.client.post('/api/invoicing/silver-invoices/', payload, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+        stock = SilverWarehouseStock.objects.get(warehouse=self.warehouse, product=silver_product)
+        self.assertEqual(stock.quantity, 6)
+
+    def post_sale(self, quantity):
+        payload = self.gold_payload(items=0)
+        payload['items'] = [self.item_payload(product=self.product.id, item_quantity=quantity)]
+        response = self.client.post('/api/invoicing/gold-invoices/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return GoldInvoice.objects.latest('id').id
+
+    def quantities(self):
+        return dict(GoldWarehouseStock.objects.values_list('warehouse__code', 'quantity'))
+
+    def test_edits_and_deletes_restate_stock(self):
+        invoice_id = self.post_sale(2)
+        url = f'/api/invoicing/gold-invoices/{invoice_id}/'
+        other = Warehouse.objects.create(code='WH-2', branch=self.branch, created_by=self.user)
+        GoldWarehouseStock.objects.create(warehouse=other, product=self.product, quantity=4, created_by=self.user)
+
+        response = self.client.patch(url, {'warehouse': other.id}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.quantities(), {'WH-1': 5, 'WH-2': 2})
+        self.assertEqual(
+            dict(DailySalesRollup.objects.values_list('warehouse__code', 'invoice_count')), {'WH-1': 0, 'WH-2': 1}
+        )
+
+        self.client.patch(url, {'invoice_type': 'Return Packing'}, format='json')
+        self.assertEqual(self.quantities(), {'WH-1': 5, 'WH-2': 6})
+
+        self.client.patch(url, {'transaction_type': 'Visa'}, format='json')
+        self.assertEqual(self.quantities(), {'WH-1': 5, 'WH-2': 6})
+
+        self.client.delete(url)
+        self.assertEqual(self.quantities(), {'WH-1': 5, 'WH-2': 4})
+        self.assertEqual(
+            sum(GoldStockMovement.objects.filter(reference_id=invoice_id).values_list('delta', flat=True)), 0
+        )
+
+    def test_items_are_only_written_with_their_invoice(self):
+        invoice_id = self.post_sale(2)
+        item = GoldInvoiceItem.objects.get(invoice_id=invoice_id)
+        url = '/api/invoicing/gold-invoice-items/'
+        self.assertEqual(self.client.patch(f'{url}{item.id}/', {'item_quantity': 1}, format='json').status_code, 405)
+        self.assertEqual(self.client.delete(f'{url}{item.id}/').status_code, 405)
+        self.assertEqual(self.client.post(url, {'invoice': invoice_id}, format='json').status_code, 405)
+        self.assertEqual(self.quantities(), {'WH-1': 3})
+
+    def test_edit_that_oversells_is_rejected(self):
+        invoice_id = self.post_sale(2)
+        other = Warehouse.objects.create(code='WH-2', branch=self.branch, created_by=self.user)
+        response = self.client.patch(f'/api/invoicing/gold-invoices/{invoice_id}/', {'warehouse': other.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(GoldInvoice.objects.get(id=invoice_id).warehouse_id, self.warehouse.id)
+        self.assertEqual(self.quantities(), {'WH-1': 3})
+
+
+class ConcurrentStockPostingTests(InvoiceTestMixin, APITransactionTestCase):
+    def test_concurrent_sales_never_oversell_or_lose_updates(self):
+        products = [self.make_gold_product(name=f'Ring {i}') for i in range(2)]
+        for product in products:
+            GoldWarehouseStock.objects.create(
+                warehouse=self.warehouse, product=product, quantity=20, created_by=self.user
+            )
+        statuses = []
+        barrier = threading.Barrier(16)
+
+        def checkout(index):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            # Alternate the item order so lock ordering is what prevents deadlocks
+            ordered = products if index % 2 else products[::-1]
+            payload = self.gold_payload(items=0)
+            payload['items'] = [self.item_payload(product=p.id, item_quantity=2) for p in ordered]
+            try:
+                barrier.wait()
+                statuses.append(client.post('/api/invoicing/gold-invoices/', payload, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), 10)
+        self.assertEqual(statuses.count(400), 6)
+        self.assertEqual(GoldInvoice.objects.count(), 10)
+        for product in products:
+            self.assertEqual(GoldWarehouseStock.objects.get(product=product).quantity, 0)
+
+
+class InvoiceBatchTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/gold-invoices/batch/'
+
+    def test_json_array_returns_per_invoice_results(self):
+        invalid = self.gold_payload(customer=999999)
+        response = self.client.post(self.url, [self.gold_payload(items=2), invalid, self.gold_payload()], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'created'])
+        self.assertIn('customer', response.data['results'][1]['errors'])
+        self.assertEqual(GoldInvoice.objects.count(), 2)
+        self.assertEqual(GoldInvoiceItem.objects.count(), 3)
+        self.assertEqual(GoldInvoice.objects.get(id=response.data['results'][0]['id']).total_price, Decimal('200.00'))
+
+    def test_ndjson_stream(self):
+        lines = [json.dumps(self.silver_payload()) for _ in range(3)] + ['not json']
+        response = self.client.post(
+            '/api/invoicing/silver-invoices/batch/', '\n'.join(lines), content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['results'][3]['status'], 'error')
+        self.assertEqual(SilverInvoice.objects.count(), 3)
+
+    def test_insufficient_stock_rejects_only_uncovered_invoices(self):
+        product = self.make_gold_product()
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=product, quantity=3, created_by=self.user)
+        payloads = [self.gold_payload(items=0) for _ in range(3)]
+        for payload, quantity in zip(payloads, [2, 2, 1]):
+            payload['items'] = [self.item_payload(product=product.id, item_quantity=quantity)]
+        response = self.client.post(self.url, payloads, format='json')
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'created'])
+        self.assertEqual(GoldWarehouseStock.objects.get(product=product).quantity, 0)
+        results = response.data['results']
+        self.assertEqual(
+            sorted(GoldStockMovement.objects.values_list('delta', 'reason', 'reference_id')),
+            [(-2, 'Invoice', results[0]['id']), (-1, 'Invoice', results[2]['id'])]
+        )
+
+    def test_later_return_does_not_cover_an_earlier_oversell(self):
+        product = self.make_gold_product()
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=product, quantity=1, created_by=self.user)
+        payloads = [self.gold_payload(items=0), self.gold_payload(items=0, invoice_type='Return Packing')]
+        for payload in payloads:
+            payload['items'] = [self.item_payload(product=product.id, item_quantity=3)]
+        response = self.client.post(self.url, payloads, format='json')
+        self.assertEqual([r['status'] for r in response.data['results']], ['error', 'created'])
+        self.assertEqual(GoldWarehouseStock.objects.get(product=product).quantity, 4)
+
+    def test_query_count_independent_of_batch_size(self):
+        counts = []
+        for size in [2, 40]:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(self.url, [self.gold_payload(items=3) for _ in range(size)], format='json')
+            self.assertEqual(response.data['created'], size)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class InvoiceIdempotencyTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/gold-invoices/'
+
+    def test_retry_with_same_key_replays_stored_response(self):
+        first = self.client.post(self.url, self.gold_payload(items=2), format='json', HTTP_IDEMPOTENCY_KEY='pos-1-42')
+        self.assertEqual(first.status_code, 201, first.data)
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.client.post(self.url, self.gold_payload(items=2), format='json', HTTP_IDEMPOTENCY_KEY='pos-1-42')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(GoldInvoice.objects.count(), 1)
+
+    def test_failed_request_does_not_store_key(self):
+        response = self.client.post(self.url, self.gold_payload(customer=999999), format='json', HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, self.gold_payload(), format='json', HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual(response.status_code, 201)
+
+    def test_key_reused_on_other_endpoint_is_rejected(self):
+        self.client.post(self.url, self.gold_payload(), format='json', HTTP_IDEMPOTENCY_KEY='k')
+        response = self.client.post(
+            '/api/invoicing/silver-invoices/', self.silver_payload(), format='json', HTTP_IDEMPOTENCY_KEY='k'
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(SilverInvoice.objects.exists())
+
+
+class QueryBudgetTests(QueryBudgetMixin, InvoiceTestMixin, APITestCase):
+    """List and detail endpoints must cost the same number of queries however much they return"""
+
+    def seed(self, index, items=3):
+        user = User.objects.create_user(f'user{index}', f'user{index}@example.com', role='Manager')
+        branch = Branch.objects.create(name=f'Branch {index}', created_by=user)
+        warehouse = Warehouse.objects.create(code=f'WH-{index + 2}', branch=branch, created_by=user)
+        seller = Seller.objects.create(name=f'Seller {index}', branch=branch, created_by=user)
+        customer = Customer.objects.create(name=f'Customer {index}', phone=str(index), created_by=user)
+        header = {'warehouse': warehouse, 'seller': seller, 'branch': branch, 'customer': customer,
+                  'total_price': 100, 'invoice_type': 'Sale', 'created_by': user}
+        item = {'item_name': 'Ring', 'item_weight': 5, 'item_carat': 21, 'item_stamp_enduser': 10,
+                'item_quantity': 1, 'item_price': 100, 'item_total_price': 100, 'vendor_name': 'Vendor'}
+        gold = GoldInvoice.objects.create(gold_price_21=3000, gold_price_24=3400, **header)
+        silver = SilverInvoice.objects.create(silver_price=40, **header)
+        GoldInvoiceItem.objects.bulk_create([GoldInvoiceItem(invoice=gold, **item) for _ in range(items)])
+        SilverInvoiceItem.objects.bulk_create([SilverInvoiceItem(invoice=silver, **item) for _ in range(items)])
+        return gold, silver
+
+    def test_list_query_count_independent_of_page_size(self):
+        endpoints = ['gold-invoices', 'silver-invoices', 'gold-invoice-items', 'silver-invoice-items']
+        self.assertQueryCountIndependentOfRows([f'/api/invoicing/{name}/' for name in endpoints])
+
+    def test_detail_query_count_independent_of_item_count(self):
+        small_gold, small_silver = self.seed(0, items=1)
+        large_gold, large_silver = self.seed(1, items=30)
+        for prefix, small, large in [('gold-invoices', small_gold, large_gold), ('silver-invoices', small_silver, large_silver)]:
+            for suffix in ['', 'print_invoice/']:
+                with self.subTest(endpoint=prefix, action=suffix):
+                    self.assertEqual(
+                        self.count_queries(f'/api/invoicing/{prefix}/{large.id}/{suffix}'),
+                        self.count_queries(f'/api/invoicing/{prefix}/{small.id}/{suffix}')
+                    )
+
+
+class KeysetPaginationTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/gold-invoices/'
+
+    def setUp(self):
+        super().setUp()
+        invoices = GoldInvoice.objects.bulk_create([
+            GoldInvoice(warehouse=self.warehouse, seller=self.seller, branch=self.branch, customer=self.customer,
+                        gold_price_21=3000, gold_price_24=3400, total_price=i, invoice_type='Sale',
+                        created_by=self.user)
+            for i in range(25)
+        ])
+        # Several invoices share a timestamp so the id tie-breaker is exercised
+        stamp = timezone.now()
+        GoldInvoice.objects.filter(id__in=[invoice.id for invoice in invoices[5:15]]).update(created_date=stamp)
+        self.expected = list(GoldInvoice.objects.order_by('-created_date', '-id').values_list('id', flat=True))
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data[link]
+        return ids
+
+    def test_walks_every_row_once_in_both_directions(self):
+        forward = self.walk(self.url, 'next')
+        self.assertEqual(forward, self.expected)
+
+        last_page = self.client.get(self.url)
+        while last_page.data['next']:
+            last_page = self.client.get(last_page.data['next'])
+        backward_url = last_page.data['previous']
+        backward = self.walk(backward_url, 'previous')
+        self.assertEqual(backward, self.expected[10:20] + self.expected[:10])
+
+    def test_no_count_or_offset_queries(self):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first.data['next'])
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_page_number_pagination_is_opt_in(self):
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[10:20])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 404)
+
+    def test_items_paginate_by_id(self):
+        invoice = GoldInvoice.objects.first()
+        GoldInvoiceItem.objects.bulk_create([
+            GoldInvoiceItem(invoice=invoice, **{
+                'item_name': 'Ring', 'item_weight': 5, 'item_carat': 21, 'item_stamp_enduser': 10,
+                'item_quantity': 1, 'item_price': 100, 'item_total_price': 100, 'vendor_name': 'Vendor'})
+            for _ in range(15)
+        ])
+        ids = self.walk('/api/invoicing/gold-invoice-items/', 'next')
+        self.assertEqual(ids, list(GoldInvoiceItem.objects.order_by('-id').values_list('id', flat=True)))
+
+
+class IndexUsageTests(TestCase):
+    """EXPLAIN the hot queries over a small seeded dataset and check each one is served by its index.
+
+    Sequential scans are disabled while explaining, so a handful of rows is enough for the planner
+    to show which index it would pick over a large table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        now = timezone.now()
+        user = User.objects.create_user('admin', 'admin@example.com', role='Admin')
+        vendor = Vendor.objects.create(name='Vendor', created_by=user)
+        branches = Branch.objects.bulk_create([Branch(name=f'B{i}', created_by=user) for i in range(10)])
+        warehouses = Warehouse.objects.bulk_create([
+            Warehouse(code=f'W{i}', branch=branches[i % 10], created_by=user) for i in range(20)
+        ])
+        sellers = Seller.objects.bulk_create([
+            Seller(name=f'S{i}', branch=branches[i % 10], created_by=user) for i in range(20)
+        ])
+        customer = Customer.objects.create(name='Customer', phone='0100', created_by=user)
+        products = GoldProduct.objects.bulk_create([
+            GoldProduct(vendor=vendor, name=f'P{i}', weight=5, carat=21, stamp_enduser=10,
+                        cashback=0, cashback_unpacking=0, created_by=user)
+            for i in range(40)
+        ])
+        GoldWarehouseStock.objects.bulk_create([
+            GoldWarehouseStock(warehouse=warehouses[i % 20], product=products[i], quantity=1, created_by=user)
+            for i in range(40)
+        ])
+        for invoice_model, prices in [
+            (GoldInvoice, {'gold_price_21': 3000, 'gold_price_24': 3400}),
+            (SilverInvoice, {'silver_price': 40}),
+        ]:
+            invoices = []
+            for i in range(400):
+                warehouse = warehouses[rng.randrange(20)]
+                invoices.append(invoice_model(
+                    warehouse=warehouse, seller=sellers[warehouse.branch_id % 20], branch_id=warehouse.branch_id,
+                    customer=customer, total_price=100, created_by=user,
+                    invoice_type=rng.choice(['Sale', 'Sale', 'Sale', 'Return Packing']), **prices
+                ))
+            created = invoice_model.objects.bulk_create(invoices)
+            # Spread the invoices over a year
+            for offset in range(0, len(created), 100):
+                ids = [invoice.id for invoice in created[offset:offset + 100]]
+                invoice_model.objects.filter(id__in=ids).update(created_date=now - timedelta(days=offset // 100 * 90))
+        WarehouseTransaction.objects.bulk_create([
+            WarehouseTransaction(item_name='Ring', from_warehouse=warehouses[i % 20],
+                                 to_warehouse=warehouses[(i + 1) % 20], quantity=1,
+                                 status='Pending' if i % 50 == 0 else 'Approved',
+                                 action_by=user, action_date=now, created_by=user)
+            for i in range(200)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.branch_id = branches[3].id
+        cls.warehouse_id = warehouses[5].id
+        cls.since = now - timedelta(days=30)
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            plan = queryset.explain()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+        self.assertIn(index_name, plan, plan)
+
+    def test_hot_queries_use_index_scans(self):
+        for invoice_model, prefix in [(GoldInvoice, 'gold_invoice'), (SilverInvoice, 'silver_invoice')]:
+            with self.subTest(model=prefix):
+                invoices = invoice_model.objects
+                self.assertUsesIndex(
+                    invoices.filter(branch_id=self.branch_id, invoice_type='Sale', created_date__gte=self.since)
+                    .values('transaction_type').annotate(total=Sum('total_price')),
+                    f'{prefix}_branch_type_idx'
+                )
+                self.assertUsesIndex(
+                    invoices.filter(warehouse_id=self.warehouse_id, created_date__gte=self.since),
+                    f'{prefix}_warehouse_idx'
+                )
+                self.assertUsesIndex(
+                    invoices.filter(branch_id=self.branch_id).order_by('-created_date', '-id')[:10],
+                    f'{prefix}_branch_idx'
+                )
+                self.assertUsesIndex(invoices.order_by('-created_date', '-id')[:10], f'{prefix}_created_id_idx')
+        self.assertUsesIndex(
+            WarehouseTransaction.objects.filter(status='Pending').order_by('-created_date')[:10],
+            'warehouse_tx_status_idx'
+        )
+
+    def test_soft_delete_listings_use_partial_indexes(self):
+        self.assertUsesIndex(Branch.objects.order_by('-created_date')[:10], 'branches_live_created_idx')
+        self.assertUsesIndex(
+            Seller.objects.filter(branch_id=self.branch_id).order_by('-created_date')[:10], 'sellers_live_branch_idx'
+        )
+        self.assertUsesIndex(GoldProduct.objects.order_by('-created_date')[:10], 'gold_products_live_created_idx')
+        self.assertUsesIndex(
+            GoldWarehouseStock.objects.filter(warehouse_id=self.warehouse_id).order_by('-created_date')[:10],
+            'gold_stock_live_warehouse_idx'
+        )
+
+
+class DailySalesRollupTests(InvoiceTestMixin, APITestCase):
+    def rollup_rows(self):
+        return sorted(DailySalesRollup.objects.filter(invoice_count__gt=0).values_list(
+            'branch_id', 'warehouse_id', 'date', 'metal', 'invoice_type', 'transaction_type',
+            'invoice_count', 'total_amount'
+        ))
+
+    def test_invoice_writes_maintain_rollup(self):
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(items=2), format='json')
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(), format='json')
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(transaction_type='Visa'), format='json')
+        self.client.post('/api/invoicing/silver-invoices/batch/', [self.silver_payload()] * 3, format='json')
+        row = DailySalesRollup.objects.get(metal='Gold', transaction_type='Cash')
+        self.assertEqual((row.invoice_count, row.total_amount), (2, Decimal('300.00')))
+        row = DailySalesRollup.objects.get(metal='Silver')
+        self.assertEqual((row.invoice_count, row.total_amount), (3, Decimal('300.00')))
+
+        visa = GoldInvoice.objects.get(transaction_type='Visa')
+        self.client.delete(f'/api/invoicing/gold-invoices/{visa.id}/')
+        self.assertEqual(DailySalesRollup.objects.get(metal='Gold', transaction_type='Visa').invoice_count, 0)
+
+        incremental = self.rollup_rows()
+        call_command('rebuild_sales_rollup', stdout=io.StringIO())
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_daily_sales_reads_both_metals_from_rollup(self):
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(items=2), format='json')
+        self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(), format='json')
+        self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(invoice_type='Return Packing'), format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/invoicing/gold-invoices/daily_sales/')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['gold_sales'], '200.00')
+        self.assertEqual(response.data[0]['silver_sales'], '100.00')
+        self.assertEqual(response.data[0]['total_sales'], '300.00')
+        self.assertEqual(self.client.get('/api/invoicing/silver-invoices/daily_sales/').data, response.data)
+
+
+class SalesReportTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/reports/sales/'
+
+    def setUp(self):
+        super().setUp()
+        self.other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        self.other_warehouse = Warehouse.objects.create(code='WH-2', branch=self.other_branch, created_by=self.user)
+        today = timezone.now()
+        header = {'seller': self.seller, 'customer': self.customer, 'created_by': self.user}
+        rows = [
+            (GoldInvoice, {'gold_price_21': 1, 'gold_price_24': 1}, self.branch, self.warehouse, 'Sale', 100, 0),
+            (GoldInvoice, {'gold_price_21': 1, 'gold_price_24': 1}, self.branch, self.warehouse, 'Sale', 50, 1),
+            (SilverInvoice, {'silver_price': 1}, self.branch, self.warehouse, 'Sale', 30, 0),
+            (SilverInvoice, {'silver_price': 1}, self.branch, self.warehouse, 'Return Packing', 10, 0),
+            (GoldInvoice, {'gold_price_21': 1, 'gold_price_24': 1}, self.other_branch, self.other_warehouse, 'Sale', 999, 0),
+        ]
+        for model, prices, branch, warehouse, invoice_type, total, days_ago in rows:
+            invoice = model.objects.create(branch=branch, warehouse=warehouse, invoice_type=invoice_type,
+                                           total_price=total, **prices, **header)
+            model.objects.filter(id=invoice.id).update(created_date=today - timedelta(days=days_ago))
+        self.today = timezone.localdate()
+
+    def test_one_statement_merges_both_metals(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'branch': self.branch.id})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        today_sales = next(row for row in response.data['daily']
+                           if row['date'] == self.today.isoformat() and row['invoice_type'] == 'Sale')
+        self.assertEqual(
+            (today_sales['gold_total'], today_sales['silver_total'], today_sales['total_amount']),
+            ('100.00', '30.00', '130.00')
+        )
+        sale_totals = next(row for row in response.data['by_type'] if row['invoice_type'] == 'Sale')
+        self.assertNotIn('date', sale_totals)
+        self.assertEqual((sale_totals['gold_count'], sale_totals['total_amount']), (2, '180.00'))
+
+    def test_date_range_and_branch_filters(self):
+        response = self.client.get(self.url, {'start_date': self.today.isoformat()})
+        sales = next(row for row in response.data['by_type'] if row['invoice_type'] == 'Sale')
+        self.assertEqual(sales['gold_total'], '1099.00')
+
+        response = self.client.get(self.url, {'branch': [self.branch.id, self.other_branch.id]})
+        sales = next(row for row in response.data['by_type'] if row['invoice_type'] == 'Sale')
+        self.assertEqual(sales['gold_total'], '1149.00')
+
+        self.assertEqual(self.client.get(self.url, {'start_date': '2026-02-01', 'end_date': '2026-01-01'}).status_code, 400)
+
+    def test_non_admin_is_limited_to_own_branch(self):
+        self.user.role = 'Employee'
+        self.user.save()
+        response = self.client.get(self.url, {'branch': self.other_branch.id})
+        sales = next(row for row in response.data['by_type'] if row['invoice_type'] == 'Sale')
+        self.assertEqual(sales['gold_total'], '150.00')
+
+
+class ReportCacheTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/gold-invoices/summary/'
+
+    def setUp(self):
+        super().setUp()
+        caches['reports'].clear()
+
+    def test_summary_is_cached_until_an_invoice_is_written(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(), format='json')
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(first.data[0]['count'], 1)
+
+        # Different params and a different branch scope get their own entries
+        self.assertEqual(self.client.get(self.url, {'start_date': '2999-01-01'}).data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(), format='json')
+        self.assertEqual(self.client.get(self.url).data[0]['count'], 2)
+
+        # Silver writes leave the gold summary cached
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(), format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        stats = self.client.get('/api/invoicing/reports/cache_stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (2, 3))
+
+    def test_batch_import_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/invoicing/gold-invoices/batch/', [self.gold_payload()] * 2, format='json')
+        self.assertEqual(self.client.get(self.url).data[0]['count'], 2)
+
+
+class ExportTests(InvoiceTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        for payload in [self.gold_payload(items=2), self.gold_payload(invoice_type='Return Packing'),
+                        self.gold_payload(branch=self.other_branch.id)]:
+            self.client.post('/api/invoicing/gold-invoices/', payload, format='json')
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_keeps_filters(self):
+        response = self.client.get('/api/invoicing/gold-invoices/export/', {'invoice_type': 'Sale'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(self.read(response))))
+        self.assertEqual(rows[0][:3], ['id', 'created_date', 'branch__name'])
+        self.assertEqual(len(rows), 3)
+
+    def test_ndjson_export_of_items_scoped_to_branch(self):
+        self.user.role = 'Employee'
+        self.user.save()
+        response = self.client.get('/api/invoicing/gold-invoice-items/export/', {'file_format': 'ndjson'})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['invoice__branch__name'] for row in rows}, {'Main'})
+
+    def test_date_range_and_bad_format(self):
+        today = timezone.localdate()
+        response = self.client.get('/api/invoicing/gold-invoices/export/', {'end_date': (today - timedelta(days=1)).isoformat()})
+        self.assertEqual(len(self.read(response).splitlines()), 1)
+        response = self.client.get('/api/invoicing/gold-invoices/export/', {'start_date': today.isoformat()})
+        self.assertEqual(len(self.read(response).splitlines()), 4)
+        self.assertEqual(self.client.get('/api/invoicing/gold-invoices/export/', {'file_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/invoicing/gold-invoices/export/', {'start_date': 'soon'}).status_code, 400)
+
+
+class SalesTimeSeriesTests(SalesReportTests):
+    url = '/api/invoicing/reports/timeseries/'
+
+    def test_one_statement_merges_both_metals(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'branch': self.branch.id, 'start_date': '2000-01-01'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        series = response.data['series']
+        self.assertEqual(len(series), (self.today - date(2000, 1, 1)).days + 1)
+        self.assertEqual(
+            [(row['gold_total'], row['silver_total'], row['total_amount']) for row in series[-2:]],
+            [('50.00', '0.00', '50.00'), ('100.00', '40.00', '140.00')]
+        )
+        self.assertEqual(series[0]['total_count'], 0)
+
+    def test_date_range_and_branch_filters(self):
+        response = self.client.get(self.url, {'bucket': 'month', 'start_date': self.today.isoformat()})
+        self.assertEqual(len(response.data['series']), 1)
+        self.assertEqual(response.data['series'][0]['gold_total'], '1099.00')
+
+        response = self.client.get(self.url, {'bucket': 'hour', 'start_date': self.today.isoformat(),
+                                              'warehouse': self.other_warehouse.id})
+        series = response.data['series']
+        self.assertEqual(len(series), 24)
+        self.assertEqual(sum(Decimal(row['gold_total']) for row in series), 999)
+
+        response = self.client.get(self.url, {'bucket': 'week', 'seller': self.seller.id + 1})
+        self.assertTrue(all(row['total_count'] == 0 for row in response.data['series']))
+
+        self.assertEqual(self.client.get(self.url, {'bucket': 'minute'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'bucket': 'hour', 'start_date': '2000-01-01'}).status_code, 400)
+
+    def test_non_admin_is_limited_to_own_branch(self):
+        self.user.role = 'Employee'
+        self.user.save()
+        response = self.client.get(self.url, {'branch': self.other_branch.id, 'bucket': 'month'})
+        self.assertEqual(sum(Decimal(row['gold_total']) for row in response.data['series']), 150)
+
+
+@tag('benchmark')
+class YearOfSalesBenchmarkTests(TestCase):
+    """A year of invoices for both metals, two gold items each, read by the range reports"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('admin', 'admin@example.com', role='Admin')
+        cls.user = user
+        branch = Branch.objects.create(name='Main', created_by=user)
+        warehouse = Warehouse.objects.create(code='WH-1', branch=branch, created_by=user)
+        seller = Seller.objects.create(name='Seller', branch=branch, created_by=user)
+        customer = Customer.objects.create(name='Customer', phone='0100', created_by=user)
+        header = {'warehouse': warehouse, 'seller': seller, 'branch': branch, 'customer': customer,
+                  'total_price': 10, 'created_by': user, 'invoice_type': 'Sale'}
+        for invoice_model, prices in [
+            (GoldInvoice, {'gold_price_21': 3000, 'gold_price_24': 3400}),
+            (SilverInvoice, {'silver_price': 40}),
+        ]:
+            invoice_model.objects.bulk_create(
+                [invoice_model(**header, **prices) for _ in range(365 * 48)], batch_size=5000
+            )
+            with connection.cursor() as cursor:
+                # Two invoices an hour, every hour, over the last 365 days
+                cursor.execute(
+                    f"UPDATE {invoice_model._meta.db_table} SET created_date = "
+                    f"date_trunc('day', now()) - ((id % (365 * 24)) * interval '1 hour') - interval '1 minute'"
+                )
+        GoldInvoiceItem.objects.bulk_create([
+            GoldInvoiceItem(invoice_id=invoice_id, item_name='Ring', item_weight=5, item_carat=carat,
+                            item_stamp_enduser=10, item_quantity=2, item_price=5, item_total_price=10,
+                            vendor_name='Vendor')
+            for invoice_id in GoldInvoice.objects.values_list('id', flat=True)
+            for carat in (18, 21)
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        end = timezone.localdate() - timedelta(days=1)
+        self.params = {'start_date': (end - timedelta(days=364)).isoformat(), 'end_date': end.isoformat()}
+
+    def test_every_bucket_is_one_statement_over_the_year(self):
+        client, params = self.client, self.params
+        for bucket, points in [('hour', 365 * 24), ('day', 365), ('week', 53), ('month', 12)]:
+            with self.subTest(bucket=bucket), CaptureQueriesContext(connection) as ctx:
+                response = client.get('/api/invoicing/reports/timeseries/', {**params, 'bucket': bucket})
+                self.assertEqual(len(ctx.captured_queries), 1)
+                series = response.data['series']
+                self.assertIn(len(series), [points, points + 1])
+                self.assertEqual(sum(row['gold_count'] for row in series), 365 * 48)
+                self.assertEqual(sum(Decimal(row['total_amount']) for row in series), 365 * 48 * 2 * 10)
+
+    def test_carat_report_over_the_year_is_one_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/invoicing/reports/carats/', self.params)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(len(response.data['daily']), 365 * 2)
+        by_carat = {row['carat']: row for row in response.data['by_carat']}
+        grams = 365 * 48 * 10
+        self.assertEqual(by_carat['18.00']['grams'], f'{grams}.00')
+        self.assertEqual(by_carat['18.00']['grams_21k'], f'{grams * 18 / 21:.2f}')
+        self.assertEqual(by_carat['21.00']['grams_24k'], f'{grams * 21 / 24:.2f}')
+
+
+class SellerLeaderboardTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/reports/leaderboard/'
+
+    def setUp(self):
+        super().setUp()
+        self.star = Seller.objects.create(name='Star', branch=self.branch, created_by=self.user)
+        self.other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        other_warehouse = Warehouse.objects.create(code='WH-2', branch=self.other_branch, created_by=self.user)
+        self.outsider = Seller.objects.create(name='Outsider', branch=self.other_branch, created_by=self.user)
+        gold = self.make_gold_product()
+        silver = self.make_silver_product()
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=gold, quantity=100, created_by=self.user)
+        SilverWarehouseStock.objects.create(warehouse=self.warehouse, product=silver, quantity=100, created_by=self.user)
+        GoldWarehouseStock.objects.create(warehouse=other_warehouse, product=gold, quantity=100, created_by=self.user)
+
+        def gold_sale(seller, quantity, total, **overrides):
+            item = self.item_payload(product=gold.id, item_quantity=quantity, item_total_price=total)
+            payload = dict(self.gold_payload(seller=seller.id, **overrides), items=[item])
+            self.assertEqual(self.client.post('/api/invoicing/gold-invoices/', payload, format='json').status_code, 201)
+
+        gold_sale(self.seller, 2, '200.00')
+        gold_sale(self.seller, 1, '100.00')
+        gold_sale(self.seller, 1, '100.00', invoice_type='Return Packing')
+        gold_sale(self.star, 3, '900.00')
+        item = self.item_payload(product=silver.id, item_weight='20.00', item_quantity=2, item_total_price='50.00')
+        payload = dict(self.silver_payload(seller=self.star.id), items=[item])
+        self.client.post('/api/invoicing/silver-invoices/', payload, format='json')
+        gold_sale(self.outsider, 1, '5000.00', branch=self.other_branch.id, warehouse=other_warehouse.id)
+
+    def test_ranks_sellers_in_one_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'branch': self.branch.id})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data['seller_count'], 2)
+        star, seller = response.data['results']
+        self.assertEqual(
+            (star['rank'], star['seller_name'], star['revenue'], star['invoice_count'],
+             star['gold_grams'], star['silver_grams'], star['return_ratio']),
+            (1, 'Star', '950.00', 2, '15.00', '40.00', '0.0000')
+        )
+        self.assertEqual(
+            (seller['rank'], seller['revenue'], seller['invoice_count'], seller['return_count'],
+             seller['gold_grams'], seller['return_ratio']),
+            (2, '200.00', 2, 1, '15.00', '0.3333')
+        )
+
+    def test_rank_by_and_limit(self):
+        response = self.client.get(self.url, {'rank_by': 'return_ratio', 'limit': 2})
+        self.assertEqual(response.data['seller_count'], 3)
+        self.assertEqual([row['rank'] for row in response.data['results']], [1, 1])
+        self.assertEqual({row['seller_name'] for row in response.data['results']}, {'Star', 'Outsider'})
+
+        response = self.client.get(self.url, {'rank_by': 'grams', 'limit': 1})
+        self.assertEqual(response.data['results'][0]['seller_name'], 'Star')
+        self.assertEqual(self.client.get(self.url, {'rank_by': 'name'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, 400)
+
+    def test_period_and_branch_scoping(self):
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        response = self.client.get(self.url, {'end_date': yesterday})
+        self.assertEqual(response.data, {**response.data, 'seller_count': 0, 'results': []})
+
+        self.user.role = 'Employee'
+        self.user.save()
+        response = self.client.get(self.url, {'branch': self.other_branch.id})
+        self.assertEqual({row['seller_name'] for row in response.data['results']}, {'Seller', 'Star'})
+
+
+class InvoiceItemVendorTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/reports/vendors/'
+
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_gold_product()
+        self.other_vendor = Vendor.objects.create(name='Atelier', created_by=self.user)
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=self.product, quantity=100, created_by=self.user)
+
+    def test_items_resolve_vendor_from_product_or_name(self):
+        Vendor.objects.create(name='Twin', created_by=self.user)
+        Vendor.objects.create(name='twin ', created_by=self.user)
+        items = [
+            self.item_payload(product=self.product.id, vendor_name='Printed name'),
+            self.item_payload(vendor_name='  ATELIER'),
+            self.item_payload(vendor_name='Twin'),
+        ]
+        response = self.client.post('/api/invoicing/gold-invoices/', dict(self.gold_payload(), items=items), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            list(GoldInvoiceItem.objects.order_by('id').values_list('vendor_id', 'vendor_name')),
+            [(self.vendor.id, 'Printed name'), (self.other_vendor.id, 'ATELIER'), (None, 'Twin')]
+        )
+
+        self.client.post('/api/invoicing/silver-invoices/batch/', [self.silver_payload()], format='json')
+        self.assertEqual(SilverInvoiceItem.objects.get().vendor_id, self.vendor.id)
+
+    def test_backfill_links_legacy_items(self):
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(items=3), format='json')
+        self.make_gold_product(name='Bangle', weight='12.00')
+        GoldInvoiceItem.objects.update(product=None, vendor=None)
+        item_ids = list(GoldInvoiceItem.objects.order_by('id').values_list('id', flat=True))
+        GoldInvoiceItem.objects.filter(id=item_ids[1]).update(item_name='bangle', item_weight='12.00')
+        GoldInvoiceItem.objects.filter(id=item_ids[2]).update(item_name='Unknown', vendor_name='Atelier')
+
+        out = io.StringIO()
+        call_command('backfill_invoice_item_references', batch_size=2, stdout=out)
+        self.assertIn('Gold: linked 2 items to products and 3 to vendors, 0 items still without a vendor', out.getvalue())
+        self.assertEqual(
+            list(GoldInvoiceItem.objects.order_by('id').values_list('product__name', 'vendor_id')),
+            [('Ring', self.vendor.id), ('Bangle', self.vendor.id), (None, self.other_vendor.id)]
+        )
+
+    def test_vendor_sales_report(self):
+        items = [
+            self.item_payload(product=self.product.id, item_quantity=2, item_total_price='200.00'),
+            self.item_payload(vendor_name='Atelier', item_total_price='50.00'),
+            self.item_payload(vendor_name='Nobody', item_total_price='10.00'),
+        ]
+        self.client.post('/api/invoicing/gold-invoices/', dict(self.gold_payload(), items=items), format='json')
+        self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(), format='json')
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(invoice_type='Return Packing'), format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        rows = [(row['vendor_name'], row['gold_quantity'], row['gold_grams'], row['silver_quantity'], row['total_revenue'])
+                for row in response.data['results']]
+        self.assertEqual(rows, [
+            ('Vendor', 2, '10.00', 1, '300.00'),
+            ('Atelier', 1, '5.00', 0, '50.00'),
+            (None, 1, '5.00', 0, '10.00'),
+        ])
+
+
+class CaratReportTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/reports/carats/'
+
+    def test_grams_by_carat_with_equivalents(self):
+        other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        items = [
+            self.item_payload(item_carat='18.00', item_weight='7.00', item_quantity=2),
+            self.item_payload(item_carat='21.00', item_weight='3.00'),
+            self.item_payload(item_carat='24.00', item_weight='1.50'),
+        ]
+        self.client.post('/api/invoicing/gold-invoices/', dict(self.gold_payload(), items=items), format='json')
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(branch=other_branch.id), format='json')
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(invoice_type='Return Packing'), format='json')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {'branch': self.branch.id})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(
+            [(row['date'], row['carat'], row['grams'], row['grams_21k'], row['grams_24k'])
+             for row in response.data['daily']],
+            [(timezone.localdate().isoformat(), carat, grams, g21, g24) for carat, grams, g21, g24 in [
+                ('18.00', '14.00', '12.00', '10.50'),
+                ('21.00', '3.00', '3.00', '2.63'),
+                ('24.00', '1.50', '1.71', '1.50'),
+            ]]
+        )
+
+        response = self.client.get(self.url)
+        by_carat = {row['carat']: (row['quantity'], row['grams']) for row in response.data['by_carat']}
+        self.assertEqual(by_carat, {'18.00': (2, '14.00'), '21.00': (2, '8.00'), '24.00': (1, '1.50')})
+
+
+class ReportJobTestMixin(InvoiceTestMixin):
+    url = '/api/invoicing/report-jobs/'
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def download(self, job_id):
+        response = self.client.get(f'{self.url}{job_id}/download/')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+
+@override_settings(REPORT_JOB_WORKERS=0)
+class ReportJobTests(ReportJobTestMixin, APITestCase):
+    def test_submit_poll_and_download_through_worker_command(self):
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(items=2), format='json')
+        self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(), format='json')
+        response = self.client.post(self.url, {'kind': 'sales', 'params': {'start_date': '2000-01-01'}}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        job_id = response.data['id']
+        self.assertEqual((response.data['status'], response.data['download_url']), ('Pending', None))
+        self.assertEqual(self.client.get(f'{self.url}{job_id}/download/').status_code, 409)
+
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+        job = self.client.get(f'{self.url}{job_id}/').data
+        self.assertEqual((job['status'], job['progress']), ('Completed', 100))
+        self.assertTrue(job['download_url'].endswith(f'/report-jobs/{job_id}/download/'))
+        report = json.loads(self.download(job_id))
+        self.assertEqual(report['start_date'], '2000-01-01')
+        sales = report['by_type'][0]
+        self.assertEqual((sales['gold_total'], sales['silver_total']), ('200.00', '100.00'))
+
+    def test_export_job_writes_csv_scoped_to_branch(self):
+        other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(items=3), format='json')
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(branch=other_branch.id), format='json')
+        self.user.role = 'Employee'
+        self.user.save()
+        response = self.client.post(self.url, {'kind': 'gold_invoice_items', 'params': {'branch': [other_branch.id]}}, format='json')
+        self.assertEqual(response.data['params']['branch'], [self.branch.id])
+
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+        rows = list(csv.reader(io.StringIO(self.download(response.data['id']))))
+        self.assertEqual(rows[0][:2], ['id', 'invoice_id'])
+        self.assertEqual(len(rows), 4)
+
+    def test_invalid_jobs_and_visibility(self):
+        self.assertEqual(self.client.post(self.url, {'kind': 'payroll'}, format='json').status_code, 400)
+        response = self.client.post(self.url, {'kind': 'timeseries', 'params': {'bucket': 'minute'}}, format='json')
+        self.assertIn('bucket', response.data['params'])
+        ReportJob.objects.create(kind='sales', created_by=User.objects.create_user('other', 'other@example.com', role='Employee'))
+        self.user.role = 'Employee'
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+
+    def test_failed_job_records_error_and_stale_jobs_are_requeued(self):
+        failed = ReportJob.objects.create(kind='sales', params={'start_date': 'soon'}, created_by=self.user)
+        stale = ReportJob.objects.create(kind='vendors', status='Running', created_by=self.user,
+                                         started_date=timezone.now() - timedelta(hours=2))
+        # Started as long ago, but its worker stamped it a minute ago
+        long_running = ReportJob.objects.create(kind='vendors', status='Running', created_by=self.user,
+                                                started_date=timezone.now() - timedelta(hours=2))
+        ReportJob.objects.filter(id=stale.id).update(updated_date=timezone.now() - timedelta(minutes=30))
+        ReportJob.objects.filter(id=long_running.id).update(updated_date=timezone.now() - timedelta(minutes=1))
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+        failed.refresh_from_db()
+        stale.refresh_from_db()
+        long_running.refresh_from_db()
+        self.assertEqual(failed.status, 'Failed')
+        self.assertIn('start_date', failed.error)
+        self.assertEqual(stale.status, 'Completed')
+        self.assertEqual(long_running.status, 'Running')
+
+    def test_heartbeat_stamps_running_jobs(self):
+        job = ReportJob.objects.create(kind='vendors', status='Running', created_by=self.user)
+        ReportJob.objects.filter(id=job.id).update(updated_date=timezone.now() - timedelta(hours=1))
+        with patch('invoicing.jobs.touch') as touch, jobs.heartbeat(job, interval=0.01):
+            deadline = time.monotonic() + 5
+            while not touch.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+        touch.assert_called_with(job)
+
+
+@override_settings(REPORT_JOB_WORKERS=1)
+class InProcessReportJobTests(ReportJobTestMixin, APITransactionTestCase):
+    def test_pool_runs_job_after_commit(self):
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(), format='json')
+        response = self.client.post(self.url, {'kind': 'gold_invoices', 'params': {'file_format': 'ndjson'}}, format='json')
+        job_url = f"{self.url}{response.data['id']}/"
+        deadline = time.monotonic() + 10
+        while self.client.get(job_url).data['status'] in ('Pending', 'Running') and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.client.get(job_url).data['status'], 'Completed')
+        rows = [json.loads(line) for line in self.download(response.data['id']).splitlines()]
+        self.assertEqual([row['total_price'] for row in rows], ['100.00'])
+
+    def test_pool_start_runs_jobs_left_by_an_earlier_process(self):
+        pending = ReportJob.objects.create(kind='vendors', created_by=self.user)
+        orphaned = ReportJob.objects.create(kind='vendors', status='Running', created_by=self.user)
+        ReportJob.objects.filter(id=orphaned.id).update(updated_date=timezone.now() - timedelta(hours=1))
+        jobs.recover_jobs()
+        self.assertEqual(
+            set(ReportJob.objects.filter(id__in=[pending.id, orphaned.id]).values_list('status', flat=True)), {'Completed'}
+        )
+
+
+class DashboardTests(InvoiceTestMixin, APITestCase):
+    url = '/api/invoicing/reports/dashboard/'
+    six_calls = [
+        '/api/invoicing/gold-invoices/summary/', '/api/invoicing/silver-invoices/summary/',
+        '/api/invoicing/gold-invoices/daily_sales/', '/api/invoicing/silver-invoices/daily_sales/',
+        '/api/inventory/gold-stock/summary/', '/api/inventory/silver-stock/summary/',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        caches['reports'].clear()
+        gold = self.make_gold_product()
+        silver = self.make_silver_product()
+        GoldWarehouseStock.objects.create(warehouse=self.warehouse, product=gold, quantity=50, created_by=self.user)
+        SilverWarehouseStock.objects.create(warehouse=self.warehouse, product=silver, quantity=20, created_by=self.user)
+        other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        for payload in [
+            dict(self.gold_payload(), items=[self.item_payload(product=gold.id, item_quantity=2)]),
+            self.gold_payload(transaction_type='Visa'),
+            dict(self.gold_payload(invoice_type='Return Packing'), items=[self.item_payload(product=gold.id)]),
+            self.gold_payload(branch=other_branch.id),
+        ]:
+            self.client.post('/api/invoicing/gold-invoices/', payload, format='json')
+        self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(), format='json')
+        self.user.role = 'Employee'
+        self.user.save()
+
+    def test_matches_the_six_calls_in_two_statements(self):
+        separate = {}
+        with CaptureQueriesContext(connection) as six:
+            for url in self.six_calls:
+                separate[url] = self.client.get(url).data
+        caches['reports'].clear()
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(one.captured_queries), 2)
+        self.assertGreater(len(six.captured_queries), len(one.captured_queries))
+
+        dashboard = response.data
+        # Equal totals have no defined order in either endpoint
+        by_type = lambda rows: sorted(rows, key=lambda row: (row['invoice_type'], row['transaction_type']))
+        self.assertEqual(by_type(dashboard['gold_summary']), by_type(separate[self.six_calls[0]]))
+        self.assertEqual(by_type(dashboard['silver_summary']), by_type(separate[self.six_calls[1]]))
+        self.assertEqual(dashboard['daily_sales'], separate[self.six_calls[2]])
+        (stock,) = dashboard['stock']
+        gold_stock, = separate[self.six_calls[4]]
+        silver_stock, = separate[self.six_calls[5]]
+        self.assertEqual(
+            (stock['warehouse_code'], stock['gold_products'], stock['gold_quantity'], stock['gold_weight'],
+             stock['silver_quantity'], stock['silver_weight']),
+            (gold_stock['warehouse_code'], gold_stock['total_products'], gold_stock['total_quantity'],
+             gold_stock['total_weight'], silver_stock['total_quantity'], silver_stock['total_weight'])
+        )
+
+    def test_served_from_cache_until_a_write(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(), format='json')
+        silver = self.client.get(self.url).data['silver_summary']
+        self.assertEqual(silver[0]['count'], 2)
+
+
+class CustomerHistoryTests(InvoiceTestMixin, APITestCase):
+    def url(self):
+        return f'/api/core/customers/{self.customer.id}/history/'
+
+    def counters(self):
+        return Customer.objects.values_list(
+            'invoice_count', 'return_count', 'lifetime_spend', 'returned_amount', 'last_visit'
+        ).get(id=self.customer.id)
+
+    def test_counters_follow_every_invoice_write(self):
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(items=2), format='json')
+        self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(invoice_type='Return Packing'), format='json')
+        self.client.post('/api/invoicing/silver-invoices/batch/', [self.silver_payload()] * 3, format='json')
+        latest = SilverInvoice.objects.latest('created_date')
+        self.assertEqual(self.counters(), (4, 1, Decimal('500.00'), Decimal('100.00'), latest.created_date))
+
+        self.client.patch(f'/api/invoicing/silver-invoices/{latest.id}/', {'invoice_type': 'Return Unpacking'}, format='json')
+        self.assertEqual(self.counters()[:2], (3, 2))
+        self.client.delete(f'/api/invoicing/silver-invoices/{latest.id}/')
+        counters = self.counters()
+        self.assertEqual(counters[:4], (3, 1, Decimal('400.00'), Decimal('100.00')))
+        self.assertEqual(counters[4], SilverInvoice.objects.latest('created_date').created_date)
+
+        Customer.objects.update(invoice_count=0, last_visit=None)
+        call_command('rebuild_customer_stats', stdout=io.StringIO())
+        self.assertEqual(self.counters(), counters)
+
+    def test_history_pages_both_metals_in_constant_queries(self):
+        for _ in range(3):
+            self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(), format='json')
+            self.client.post('/api/invoicing/silver-invoices/', self.silver_payload(), format='json')
+        # A shared timestamp must not lose or repeat rows across pages
+        GoldInvoice.objects.filter(id=GoldInvoice.objects.earliest('id').id).update(
+            created_date=SilverInvoice.objects.earliest('id').created_date
+        )
+        other_customer = Customer.objects.create(name='Other', phone='0200', created_by=self.user)
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(customer=other_customer.id), format='json')
+
+        seen = []
+        url = self.url()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'limit': 4})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(response.data['customer']['invoice_count'], 6)
+        while True:
+            seen.extend((row['metal'], row['id']) for row in response.data['invoices'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        expected = sorted(
+            [('Gold', created, invoice_id) for invoice_id, created in
+             GoldInvoice.objects.filter(customer=self.customer).values_list('id', 'created_date')] +
+            [('Silver', created, invoice_id) for invoice_id, created in
+             SilverInvoice.objects.values_list('id', 'created_date')],
+            key=lambda row: (row[1], row[0], row[2]), reverse=True
+        )
+        self.assertEqual(seen, [(metal, invoice_id) for metal, _, invoice_id in expected])
+
+        self.assertEqual(self.client.get(self.url(), {'cursor': 'bogus'}).status_code, 404)
+        self.assertEqual(self.client.get(self.url(), {'limit': 0}).status_code, 400)
+
+    def test_history_invoices_follow_branch_scoping(self):
+        other_branch = Branch.objects.create(name='Other', created_by=self.user)
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(), format='json')
+        self.client.post('/api/invoicing/gold-invoices/', self.gold_payload(branch=other_branch.id), format='json')
+        self.user.role = 'Employee'
+        self.user.save()
+        response = self.client.get(self.url())
+        self.assertEqual(response.data['customer']['invoice_count'], 2)
+        self.assertEqual([row['branch_id'] for row in response.data['invoices']], [self.branch.id])
@@ -9,6 +9,8 @@ router.register(r'gold-invoices', views.GoldInvoiceViewSet)
 router.register(r'gold-invoice-items', views.GoldInvoiceItemViewSet)
 router.register(r'silver-invoices', views.SilverInvoiceViewSet)
 router.register(r'silver-invoice-items', views.SilverInvoiceItemViewSet)
+router.register(r'reports', views.ReportViewSet, basename='reports')
+router.register(r'report-jobs', views.ReportJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
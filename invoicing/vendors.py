@@ -0,0 +1,91 @@
+from django.db import connection
+from django.db.models.functions import Lower, Trim
+from core.models import Vendor
+
+def normalize_vendor_name(name):
+    return (name or '').strip().lower()
+
+def assign_item_vendors(product_model, items):
+    """Set vendor_id on unsaved invoice items, with at most two queries for the whole list.
+
+    An item's product decides its vendor. Items without a product are matched
+    on vendor_name, ignoring case and surrounding whitespace, and only when
+    exactly one live vendor carries that name.
+    """
+    product_ids = {item.product_id for item in items if item.product_id}
+    product_vendors = dict(
+        product_model.all_objects.filter(id__in=product_ids).values_list('id', 'vendor_id')
+    ) if product_ids else {}
+
+    names = {normalize_vendor_name(item.vendor_name) for item in items if not item.product_id}
+    names.discard('')
+    vendors_by_name = {}
+    if names:
+        for vendor_id, name in Vendor.objects.annotate(key=Lower(Trim('name'))).filter(key__in=names).values_list('id', 'key'):
+            # None marks a name shared by several vendors, which is left unresolved
+            vendors_by_name[name] = None if name in vendors_by_name else vendor_id
+
+    for item in items:
+        if item.product_id:
+            item.vendor_id = product_vendors.get(item.product_id)
+        else:
+            item.vendor_id = vendors_by_name.get(normalize_vendor_name(item.vendor_name))
+    return items
+
+def backfill_item_references(item_model, product_model, batch_size=10000):
+    """Resolve product_id and vendor_id on existing invoice items, in id-range batches.
+
+    Each batch is three set-based UPDATEs. Items without a product are linked
+    to the one live catalog product with the same name, weight, carat and
+    vendor name, if exactly one exists. Items with a product then take its
+    vendor, and the remaining items are matched on vendor_name against the
+    live vendors whose normalized name is unique. Returns the number of items
+    given a product and a vendor.
+    """
+    items = item_model._meta.db_table
+    products = product_model._meta.db_table
+    vendors = Vendor._meta.db_table
+    by_catalog = f"""
+        UPDATE {items} AS items SET product_id = catalog.product_id
+        FROM (
+            SELECT lower(btrim(products.name)) AS name, products.weight, products.carat,
+                   lower(btrim(vendors.name)) AS vendor_name, MIN(products.id) AS product_id
+            FROM {products} AS products
+            JOIN {vendors} AS vendors ON vendors.id = products.vendor_id
+            WHERE products.deleted_at IS NULL
+            GROUP BY 1, 2, 3, 4
+            HAVING COUNT(*) = 1
+        ) AS catalog
+        WHERE catalog.name = lower(btrim(items.item_name)) AND catalog.weight = items.item_weight
+          AND catalog.carat = items.item_carat AND catalog.vendor_name = lower(btrim(items.vendor_name))
+          AND items.product_id IS NULL
+          AND items.id >= %s AND items.id < %s
+    """
+    by_product = f"""
+        UPDATE {items} AS items SET vendor_id = products.vendor_id
+        FROM {products} AS products
+        WHERE products.id = items.product_id AND items.vendor_id IS NULL
+          AND items.id >= %s AND items.id < %s
+    """
+    by_name = f"""
+        UPDATE {items} AS items SET vendor_id = names.vendor_id
+        FROM (
+            SELECT lower(btrim(name)) AS name, MIN(id) AS vendor_id
+            FROM {vendors}
+            WHERE deleted_at IS NULL
+            GROUP BY 1
+            HAVING COUNT(*) = 1
+        ) AS names
+        WHERE names.name = lower(btrim(items.vendor_name))
+          AND items.product_id IS NULL AND items.vendor_id IS NULL
+          AND items.id >= %s AND items.id < %s
+    """
+    last_id = item_model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    resolved = {'products': 0, 'vendors': 0}
+    with connection.cursor() as cursor:
+        for low in range(1, last_id + 1, batch_size):
+            # Each batch commits on its own under autocommit, keeping row locks short
+            for counter, sql in [('products', by_catalog), ('vendors', by_product), ('vendors', by_name)]:
+                cursor.execute(sql, [low, low + batch_size])
+                resolved[counter] += cursor.rowcount
+    return resolved
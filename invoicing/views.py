@@ -1,28 +1,110 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.db import transaction
+from django.http import FileResponse
 from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncDate
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from copy import copy
 from datetime import datetime, timedelta
-from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem
+from decimal import Decimal
+from inventory.models import GoldProduct, SilverProduct, GoldWarehouseStock, SilverWarehouseStock
+from utils.export import export_response
+from utils.idempotency import IdempotentCreateMixin
+from utils.pagination import KeysetPagination, IdKeysetPagination
+from utils.parsers import NDJSONParser
+from utils.permissions import IsAdmin
+from utils.report_cache import cached_report, report_cache
+from .batch import InvoiceBatchImporter
+from .jobs import ExportKind, ReportKind
+from .models import GoldInvoice, GoldInvoiceItem, SilverInvoice, SilverInvoiceItem, DailySalesRollup, ReportJob
+from .rollup import record_invoices
 from .serializers import (
-    GoldInvoiceSerializer, GoldInvoiceCreateSerializer, GoldInvoiceItemSerializer,
-    SilverInvoiceSerializer, SilverInvoiceCreateSerializer, SilverInvoiceItemSerializer,
-    InvoiceSummarySerializer, DailySalesSerializer
+    GoldInvoiceSerializer, GoldInvoiceCreateSerializer, GoldInvoiceItemSerializer, GoldInvoiceBatchSerializer,
+    SilverInvoiceSerializer, SilverInvoiceCreateSerializer, SilverInvoiceItemSerializer, SilverInvoiceBatchSerializer,
+    InvoiceSummarySerializer, DailySalesSerializer, ReportFilterSerializer, SalesReportRowSerializer,
+    TimeSeriesFilterSerializer, TimeSeriesRowSerializer, LeaderboardFilterSerializer, LeaderboardRowSerializer,
+    VendorSalesRowSerializer, CaratGramsRowSerializer, ExportJobFilterSerializer, ReportJobSerializer,
+    DashboardStockRowSerializer, invoice_stock_changes, restate_invoice_stock
 )
+from . import jobs, reports
 
-class GoldInvoiceViewSet(viewsets.ModelViewSet):
+def rollup_daily_sales(user, days=30):
+    """Daily sales for both metals, read from the pre-aggregated rollup"""
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=days)
+    rollup = DailySalesRollup.objects.filter(date__range=[start_date, end_date], invoice_type='Sale')
+    # Filter by user's branch if not admin
+    if user.role != 'Admin':
+        rollup = rollup.filter(branch=user.branch)
+    
+    daily_data = rollup.values('date').annotate(
+        gold_sales=Coalesce(Sum('total_amount', filter=Q(metal='Gold')), Decimal('0')),
+        silver_sales=Coalesce(Sum('total_amount', filter=Q(metal='Silver')), Decimal('0')),
+        total_sales=Sum('total_amount')
+    ).order_by('date')
+    return DailySalesSerializer(daily_data, many=True).data
+
+def report_filters(request, serializer_class=ReportFilterSerializer):
+    """Validated report query params, with the branch filter forced to the user's branch if not admin"""
+    list_params = [name for name, field in serializer_class().fields.items() if isinstance(field, serializers.ListField)]
+    params = {key: value for key, value in request.query_params.items() if key not in list_params}
+    for name in list_params:
+        if name in request.query_params:
+            params[name] = request.query_params.getlist(name)
+    serializer = serializer_class(data=params)
+    serializer.is_valid(raise_exception=True)
+    filters = serializer.validated_data
+    if request.user.role != 'Admin':
+        filters['branch'] = [request.user.branch_id]
+    for name in list_params:
+        filters.setdefault(name, None)
+    return filters
+
+def created_range(queryset, request, field='created_date'):
+    """Apply the optional start_date/end_date query params (whole days, inclusive) to a created_date field"""
+    date_field = serializers.DateField()
+    for param, lookup, bound in [('start_date', 'gte', 0), ('end_date', 'lt', 1)]:
+        if request.query_params.get(param):
+            day = date_field.to_internal_value(request.query_params[param])
+            queryset = queryset.filter(**{f'{field}__{lookup}': reports.date_bounds(day, day)[bound]})
+    return queryset
+
+def batch_response(importer, records):
+    if not isinstance(records, list) and not hasattr(records, '__next__'):
+        return Response(
+            {'error': 'Expected a JSON array or an NDJSON stream of invoices'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    results = importer.run(records)
+    created = sum(1 for result in results if result['status'] == 'created')
+    return Response({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    })
+
+class GoldInvoiceViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = GoldInvoice.objects.all()
     serializer_class = GoldInvoiceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['invoice_type', 'transaction_type', 'branch', 'seller', 'warehouse', 'created_date']
     search_fields = ['customer__name', 'customer__phone', 'seller__name', 'warehouse__code']
     ordering_fields = ['total_price', 'created_date']
     ordering = ['-created_date']
+    serialized_actions = ['list', 'retrieve', 'update', 'partial_update', 'print_invoice']
+    export_fields = [
+        'id', 'created_date', 'branch__name', 'warehouse__code', 'seller__name', 'customer__name',
+        'customer__phone', 'invoice_type', 'transaction_type', 'gold_price_21', 'gold_price_24',
+        'total_price', 'created_by__username'
+    ]
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -34,12 +116,36 @@ class GoldInvoiceViewSet(viewsets.ModelViewSet):
         # Filter by user's branch if not admin
         if self.request.user.role != 'Admin':
             queryset = queryset.filter(branch=self.request.user.branch)
+        if self.action in self.serialized_actions:
+            queryset = queryset.select_related(
+                'warehouse', 'seller', 'branch', 'customer', 'created_by'
+            ).prefetch_related('items')
         return queryset
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def perform_update(self, serializer):
+        items = list(serializer.instance.items.all())
+        previous = copy(serializer.instance)
+        before = (previous.warehouse_id, invoice_stock_changes(previous, items))
+        with transaction.atomic():
+            invoice = serializer.save()
+            after = (invoice.warehouse_id, invoice_stock_changes(invoice, items))
+            # Stock rows are locked before rollup and customer rows, as on create and delete
+            restate_invoice_stock(GoldWarehouseStock, invoice.id, before, after, self.request.user)
+            record_invoices('Gold', [previous], sign=-1)
+            record_invoices('Gold', [invoice])
+
+    def perform_destroy(self, instance):
+        before = (instance.warehouse_id, invoice_stock_changes(instance, instance.items.all()))
+        with transaction.atomic():
+            restate_invoice_stock(GoldWarehouseStock, instance.id, before, None, self.request.user)
+            record_invoices('Gold', [instance], sign=-1)
+            instance.delete()
+
     @action(detail=False, methods=['get'])
+    @cached_report(GoldInvoice)
     def summary(self, request):
         """Get gold invoice summary by type and transaction method"""
         queryset = self.get_queryset()
@@ -63,32 +169,8 @@ class GoldInvoiceViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def daily_sales(self, request):
-        """Get daily gold sales for the last 30 days"""
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=30)
-        
-        queryset = self.get_queryset().filter(
-            created_date__date__range=[start_date, end_date],
-            invoice_type='Sale'
-        )
-        
-        daily_data = queryset.annotate(
-            date=TruncDate('created_date')
-        ).values('date').annotate(
-            total_sales=Sum('total_price')
-        ).order_by('date')
-        
-        # Format response
-        formatted_data = []
-        for item in daily_data:
-            formatted_data.append({
-                'date': item['date'],
-                'gold_sales': item['total_sales'],
-                'silver_sales': 0,  # Will be filled by frontend or separate endpoint
-                'total_sales': item['total_sales']
-            })
-        
-        return Response(formatted_data)
+        """Get daily gold and silver sales for the last 30 days"""
+        return Response(rollup_daily_sales(request.user))
 
     @action(detail=True, methods=['get'])
     def print_invoice(self, request, pk=None):
@@ -100,15 +182,36 @@ class GoldInvoiceViewSet(viewsets.ModelViewSet):
             'print_date': datetime.now().isoformat()
         })
 
-class GoldInvoiceItemViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream filtered gold invoices as CSV or NDJSON"""
+        queryset = created_range(self.filter_queryset(self.get_queryset()), request)
+        return export_response(request, queryset, self.export_fields, 'gold-invoices')
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def batch(self, request):
+        """Ingest gold invoices queued offline, sent as a JSON array or NDJSON stream"""
+        importer = InvoiceBatchImporter(
+            'Gold', GoldInvoiceBatchSerializer, GoldInvoice, GoldInvoiceItem, GoldProduct, GoldWarehouseStock, request.user
+        )
+        return batch_response(importer, request.data)
+
+class GoldInvoiceItemViewSet(viewsets.ReadOnlyModelViewSet):
+    # Items are written with their invoice, which posts their stock and updates the totals and rollup
     queryset = GoldInvoiceItem.objects.all()
     serializer_class = GoldInvoiceItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdKeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['invoice', 'vendor_name', 'item_carat']
     search_fields = ['item_name', 'vendor_name']
     ordering_fields = ['item_quantity', 'item_total_price']
     ordering = ['-id']
+    export_fields = [
+        'id', 'invoice_id', 'invoice__created_date', 'invoice__branch__name', 'invoice__invoice_type',
+        'product_id', 'item_name', 'vendor_name', 'item_weight', 'item_carat', 'item_stamp_enduser',
+        'item_quantity', 'item_price', 'item_total_price'
+    ]
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -117,15 +220,28 @@ class GoldInvoiceItemViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(invoice__branch=self.request.user.branch)
         return queryset
 
-class SilverInvoiceViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream filtered gold invoice items as CSV or NDJSON"""
+        queryset = created_range(self.filter_queryset(self.get_queryset()), request, 'invoice__created_date')
+        return export_response(request, queryset, self.export_fields, 'gold-invoice-items')
+
+class SilverInvoiceViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     queryset = SilverInvoice.objects.all()
     serializer_class = SilverInvoiceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['invoice_type', 'transaction_type', 'branch', 'seller', 'warehouse', 'created_date']
     search_fields = ['customer__name', 'customer__phone', 'seller__name', 'warehouse__code']
     ordering_fields = ['total_price', 'created_date']
     ordering = ['-created_date']
+    serialized_actions = ['list', 'retrieve', 'update', 'partial_update', 'print_invoice']
+    export_fields = [
+        'id', 'created_date', 'branch__name', 'warehouse__code', 'seller__name', 'customer__name',
+        'customer__phone', 'invoice_type', 'transaction_type', 'silver_price', 'total_price',
+        'created_by__username'
+    ]
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -137,12 +253,36 @@ class SilverInvoiceViewSet(viewsets.ModelViewSet):
         # Filter by user's branch if not admin
         if self.request.user.role != 'Admin':
             queryset = queryset.filter(branch=self.request.user.branch)
+        if self.action in self.serialized_actions:
+            queryset = queryset.select_related(
+                'warehouse', 'seller', 'branch', 'customer', 'created_by'
+            ).prefetch_related('items')
         return queryset
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def perform_update(self, serializer):
+        items = list(serializer.instance.items.all())
+        previous = copy(serializer.instance)
+        before = (previous.warehouse_id, invoice_stock_changes(previous, items))
+        with transaction.atomic():
+            invoice = serializer.save()
+            after = (invoice.warehouse_id, invoice_stock_changes(invoice, items))
+            # Stock rows are locked before rollup and customer rows, as on create and delete
+            restate_invoice_stock(SilverWarehouseStock, invoice.id, before, after, self.request.user)
+            record_invoices('Silver', [previous], sign=-1)
+            record_invoices('Silver', [invoice])
+
+    def perform_destroy(self, instance):
+        before = (instance.warehouse_id, invoice_stock_changes(instance, instance.items.all()))
+        with transaction.atomic():
+            restate_invoice_stock(SilverWarehouseStock, instance.id, before, None, self.request.user)
+            record_invoices('Silver', [instance], sign=-1)
+            instance.delete()
+
     @action(detail=False, methods=['get'])
+    @cached_report(SilverInvoice)
     def summary(self, request):
         """Get silver invoice summary by type and transaction method"""
         queryset = self.get_queryset()
@@ -166,32 +306,8 @@ class SilverInvoiceViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def daily_sales(self, request):
-        """Get daily silver sales for the last 30 days"""
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=30)
-        
-        queryset = self.get_queryset().filter(
-            created_date__date__range=[start_date, end_date],
-            invoice_type='Sale'
-        )
-        
-        daily_data = queryset.annotate(
-            date=TruncDate('created_date')
-        ).values('date').annotate(
-            total_sales=Sum('total_price')
-        ).order_by('date')
-        
-        # Format response
-        formatted_data = []
-        for item in daily_data:
-            formatted_data.append({
-                'date': item['date'],
-                'gold_sales': 0,  # Will be filled by frontend or separate endpoint
-                'silver_sales': item['total_sales'],
-                'total_sales': item['total_sales']
-            })
-        
-        return Response(formatted_data)
+        """Get daily gold and silver sales for the last 30 days"""
+        return Response(rollup_daily_sales(request.user))
 
     @action(detail=True, methods=['get'])
     def print_invoice(self, request, pk=None):
@@ -203,19 +319,204 @@ class SilverInvoiceViewSet(viewsets.ModelViewSet):
             'print_date': datetime.now().isoformat()
         })
 
-class SilverInvoiceItemViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream filtered silver invoices as CSV or NDJSON"""
+        queryset = created_range(self.filter_queryset(self.get_queryset()), request)
+        return export_response(request, queryset, self.export_fields, 'silver-invoices')
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def batch(self, request):
+        """Ingest silver invoices queued offline, sent as a JSON array or NDJSON stream"""
+        importer = InvoiceBatchImporter(
+            'Silver', SilverInvoiceBatchSerializer, SilverInvoice, SilverInvoiceItem, SilverProduct, SilverWarehouseStock, request.user
+        )
+        return batch_response(importer, request.data)
+
+class SilverInvoiceItemViewSet(viewsets.ReadOnlyModelViewSet):
+    # Items are written with their invoice, which posts their stock and updates the totals and rollup
     queryset = SilverInvoiceItem.objects.all()
     serializer_class = SilverInvoiceItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdKeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['invoice', 'vendor_name', 'item_carat']
     search_fields = ['item_name', 'vendor_name']
     ordering_fields = ['item_quantity', 'item_total_price']
     ordering = ['-id']
+    export_fields = [
+        'id', 'invoice_id', 'invoice__created_date', 'invoice__branch__name', 'invoice__invoice_type',
+        'product_id', 'item_name', 'vendor_name', 'item_weight', 'item_carat', 'item_stamp_enduser',
+        'item_quantity', 'item_price', 'item_total_price'
+    ]
 
     def get_queryset(self):
         queryset = super().get_queryset()
         # Filter by user's branch if not admin
         if self.request.user.role != 'Admin':
             queryset = queryset.filter(invoice__branch=self.request.user.branch)
-        return queryset
\ No newline at end of file
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream filtered silver invoice items as CSV or NDJSON"""
+        queryset = created_range(self.filter_queryset(self.get_queryset()), request, 'invoice__created_date')
+        return export_response(request, queryset, self.export_fields, 'silver-invoice-items')
+
+def sales_payload(filters):
+    report = reports.sales_report(filters['start_date'], filters['end_date'], filters['branch'])
+    return {
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'daily': SalesReportRowSerializer(report['daily'], many=True).data,
+        'by_type': SalesReportRowSerializer(report['by_type'], many=True).data
+    }
+
+def timeseries_payload(filters):
+    series = reports.sales_timeseries(
+        filters['bucket'], filters['start_date'], filters['end_date'],
+        filters['branch'], filters['warehouse'], filters['seller']
+    )
+    return {
+        'bucket': filters['bucket'],
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'series': TimeSeriesRowSerializer(series, many=True).data
+    }
+
+def leaderboard_payload(filters):
+    rows = reports.seller_leaderboard(
+        filters['start_date'], filters['end_date'], filters['rank_by'], filters['limit'], filters['branch']
+    )
+    return {
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'rank_by': filters['rank_by'],
+        'seller_count': rows[0]['seller_count'] if rows else 0,
+        'results': LeaderboardRowSerializer(rows, many=True).data
+    }
+
+def vendors_payload(filters):
+    rows = reports.vendor_sales(filters['start_date'], filters['end_date'], filters['branch'])
+    return {
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'results': VendorSalesRowSerializer(rows, many=True).data
+    }
+
+def carats_payload(filters):
+    report = reports.gold_grams_by_carat(filters['start_date'], filters['end_date'], filters['branch'])
+    return {
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'daily': CaratGramsRowSerializer(report['daily'], many=True).data,
+        'by_carat': CaratGramsRowSerializer(report['by_carat'], many=True).data
+    }
+
+def dashboard_payload(filters):
+    dashboard = reports.branch_dashboard(filters['start_date'], filters['end_date'], filters['branch'])
+    return {
+        'start_date': filters['start_date'],
+        'end_date': filters['end_date'],
+        'gold_summary': InvoiceSummarySerializer(dashboard['gold_summary'], many=True).data,
+        'silver_summary': InvoiceSummarySerializer(dashboard['silver_summary'], many=True).data,
+        'daily_sales': DailySalesSerializer(dashboard['daily_sales'], many=True).data,
+        'stock': DashboardStockRowSerializer(dashboard['stock'], many=True).data
+    }
+
+class ReportViewSet(viewsets.ViewSet):
+    """Reports that cover both metals, computed in the database"""
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def sales(self, request):
+        """Get per-day and per-type gold and silver sales for a date range"""
+        return Response(sales_payload(report_filters(request)))
+
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """Get gold and silver sales per hour, day, week or month, with empty buckets filled in"""
+        return Response(timeseries_payload(report_filters(request, TimeSeriesFilterSerializer)))
+
+    @action(detail=False, methods=['get'])
+    def leaderboard(self, request):
+        """Get the top sellers ranked by revenue, invoice count, grams sold or return ratio"""
+        return Response(leaderboard_payload(report_filters(request, LeaderboardFilterSerializer)))
+
+    @action(detail=False, methods=['get'])
+    def vendors(self, request):
+        """Get quantity, grams and revenue sold per vendor for a date range"""
+        return Response(vendors_payload(report_filters(request)))
+
+    @action(detail=False, methods=['get'])
+    def carats(self, request):
+        """Get gold grams sold per branch, day and carat, with 21K and 24K equivalents"""
+        return Response(carats_payload(report_filters(request)))
+
+    @action(detail=False, methods=['get'])
+    @cached_report(GoldInvoice, SilverInvoice, GoldWarehouseStock, SilverWarehouseStock)
+    def dashboard(self, request):
+        """Get invoice summaries, daily sales and stock per warehouse for both metals in one response"""
+        return Response(dashboard_payload(report_filters(request)))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdmin])
+    def cache_stats(self, request):
+        """Get hit/miss counters of the report cache"""
+        return Response(report_cache.stats())
+
+REPORT_JOB_KINDS = {
+    'sales': ReportKind(ReportFilterSerializer, sales_payload),
+    'timeseries': ReportKind(TimeSeriesFilterSerializer, timeseries_payload),
+    'leaderboard': ReportKind(LeaderboardFilterSerializer, leaderboard_payload),
+    'vendors': ReportKind(ReportFilterSerializer, vendors_payload),
+    'carats': ReportKind(ReportFilterSerializer, carats_payload),
+    'gold_invoices': ExportKind(ExportJobFilterSerializer, GoldInvoice.objects.all(), GoldInvoiceViewSet.export_fields),
+    'silver_invoices': ExportKind(ExportJobFilterSerializer, SilverInvoice.objects.all(), SilverInvoiceViewSet.export_fields),
+    'gold_invoice_items': ExportKind(
+        ExportJobFilterSerializer, GoldInvoiceItem.objects.all(), GoldInvoiceItemViewSet.export_fields,
+        'invoice__created_date', 'invoice__branch'
+    ),
+    'silver_invoice_items': ExportKind(
+        ExportJobFilterSerializer, SilverInvoiceItem.objects.all(), SilverInvoiceItemViewSet.export_fields,
+        'invoice__created_date', 'invoice__branch'
+    ),
+}
+
+class ReportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    """Reports and exports run in the background: submit, poll, then download the result"""
+    queryset = ReportJob.objects.select_related('created_by')
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Users only see their own jobs unless admin
+        if self.request.user.role != 'Admin':
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+    def perform_create(self, serializer):
+        kind = REPORT_JOB_KINDS.get(serializer.validated_data['kind'])
+        if kind is None:
+            raise serializers.ValidationError({'kind': [f'Must be one of: {", ".join(REPORT_JOB_KINDS)}']})
+        try:
+            params = kind.validate(self.request.user, serializer.validated_data.get('params', {}))
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({'params': exc.detail})
+        job = serializer.save(created_by=self.request.user, params=params)
+        jobs.enqueue(job)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the result of a completed job"""
+        job = self.get_object()
+        if job.status != 'Completed':
+            return Response({'error': f'Job is {job.status.lower()}'}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(
+            job.result_file.open('rb'), as_attachment=True,
+            filename=job.result_file.name.rsplit('/', 1)[-1], content_type=job.content_type
+        )
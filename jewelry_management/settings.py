@@ -99,6 +99,22 @@ DATABASES = {
     }
 }
 
+# Caches
+# The local-memory backend culls least recently used entries past MAX_ENTRIES
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
@@ -123,9 +139,20 @@ SIMPLE_JWT = {
     "TOKEN_OBTAIN_SERIALIZER": "accounts.serializers.CustomTokenObtainPairSerializer",
 }
 
+# How long a stored Idempotency-Key response is replayed for
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Threads running report jobs inside each web process; 0 leaves them to `manage.py run_report_jobs`
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", 2))
+# Running jobs whose worker stopped stamping them this long ago are run again
+REPORT_JOB_STALE_AFTER = timedelta(minutes=int(os.getenv("REPORT_JOB_STALE_AFTER_MINUTES", 10)))
+
 # Custom User Model
 AUTH_USER_MODEL = "accounts.User"
 
+# Skips tests tagged 'benchmark'; run them with `manage.py test --tag benchmark`
+TEST_RUNNER = "utils.test_runner.TestRunner"
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -162,6 +189,9 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Report job results are written here
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
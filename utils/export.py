@@ -0,0 +1,45 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer output can be streamed"""
+    def write(self, value):
+        return value
+
+def csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+def export_response(request, queryset, fields, filename, chunk_size=2000):
+    """Stream `fields` of every row in `queryset` as CSV or NDJSON (`?file_format=`).
+
+    Rows are read through a server-side cursor `chunk_size` at a time and
+    written out as they arrive, so memory use does not grow with the export.
+    """
+    file_format = request.query_params.get('file_format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f'file_format must be one of: {", ".join(EXPORT_FORMATS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    lines = csv_lines(fields, rows) if file_format == 'csv' else ndjson_lines(fields, rows)
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from core.models import IdempotencyKey
+
+class IdempotentCreateMixin:
+    """Honour an `Idempotency-Key` header on create.
+
+    The first successful response is stored with the key in the same
+    transaction as the write. A retry with the same key costs one indexed read
+    and replays that response without validating or writing again.
+    """
+    idempotency_header = 'Idempotency-Key'
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(self.idempotency_header)
+        if not key:
+            return super().create(request, *args, **kwargs)
+
+        stored = IdempotencyKey.objects.filter(
+            user=request.user, key=key, expires_at__gt=timezone.now()
+        ).first()
+        if stored:
+            return self.replay(request, stored)
+
+        try:
+            with transaction.atomic():
+                response = super().create(request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    now = timezone.now()
+                    # An expired entry not yet purged must not block reuse of its key
+                    IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__lte=now).delete()
+                    IdempotencyKey.objects.create(
+                        user=request.user,
+                        key=key,
+                        endpoint=request.path,
+                        status_code=response.status_code,
+                        response_body=response.data,
+                        expires_at=now + settings.IDEMPOTENCY_KEY_TTL
+                    )
+        except IntegrityError:
+            # A concurrent request with the same key committed first; ours rolled back
+            stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if stored is None:
+                raise
+            return self.replay(request, stored)
+        return response
+
+    def replay(self, request, stored):
+        if stored.endpoint != request.path:
+            return Response(
+                {'error': 'Idempotency-Key was already used for a different endpoint'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return Response(stored.response_body, status=stored.status_code, headers={'Idempotent-Replayed': 'true'})
@@ -0,0 +1,110 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a unique, index-backed key, newest first.
+
+    Each page is read with a WHERE on the last key already seen, so a deep page
+    costs the same as the first one and no COUNT(*) is run. Clients that ask
+    for `?page=` or a custom `?ordering=` get page-number pagination instead.
+    """
+    key_fields = ('created_date', 'id')
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    fallback_query_params = ['page', 'ordering']
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        if any(param in request.query_params for param in self.fallback_query_params):
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        key, reverse = self.decode_cursor(queryset.model, request)
+        descending = [f'-{field}' for field in self.key_fields]
+        if reverse:
+            queryset = queryset.order_by(*self.key_fields)
+        else:
+            queryset = queryset.order_by(*descending)
+        if key is not None:
+            queryset = queryset.filter(self.beyond(key, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Coming from a cursor always means there is a page on the side we came from
+        self.has_next = (has_more if not reverse else key is not None) and bool(rows)
+        self.has_previous = (key is not None if not reverse else has_more) and bool(rows)
+        self.first_key = self.key_of(rows[0]) if rows else None
+        self.last_key = self.key_of(rows[-1]) if rows else None
+        return rows
+
+    def beyond(self, key, reverse):
+        """Rows strictly past `key` in the direction of travel: (a, b) < (x, y) as a lexicographic comparison"""
+        lookup = 'gt' if reverse else 'lt'
+        condition = Q()
+        for depth in range(len(self.key_fields) - 1, -1, -1):
+            field = self.key_fields[depth]
+            equal = {name: value for name, value in zip(self.key_fields[:depth], key[:depth])}
+            condition |= Q(**equal, **{f'{field}__{lookup}': key[depth]})
+        if len(self.key_fields) > 1:
+            # The redundant bound on the leading column gives the planner an index range to scan
+            condition &= Q(**{f'{self.key_fields[0]}__{lookup}e': key[0]})
+        return condition
+
+    def key_of(self, row):
+        return [getattr(row, field) for field in self.key_fields]
+
+    def encode_cursor(self, key, reverse):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in key]
+        payload = json.dumps({'k': values, 'r': int(reverse)}).encode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, base64.urlsafe_b64encode(payload).decode())
+
+    def decode_cursor(self, model, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            key = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.key_fields, payload['k'], strict=True)
+            ]
+            return key, bool(payload['r'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.first_key, reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.fallback:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+class IdKeysetPagination(KeysetPagination):
+    """Keyset pagination for tables without timestamps, where the id is the append order"""
+    key_fields = ('id',)
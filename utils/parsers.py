@@ -0,0 +1,46 @@
+import csv
+import json
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON, parsed lazily one line at a time.
+
+    `request.data` becomes an iterator, so a large upload is never held in
+    memory as a whole. Lines that are not valid JSON are yielded as None and
+    left for the view to report.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        return self.iter_records(stream, encoding)
+
+    @staticmethod
+    def iter_records(stream, encoding):
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line.decode(encoding))
+            except ValueError:
+                yield None
+
+class CSVParser(BaseParser):
+    """CSV with a header row, parsed lazily into one dict per row like NDJSONParser.
+
+    Header names are stripped, including a leading byte order mark, and
+    cells beyond the header are dropped.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        return self.iter_records(stream, encoding)
+
+    @staticmethod
+    def iter_records(stream, encoding):
+        lines = (line.decode(encoding) for line in stream)
+        for row in csv.DictReader(lines):
+            yield {name.strip('\ufeff \t'): value for name, value in row.items() if name}
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import time
+from functools import wraps
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+class ReportCache:
+    """Cache for report responses, invalidated by writes to the models they read.
+
+    Every source model has a version number stored in the cache. Entry keys
+    embed the current versions, so a write only has to bump a version for all
+    entries built from the old data to become unreachable; the backend then
+    evicts them by TTL or LRU culling like any other key. Works with any
+    Django cache backend, including the local-memory one.
+    """
+    alias = 'reports'
+    prefix = 'report-cache'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version_key(self, model, scope=None):
+        key = f'{self.prefix}:version:{model._meta.label_lower}'
+        return key if scope is None else f'{key}:{scope}'
+
+    def versions(self, models):
+        return self.current_versions([self.version_key(model) for model in models])
+
+    def current_versions(self, keys):
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # A culled version restarts from the clock, never from a value old entries used
+                self.cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.cache.get(key)
+        return [versions[key] for key in keys]
+
+    def key(self, endpoint, scope, params, models):
+        normalized = sorted((name, sorted(values)) for name, values in params.lists())
+        payload = json.dumps([endpoint, scope, normalized, self.versions(models)], default=str)
+        return f'{self.prefix}:entry:{hashlib.sha1(payload.encode()).hexdigest()}'
+
+    def scoped_keys(self, name, model, scopes):
+        """Entry keys for per-scope data built from `model`, such as one entry per warehouse.
+
+        A scoped entry is only dropped by writes to its own scope, see invalidate().
+        """
+        versions = self.current_versions([self.version_key(model, scope) for scope in scopes])
+        return {
+            scope: f'{self.prefix}:scoped:{name}:{scope}:{version}'
+            for scope, version in zip(scopes, versions)
+        }
+
+    def get(self, key):
+        data = self.cache.get(key)
+        self.count('hits' if data is not None else 'misses')
+        return data
+
+    def get_many(self, keys):
+        found = self.cache.get_many(keys)
+        if len(found):
+            self.count('hits', len(found))
+        if len(keys) - len(found):
+            self.count('misses', len(keys) - len(found))
+        return found
+
+    def set(self, key, data):
+        self.cache.set(key, data)
+
+    def set_many(self, entries):
+        self.cache.set_many(entries)
+
+    def invalidate(self, model, scopes=()):
+        """Bump the model's version, and those of the given scopes, once the current transaction commits"""
+        scopes = list(scopes)
+        transaction.on_commit(lambda: self.bump(model, scopes))
+
+    def bump(self, model, scopes=()):
+        for key in [self.version_key(model)] + [self.version_key(model, scope) for scope in scopes]:
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns(), timeout=None)
+
+    def count(self, counter, delta=1):
+        key = f'{self.prefix}:stats:{counter}'
+        try:
+            self.cache.incr(key, delta)
+        except ValueError:
+            self.cache.add(key, delta, timeout=None)
+
+    def stats(self):
+        counters = self.cache.get_many([f'{self.prefix}:stats:hits', f'{self.prefix}:stats:misses'])
+        hits = counters.get(f'{self.prefix}:stats:hits', 0)
+        misses = counters.get(f'{self.prefix}:stats:misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None
+        }
+
+report_cache = ReportCache()
+
+def content_etag(data):
+    return quote_etag(hashlib.sha1(json.dumps(data, default=str).encode()).hexdigest())
+
+def cached_report(*models, per_branch=True):
+    """Cache a GET action's response per endpoint, branch scope and query params.
+
+    Entries are dropped whenever any of `models` is saved or deleted. Responses
+    carry an ETag hashed from their content and stored with the entry, so a
+    client sending it back in If-None-Match gets 304 Not Modified from a
+    cached entry without the database being read. Versions live in each
+    process's cache unless the backend is shared; because the ETag follows
+    the content, a stale process can never answer 304 for longer than its
+    entry's TTL. Pass per_branch=False for data every user sees the same way.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(self, request, *args, **kwargs):
+            if not per_branch or request.user.role == 'Admin':
+                scope = 'all'
+            else:
+                scope = request.user.branch_id
+            key = report_cache.key(request.build_absolute_uri(request.path), scope, request.query_params, models)
+            entry = report_cache.get(key)
+            if entry is not None:
+                data, etag = entry
+                response = Response(data, headers={'ETag': etag})
+            else:
+                response = view_func(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                etag = content_etag(response.data)
+                report_cache.set(key, (response.data, etag))
+                response['ETag'] = etag
+            if etag in {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+            return response
+        return wrapper
+    return decorator
+
+# Field naming each model's cache scope, for models registered with one
+scope_fields = {}
+# Fields whose changes drop cached reports, for models registered with some
+watched_fields = {}
+
+def invalidate_reports(sender, instance, update_fields=None, **kwargs):
+    watched = watched_fields.get(sender)
+    if watched and update_fields is not None and not watched & set(update_fields):
+        return
+    scope_field = scope_fields.get(sender)
+    report_cache.invalidate(sender, [getattr(instance, scope_field)] if scope_field else ())
+
+def invalidate_reports_on_write(*models, scope_field=None, fields=None):
+    """Drop cached reports built from `models` whenever one of their rows is saved or deleted.
+
+    With `scope_field`, the entries scoped to the row's value of that field
+    (see ReportCache.scoped_keys) are dropped as well. With `fields`, saves
+    limited by update_fields to other columns, such as a login stamping
+    last_login, are ignored.
+    """
+    for model in models:
+        if scope_field:
+            scope_fields[model] = scope_field
+        if fields:
+            watched_fields[model] = set(fields)
+        post_save.connect(invalidate_reports, sender=model, dispatch_uid=f'report-cache-save-{model._meta.label_lower}')
+        post_delete.connect(invalidate_reports, sender=model, dispatch_uid=f'report-cache-delete-{model._meta.label_lower}')
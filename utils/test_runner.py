@@ -0,0 +1,10 @@
+from django.test.runner import DiscoverRunner
+
+class TestRunner(DiscoverRunner):
+    """Test runner leaving out tests tagged 'benchmark' unless they are asked for with --tag benchmark"""
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        exclude_tags = set(exclude_tags or ())
+        if 'benchmark' not in (tags or ()):
+            exclude_tags.add('benchmark')
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
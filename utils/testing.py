@@ -0,0 +1,25 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+class QueryBudgetMixin:
+    """Checks that endpoints cost the same number of queries however many rows they return.
+
+    Test classes define seed(index), adding one more row behind every endpoint checked.
+    """
+
+    def count_queries(self, url):
+        caches['reports'].clear()  # Measure the database path, not cached responses
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertQueryCountIndependentOfRows(self, urls, rows=10):
+        self.seed(0)
+        small = {url: self.count_queries(url) for url in urls}
+        for index in range(1, rows):
+            self.seed(index)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])